@@ -5,6 +5,14 @@ from .blueprints.customers import customers_bp
 from .blueprints.mechanic import mechanics_bp
 from .blueprints.service_ticket import service_ticket_bp
 from .blueprints.inventory import inventory_db
+from .blueprints.metrics import metrics_bp
+from .blueprints.reports import reports_bp
+from .utils.db_pool import init_pool_options, init_engine
+from .utils.compression import init_compression
+from .utils.query_stats import init_query_stats
+from .utils.slow_queries import init_slow_query_log
+from .utils.json_provider import FastJSONProvider
+from .commands import rebuild_search_index_command, rebuild_rollups_command, slow_queries_command, upgrade_schema_command
 from flask_swagger_ui import get_swaggerui_blueprint
 
 SWAGGER_URL = '/api/docs'  # URL for exposing Swagger UI (without trailing '/')
@@ -21,17 +29,30 @@ swaggerui_blueprint = get_swaggerui_blueprint(
 
 def create_app(config_name):
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(f'config.{config_name}')
     
+    init_pool_options(app)
     db.init_app(app)
+    init_engine(app)
+    init_query_stats(app)
+    init_slow_query_log(app)
     ma.init_app(app)
     limiter.init_app(app)
     cache.init_app(app)
+    init_compression(app)
     
     app.register_blueprint(customers_bp, url_prefix="/customers")
     app.register_blueprint(mechanics_bp, url_prefix="/mechanics")
     app.register_blueprint(service_ticket_bp, url_prefix="/serviceticket")
     app.register_blueprint(inventory_db, url_prefix="/inventory")
+    app.register_blueprint(metrics_bp, url_prefix="/metrics")
+    app.register_blueprint(reports_bp, url_prefix="/reports")
     app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+    
+    app.cli.add_command(upgrade_schema_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(slow_queries_command)
 
     return app
\ No newline at end of file
@@ -1,12 +1,20 @@
 from flask import request, jsonify
 from marshmallow import ValidationError
-from sqlalchemy import select
-from .schemas import customer_schema, customers_schema, login_schema, customer_schema_no_password
-from app.blueprints.service_ticket.schemas import service_tickets_schema
-from app.models import Customer, db
-from app.extensions import limiter, cache
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from .schemas import customer_schema, login_schema, customer_schema_no_password, bulk_customer_schema, customer_fieldset, customer_page_args_schema, customer_search_args_schema
+from app.blueprints.service_ticket.schemas import ticket_fieldset, ticket_list_args_schema, dump_tickets
+from app.models import Customer, ServiceTicket, db
+from app.extensions import limiter
 from . import customers_bp
-from app.utils.util import encode_token, token_required_customer
+from app.utils.util import encode_token, token_required_customer, token_required_mechanic, current_customer, current_mechanic
+from app.utils.passwords import hash_password, hash_passwords, verify_password, PasswordPoolBusy, UNUSABLE_PASSWORD
+from app.utils.bulk import upload_format, read_upload, chunked, BulkErrors
+from app.utils.search import search, index_documents
+from app.utils.pagination import paginate_by_id, add_page_headers
+from app.utils.caching import cached_view, bump_cache_version
+from app.utils.rollups import remove_tickets
 
 # POST '/login' : Customer login
 @customers_bp.route('/login', methods=['POST'])
@@ -21,7 +29,17 @@ def customer_login():
     query = select(Customer).where(Customer.email == username)
     customer = db.session.execute(query).scalar_one_or_none()
     
-    if customer and customer.password == password:
+    try:
+        valid, needs_rehash = verify_password(customer.password if customer else None, password)
+        
+        # Replace a plain text password left from before passwords were hashed
+        if valid and needs_rehash:
+            customer.password = hash_password(password)
+            db.session.commit()
+    except PasswordPoolBusy:
+        return jsonify({'error': 'Too many login attempts, please try again'}), 503
+    
+    if valid:
         auth_token = encode_token(customer.id, "customer")
         
         response = {
@@ -54,29 +72,136 @@ def create_customer():
     if existing_customer:
         return jsonify({"error": "Customer exists already"}), 400
     
+    try:
+        customer_data['password'] = hash_password(customer_data['password'])
+    except PasswordPoolBusy:
+        return jsonify({'error': 'Server busy, please try again'}), 503
+    
     new_customer = Customer(**customer_data)
     db.session.add(new_customer)
     db.session.commit()
+    bump_cache_version('customers')
     
-    return customer_schema.jsonify(new_customer), 201
+    return customer_schema_no_password.jsonify(new_customer), 201
 
-# GET '/' : Gets all customers (can be paginated), customer data excludes passwords
+# Insert customers with one executemany statement and index them, in one transaction
+def _insert_customers(new_customers):
+    db.session.execute(insert(Customer), new_customers)
+    
+    # Core inserts skip the session events, index the new customers here
+    query = select(Customer.id, Customer.name, Customer.email).where(Customer.email.in_([customer_data['email'] for customer_data in new_customers]))
+    index_documents('customer', [(row.id, row._mapping) for row in db.session.execute(query)])
+    db.session.commit()
+
+# POST '/bulk' : Import customers from an NDJSON or CSV upload (name, email, phone and optional password per row). Rows are checked and
+# inserted in chunks, rows with invalid data or an email that already exists are skipped and reported (mechanic login required)
+@customers_bp.route("/bulk", methods=["POST"])
+@limiter.limit("10 per hour")
+@token_required_mechanic
+def bulk_create_customers(mechanic_id):
+    if not current_mechanic():
+        return jsonify({'error': 'Unauthorized Access'}), 400
+    
+    upload = upload_format()
+    if upload is None:
+        return jsonify({'error': "format must be 'ndjson' or 'csv'"}), 400
+    
+    errors = BulkErrors()
+    seen_emails = set() # Emails already taken by an earlier row of this upload
+    inserted = 0
+    
+    try:
+        for chunk in chunked(read_upload(upload)):
+            rows = {}
+            for row, record, error in chunk:
+                if error:
+                    errors.add(row, error)
+                    continue
+                
+                if upload == 'csv' and not record.get('password'):
+                    record.pop('password', None) # Empty CSV cell means no password
+                try:
+                    customer_data = bulk_customer_schema.load(record)
+                except ValidationError as e:
+                    errors.add(row, e.messages)
+                    continue
+                
+                # All email will be stored as lowercase strings
+                customer_data['email'] = customer_data['email'].lower()
+                if customer_data['email'] in seen_emails:
+                    errors.add(row, 'Duplicate email in upload')
+                    continue
+                seen_emails.add(customer_data['email'])
+                rows[row] = customer_data
+            
+            # One query for every email of the chunk that is already registered
+            if rows:
+                query = select(Customer.email).where(Customer.email.in_([customer_data['email'] for customer_data in rows.values()]))
+                existing_emails = set(db.session.execute(query).scalars())
+                for row in [row for row, customer_data in rows.items() if customer_data['email'] in existing_emails]:
+                    errors.add(row, 'Customer exists already')
+                    del rows[row]
+            
+            if rows:
+                new_customers = list(rows.values())
+                passwords = [customer_data['password'] for customer_data in new_customers if customer_data['password']]
+                hashed = iter(hash_passwords(passwords))
+                for customer_data in new_customers:
+                    customer_data['password'] = next(hashed) if customer_data['password'] else UNUSABLE_PASSWORD
+                
+                try:
+                    _insert_customers(new_customers)
+                    inserted += len(new_customers)
+                except IntegrityError:
+                    # An email registered by another request since the check above: retry the chunk row by row to report it
+                    db.session.rollback()
+                    for row, customer_data in rows.items():
+                        try:
+                            _insert_customers([customer_data])
+                            inserted += 1
+                        except IntegrityError:
+                            db.session.rollback()
+                            errors.add(row, 'Customer exists already')
+    except PasswordPoolBusy:
+        db.session.rollback()
+        return jsonify({'error': 'Server busy, please try again', 'inserted': inserted, **errors.report()}), 503
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'error': 'Upload must be UTF-8 text', 'inserted': inserted, **errors.report()}), 400
+    finally:
+        if inserted:
+            bump_cache_version('customers')
+    
+    return jsonify({'inserted': inserted, **errors.report()}), 200
+
+# GET '/' : Gets all customers (paginated with per_page and cursor query parameters, 'fields' picks the fields returned), customer data excludes passwords
 @customers_bp.route("/", methods=["GET"])
-@cache.cached(timeout=60) # Cache customer data for 1 min
+@cached_view('customers', timeout=3600, args_schema=customer_page_args_schema) # Cache each page of customer data for 1 hour (rebuilt as soon as a customer changes)
 def get_all_customers():
     try:
-        page = int(request.args.get('page'))
-        per_page = int(request.args.get('per_page'))
-        query = select(Customer)
-        customers = db.paginate(query, page=page, per_page=per_page) # If page doesn't exist or error in inputs, exception will be run
-        return customers_schema.jsonify(customers), 200
-    except:
-        query = select(Customer)
-        customers = db.session.execute(query).scalars().all()
-        return customers_schema.jsonify(customers), 200
-        
+        page_args = customer_page_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
+    
+    query = select(Customer).options(*customer_fieldset.load_options(page_args['field_names']))
+    customers, next_cursor, total = paginate_by_id(query, Customer.id, page_args)
+    
+    return add_page_headers(jsonify(customer_fieldset.dump(page_args['field_names'], customers)), next_cursor, total), 200
     
 
+# GET '/search' : Search customers by name or email ('q' query parameter, the last letters of words may be left out), best matches first (paginated), customer data excludes passwords
+@customers_bp.route("/search", methods=["GET"])
+@cached_view('customers', timeout=3600, args_schema=customer_search_args_schema) # Cache each page of results for 1 hour (rebuilt as soon as a customer changes)
+def search_customers():
+    try:
+        args = customer_search_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
+    
+    customers, next_cursor, total = search('customer', args['q'], args, options=customer_fieldset.load_options(args['field_names']))
+    
+    return add_page_headers(jsonify(customer_fieldset.dump(args['field_names'], customers)), next_cursor, total), 200
+
 # GET '/<customer_id>' : Gets specific customer based on id (log in not required)
 @customers_bp.route("/<int:customer_id>", methods=["GET"])
 def get_customer(customer_id):
@@ -91,7 +216,7 @@ def get_customer(customer_id):
 @limiter.limit("3 per day") # Prevent customers from updating their information too many times
 @token_required_customer # Require login to update customer info
 def update_customer(customer_id):
-    customer = db.session.get(Customer, customer_id)
+    customer = current_customer()
     
     if not customer:
         return jsonify({"error":"Customer not found"}), 404
@@ -111,38 +236,59 @@ def update_customer(customer_id):
     if existing_email and customer not in existing_email:
         return jsonify({"error": "email already exists. Please use another email."}), 400
     
+    if customer_data['password']:
+        try:
+            customer_data['password'] = hash_password(customer_data['password'])
+        except PasswordPoolBusy:
+            return jsonify({'error': 'Server busy, please try again'}), 503
+    
     # Update customer entry
     for key, value in customer_data.items():
         if value:
             setattr(customer, key, value)
     
     db.session.commit()
-    return customer_schema.jsonify(customer), 200
+    bump_cache_version('customers')
+    return customer_schema_no_password.jsonify(customer), 200
 
 # DELETE '/' : Delete customer based on customer id (and all their service tickets)
 @customers_bp.route("/", methods=["DELETE"])
 @token_required_customer # require customer login to delete account
 def delete_customer(customer_id):
-    customer = db.session.get(Customer, customer_id)
+    customer = current_customer()
     
     if not customer:
         return jsonify({"error": "Customer not found"}), 404
         
+    # Load the tickets the delete cascades to, with their item lines and mechanics, in three queries instead of two per ticket
+    query = select(Customer).where(Customer.id == customer.id).options(selectinload(Customer.tickets).options(selectinload(ServiceTicket.items), selectinload(ServiceTicket.mechanics)))
+    db.session.execute(query.execution_options(populate_existing=True)).scalar_one()
+    remove_tickets(ServiceTicket.customer_id == customer.id)
     db.session.delete(customer)
     db.session.commit()
+    bump_cache_version('customers', 'tickets') # Customer's service tickets are deleted too
     
     return jsonify({"message": "Customer successfully deleted"}), 200
 
 
-# GET '/my-tickets' : Get all service tickets associated with customer
+# GET '/my-tickets' : Get all service tickets associated with customer ('fields' picks the fields returned, 'include=total' adds each ticket's cost)
 @customers_bp.route('/my-tickets', methods=['GET'])
 @token_required_customer
+@cached_view('tickets', 'customers', 'mechanics', 'inventory', timeout=3600, args_schema=ticket_list_args_schema, vary_on_principal=True) # Cached separately for each customer
 def get_tickets(customer_id):
-    customer = db.session.get(Customer, customer_id)
+    customer = current_customer()
     
     if not customer:
         return jsonify({'error':'customer not found'}), 404
     
-    return service_tickets_schema.jsonify(customer.tickets), 200
+    try:
+        args = ticket_list_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
+    
+    query = select(ServiceTicket).where(ServiceTicket.customer_id == customer.id).options(*ticket_fieldset.load_options(args['field_names']))
+    tickets = db.session.execute(query).scalars().all()
+    
+    return jsonify(dump_tickets(tickets, args['field_names'], args['include'])), 200
     
     
\ No newline at end of file
@@ -1,11 +1,42 @@
 from app.models import Customer
 from app.extensions import ma
+from marshmallow import fields, validate
+from app.utils.pagination import PageArgsSchema
+from app.utils.search import SearchArgsSchema
+from app.utils.fieldsets import Fieldset
 
 class CustomerSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Customer
         
+# One row of a bulk import. Password is optional, customers imported without one cannot log in.
+# Plain schema with the same rules as CustomerSchema, the auto schema looks up package metadata on every load which is too slow for thousands of rows.
+class BulkCustomerSchema(ma.Schema):
+    name = fields.String(required=True, validate=validate.Length(max=255))
+    email = fields.String(required=True, validate=validate.Length(max=255))
+    phone = fields.String(required=True, validate=validate.Length(max=255))
+    password = fields.String(load_default=None, validate=validate.Length(max=255))
+        
 customer_schema = CustomerSchema()
 customer_schema_no_password = CustomerSchema(exclude=['password'])
 customers_schema = CustomerSchema(many=True, exclude=['password']) # Exclude password when getting information for multiple customers
-login_schema = CustomerSchema(exclude=['name', 'phone'])
\ No newline at end of file
+login_schema = CustomerSchema(exclude=['name', 'phone'])
+bulk_customer_schema = BulkCustomerSchema()
+
+customer_fieldset = Fieldset(customers_schema, Customer)
+
+# 'fields' query parameter of the customer lists (id, name, email, phone)
+class CustomerFieldsArgsSchema(ma.Schema):
+    field_names = customer_fieldset.args_field()
+    
+    class Meta:
+        unknown = 'exclude'
+
+class CustomerPageArgsSchema(PageArgsSchema, CustomerFieldsArgsSchema):
+    pass
+
+class CustomerSearchArgsSchema(SearchArgsSchema, CustomerFieldsArgsSchema):
+    pass
+
+customer_page_args_schema = CustomerPageArgsSchema()
+customer_search_args_schema = CustomerSearchArgsSchema()
@@ -1,30 +1,41 @@
 from . import inventory_db
-from .schemas import inventory_schema, inventories_schema
+from .schemas import inventory_schema, bulk_item_schema, inventory_fieldset, inventory_page_args_schema, inventory_search_args_schema
 from flask import request, jsonify
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from marshmallow import ValidationError
-from app.models import Inventory, db, Mechanic
-from app.utils.util import token_required_mechanic
+from app.models import Inventory, db
+from app.utils.util import token_required_mechanic, current_mechanic
+from app.utils.pagination import paginate_by_id, add_page_headers
+from app.utils.caching import cached_view, bump_cache_version
+from app.utils.bulk import upload_format, read_upload, chunked, BulkErrors
+from app.utils.search import search, index_documents
+from app.utils.rollups import remove_part
+from app.utils.upsert import upsert_rows
+
+# Item names are case insensitive and stored lowercased with single spaces, so 'Brake  Pads' and 'brake pads' are the same item
+def normalize_item_name(name):
+    return ' '.join(name.lower().split())
 
 # POST '/' : create item
 @inventory_db.route("/", methods=["POST"])
 @token_required_mechanic
 def create_item(mechanic_id):
     # Verify mechanic exists
-    mechanic = db.session.get(Mechanic, mechanic_id)
+    mechanic = current_mechanic()
     if not mechanic:
         return jsonify({'error': 'Unauthorized Access'}), 400
     
     #  Load data from client side
     try:
         data = inventory_schema.load(request.json)
-        data['name'] = data['name'].lower()
+        data['name'] = normalize_item_name(data['name'])
     except ValidationError as e:
         return jsonify(e.messages), 400
 
-    # Find exact same item in inventory list (item name is case insensitive)
-    query = select(Inventory).where(Inventory.name == data['name'] and Inventory.price == data['price'])
-    item = db.session.execute(query).scalars().all()
+    # Item names are unique (case insensitive), whatever the price
+    query = select(Inventory.id).where(Inventory.name == data['name']).limit(1)
+    item = db.session.execute(query).first()
     
     if item:
         return jsonify({'message':'Item already exists'}), 400
@@ -32,17 +43,114 @@ def create_item(mechanic_id):
     # Create new item if not already in the inventory list
     new_item = Inventory(**data)
     db.session.add(new_item)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError: # Created by another request since the check above
+        db.session.rollback()
+        return jsonify({'message':'Item already exists'}), 400
+    bump_cache_version('inventory')
     
     return inventory_schema.jsonify(new_item), 201
 
-# GET '/' : get all items
+# POST '/bulk' : Upsert items from an NDJSON or CSV price file (name and price per row). Items are matched by normalized name:
+# new names are inserted, existing items get the new price. Rows are checked and written in chunks, invalid rows are skipped and reported
+@inventory_db.route("/bulk", methods=["POST"])
+@token_required_mechanic
+def bulk_upsert_items(mechanic_id):
+    # Verify mechanic exists
+    if not current_mechanic():
+        return jsonify({'error': 'Unauthorized Access'}), 400
+    
+    upload = upload_format()
+    if upload is None:
+        return jsonify({'error': "format must be 'ndjson' or 'csv'"}), 400
+    
+    errors = BulkErrors()
+    seen_names = set()
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    
+    try:
+        for chunk in chunked(read_upload(upload)):
+            prices = {}
+            for row, record, error in chunk:
+                if error:
+                    errors.add(row, error)
+                    continue
+                
+                try:
+                    data = bulk_item_schema.load(record)
+                except ValidationError as e:
+                    errors.add(row, e.messages)
+                    continue
+                
+                name = normalize_item_name(data['name'])
+                if not name:
+                    errors.add(row, {'name': ['Name must not be blank.']})
+                    continue
+                if name in seen_names:
+                    errors.add(row, 'Duplicate name in upload')
+                    continue
+                seen_names.add(name)
+                prices[name] = data['price']
+            
+            if not prices:
+                continue
+            
+            # One query for the current price of every name in the chunk
+            query = select(Inventory.name, Inventory.price).where(Inventory.name.in_(prices))
+            current_prices = {}
+            for name, price in db.session.execute(query):
+                current_prices.setdefault(name, set()).add(price)
+            
+            new_items = [{'name': name, 'price': price} for name, price in prices.items() if name not in current_prices]
+            changed = [{'name': name, 'price': price} for name, price in prices.items() if name in current_prices and current_prices[name] != {price}]
+            counts['unchanged'] += len(prices) - len(new_items) - len(changed)
+            
+            # One upsert on the unique name writes new and changed items. A name inserted by another upload since the
+            # select above gets this upload's price instead of failing on the unique key.
+            upsert_rows(Inventory.__table__, ['name'], new_items + changed)
+            counts['updated'] += len(changed)
+            counts['inserted'] += len(new_items)
+            if new_items:
+                # Core inserts skip the session events, index the new items here
+                query = select(Inventory.id, Inventory.name).where(Inventory.name.in_([item['name'] for item in new_items]))
+                index_documents('inventory', [(row.id, row._mapping) for row in db.session.execute(query)])
+            db.session.commit()
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'error': 'Upload must be UTF-8 text', **counts, **errors.report()}), 400
+    finally:
+        if counts['inserted'] or counts['updated']:
+            bump_cache_version('inventory')
+    
+    return jsonify({**counts, **errors.report()}), 200
+
+# GET '/' : get all items (paginated with per_page and cursor query parameters, 'fields' picks the fields returned)
 @inventory_db.route('/', methods=["GET"])
+@cached_view('inventory', timeout=3600, args_schema=inventory_page_args_schema) # Cache each page of items for 1 hour (rebuilt as soon as an item changes)
 def get_items():
-    query = select(Inventory)
-    items = db.session.execute(query).scalars().all()
+    try:
+        page_args = inventory_page_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
+    
+    query = select(Inventory).options(*inventory_fieldset.load_options(page_args['field_names']))
+    items, next_cursor, total = paginate_by_id(query, Inventory.id, page_args)
+    
+    return add_page_headers(jsonify(inventory_fieldset.dump(page_args['field_names'], items)), next_cursor, total), 200
+
+# GET '/search' : Search items by name ('q' query parameter, the last letters of words may be left out), best matches first (paginated)
+@inventory_db.route('/search', methods=["GET"])
+@cached_view('inventory', timeout=3600, args_schema=inventory_search_args_schema) # Cache each page of results for 1 hour (rebuilt as soon as an item changes)
+def search_items():
+    try:
+        args = inventory_search_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
+    
+    items, next_cursor, total = search('inventory', args['q'], args, options=inventory_fieldset.load_options(args['field_names']))
     
-    return inventories_schema.jsonify(items), 200
+    return add_page_headers(jsonify(inventory_fieldset.dump(args['field_names'], items)), next_cursor, total), 200
 
 # GET '/<int:item_id> : get item by id
 @inventory_db.route('/<int:item_id>', methods=["GET"])
@@ -59,14 +167,14 @@ def get_item(item_id):
 @token_required_mechanic
 def update_item(mechanic_id, item_id):
     # Verify mechanic exists
-    mechanic = db.session.get(Mechanic, mechanic_id)
+    mechanic = current_mechanic()
     if not mechanic:
         return jsonify({'error': 'Unauthorized Access'}), 400
     
     # Load and validate data
     try:
         data = inventory_schema.load(request.json)
-        data['name'] = data['name'].lower()
+        data['name'] = normalize_item_name(data['name'])
     except ValidationError as e:
         return jsonify(e.messages), 400
     
@@ -77,12 +185,23 @@ def update_item(mechanic_id, item_id):
     if not item:
         return jsonify({'error':'Item not found'}), 404
     
+    # A new name must not be used by another item
+    if data['name'] and data['name'] != item.name:
+        query = select(Inventory.id).where(Inventory.name == data['name']).limit(1)
+        if db.session.execute(query).first():
+            return jsonify({'message':'Item already exists'}), 400
+    
     # Update item
     for key, value in data.items():
         if value:
             setattr(item, key, value)
-        
-    db.session.commit()
+    
+    try:
+        db.session.commit()
+    except IntegrityError: # Name taken by another request since the check above
+        db.session.rollback()
+        return jsonify({'message':'Item already exists'}), 400
+    bump_cache_version('inventory')
     
     return inventory_schema.jsonify(item), 200
 
@@ -91,7 +210,7 @@ def update_item(mechanic_id, item_id):
 @token_required_mechanic
 def delete_item(mechanic_id, item_id):
     # Verify mechanic exists
-    mechanic = db.session.get(Mechanic, mechanic_id)
+    mechanic = current_mechanic()
     if not mechanic:
         return jsonify({'error': 'Unauthorized Access'}), 400
     
@@ -100,7 +219,9 @@ def delete_item(mechanic_id, item_id):
     if not item:
         return jsonify({'error':'Item not found'}), 404
     
+    remove_part(item.id)
     db.session.delete(item)
     db.session.commit()
+    bump_cache_version('inventory')
     
     return jsonify({'message':'Item successfully deleted'}), 200
\ No newline at end of file
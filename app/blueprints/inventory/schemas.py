@@ -1,10 +1,37 @@
 from app.extensions import ma
 from app.models import Inventory
-from marshmallow import fields
+from marshmallow import fields, validate
+from app.utils.pagination import PageArgsSchema
+from app.utils.search import SearchArgsSchema
+from app.utils.fieldsets import Fieldset
 
 class InventorySchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Inventory
         
+# One row of a bulk price file, plain schema with the same rules as InventorySchema (the auto schema is too slow per row)
+class BulkItemSchema(ma.Schema):
+    name = fields.String(required=True, validate=validate.Length(max=255))
+    price = fields.Float(required=True)
+        
 inventory_schema = InventorySchema()
-inventories_schema = InventorySchema(many=True)
\ No newline at end of file
+inventories_schema = InventorySchema(many=True)
+bulk_item_schema = BulkItemSchema()
+
+inventory_fieldset = Fieldset(inventories_schema, Inventory)
+
+# 'fields' query parameter of the item lists (id, name, price)
+class InventoryFieldsArgsSchema(ma.Schema):
+    field_names = inventory_fieldset.args_field()
+    
+    class Meta:
+        unknown = 'exclude'
+
+class InventoryPageArgsSchema(PageArgsSchema, InventoryFieldsArgsSchema):
+    pass
+
+class InventorySearchArgsSchema(SearchArgsSchema, InventoryFieldsArgsSchema):
+    pass
+
+inventory_page_args_schema = InventoryPageArgsSchema()
+inventory_search_args_schema = InventorySearchArgsSchema()
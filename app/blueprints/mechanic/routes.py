@@ -1,11 +1,14 @@
 from . import mechanics_bp
-from .schemas import mechanic_schema, mechanics_schema, login_schema
+from .schemas import mechanic_schema, mechanic_schema_no_password, login_schema, ranked_mechanics_schema, ranked_args_schema, mechanic_page_args_schema, mechanic_fieldset
 from flask import request, jsonify
 from marshmallow import ValidationError
-from app.models import Mechanic, db
-from sqlalchemy import select
-from app.extensions import limiter, cache
-from app.utils.util import encode_token, token_required_mechanic
+from app.models import Mechanic, ServiceTicket, db, service_mechanics
+from sqlalchemy import select, func, or_, and_
+from app.extensions import limiter
+from app.utils.util import encode_token, token_required_mechanic, current_mechanic
+from app.utils.passwords import hash_password, verify_password, PasswordPoolBusy
+from app.utils.pagination import paginate_by_id, add_page_headers, count_rows, encode_cursor, is_cursor_value
+from app.utils.caching import cached_view, bump_cache_version
 
 # POST '/login' : Mechanic login
 @mechanics_bp.route('/login', methods=['POST'])
@@ -20,7 +23,17 @@ def login():
     query = select(Mechanic).where(Mechanic.email == username)
     mechanic = db.session.execute(query).scalar_one_or_none()
     
-    if mechanic and mechanic.password == password:
+    try:
+        valid, needs_rehash = verify_password(mechanic.password if mechanic else None, password)
+        
+        # Replace a plain text password left from before passwords were hashed
+        if valid and needs_rehash:
+            mechanic.password = hash_password(password)
+            db.session.commit()
+    except PasswordPoolBusy:
+        return jsonify({'error': 'Too many login attempts, please try again'}), 503
+    
+    if valid:
         token = encode_token(mechanic.id, 'mechanic')
         
         response = {
@@ -51,28 +64,39 @@ def add_mechanic():
     if existing_mechanic:
         return jsonify({"error": "Email already registered"}), 400
     
+    try:
+        mechanic['password'] = hash_password(mechanic['password'])
+    except PasswordPoolBusy:
+        return jsonify({'error': 'Server busy, please try again'}), 503
+    
     #create new mechanic
     new_mechanic = Mechanic(**mechanic)
     db.session.add(new_mechanic)
     db.session.commit()
+    bump_cache_version('mechanics')
     
-    return mechanic_schema.jsonify(new_mechanic), 201
+    return mechanic_schema_no_password.jsonify(new_mechanic), 201
 
 
-# GET '/': Retrieves all Mechanics (mechanic data excludes password and salary)
+# GET '/': Retrieves all Mechanics (mechanic data excludes password and salary, paginated with per_page and cursor query parameters, 'fields' picks the fields returned)
 @mechanics_bp.route("/", methods=["GET"])
-@cache.cached(timeout=60) # Cache all mechanics info for 1 min
+@cached_view('mechanics', timeout=3600, args_schema=mechanic_page_args_schema) # Cache each page of mechanics info for 1 hour (rebuilt as soon as a mechanic changes)
 def get_mechanics():
-    query = select(Mechanic)
+    try:
+        page_args = mechanic_page_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
     
-    mechanics = db.session.execute(query).scalars().all()
-    return mechanics_schema.jsonify(mechanics), 200
+    query = select(Mechanic).options(*mechanic_fieldset.load_options(page_args['field_names']))
+    mechanics, next_cursor, total = paginate_by_id(query, Mechanic.id, page_args)
+    
+    return add_page_headers(jsonify(mechanic_fieldset.dump(page_args['field_names'], mechanics)), next_cursor, total), 200
 
 # PUT '/':  Update Mechanic
 @mechanics_bp.route("/", methods=["PUT"])
 @token_required_mechanic
 def update_mechanic(id):
-    mechanic = db.session.get(Mechanic, id)
+    mechanic = current_mechanic()
 
     if not mechanic:
         return jsonify({"error": "Mechanic not found"}), 404
@@ -91,35 +115,72 @@ def update_mechanic(id):
     if existing_mechanic and mechanic not in existing_mechanic:
         return jsonify({"error":"Duplicate email. Please use another email."}), 400
     
+    if updates['password']:
+        try:
+            updates['password'] = hash_password(updates['password'])
+        except PasswordPoolBusy:
+            return jsonify({'error': 'Server busy, please try again'}), 503
+    
     #update mechanic
     for key, value in updates.items():
         if value:
             setattr(mechanic, key, value)
     
     db.session.commit()
-    return mechanic_schema.jsonify(mechanic), 200
+    bump_cache_version('mechanics')
+    return mechanic_schema_no_password.jsonify(mechanic), 200
     
 
 # DELETE '/': Delete mechanic
 @mechanics_bp.route("/", methods=["DELETE"])
 @token_required_mechanic
 def delete_mechanic(id):
-    mechanic = db.session.get(Mechanic, id)
+    mechanic = current_mechanic()
     if not mechanic:
         return jsonify({"error": "Mechanic not found"}), 404
 
     db.session.delete(mechanic)
     db.session.commit()
+    bump_cache_version('mechanics')
     
     return jsonify({"message": "Mechanic deleted"}), 200
 
 
-# GET '/ranked' : rank mechanics based on most service tickets worked on (mechanic data excludes password and salary)
+# GET '/ranked' : rank mechanics based on most service tickets worked on (mechanic data excludes password and salary, paginated with per_page and cursor query parameters). Optional start_date/end_date only count tickets with a service_date in that window.
 @mechanics_bp.route('/ranked', methods=['GET'])
 def ranked_mechanics():
-    query = select(Mechanic)
-    mechanics = db.session.execute(query).scalars().all()
-    
-    mechanics.sort(key = lambda mechanic : len(mechanic.tickets), reverse = True)
+    try:
+        args = ranked_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
     
-    return mechanics_schema.jsonify(mechanics), 200
\ No newline at end of file
+    cursor = args['cursor']
+    if cursor and not is_cursor_value(cursor.get('ticket_count')):
+        return jsonify({'cursor': ['Invalid cursor.']}), 400
+    
+    # Count tickets per mechanic with a GROUP BY over the service_mechanics index instead of loading ticket objects
+    counts = select(service_mechanics.c.mechanic_id, func.count().label('ticket_count')).group_by(service_mechanics.c.mechanic_id)
+    if args['start_date'] or args['end_date']:
+        counts = counts.join(ServiceTicket, ServiceTicket.id == service_mechanics.c.ticket_id)
+        if args['start_date']:
+            counts = counts.where(ServiceTicket.service_date >= args['start_date'])
+        if args['end_date']:
+            counts = counts.where(ServiceTicket.service_date <= args['end_date'])
+    counts = counts.subquery()
+    
+    ticket_count = func.coalesce(counts.c.ticket_count, 0)
+    query = select(Mechanic.id, Mechanic.name, Mechanic.email, Mechanic.phone, ticket_count.label('ticket_count')).outerjoin(counts, counts.c.mechanic_id == Mechanic.id)
+    total = count_rows(select(Mechanic.id)) if args['count'] else None
+    
+    # Keyset on (ticket count descending, id ascending)
+    if cursor:
+        query = query.where(or_(ticket_count < cursor['ticket_count'], and_(ticket_count == cursor['ticket_count'], Mechanic.id > cursor['id'])))
+    query = query.order_by(ticket_count.desc(), Mechanic.id).limit(args['per_page'] + 1)
+    rows = db.session.execute(query).all()
+    
+    next_cursor = None
+    if len(rows) > args['per_page']:
+        rows = rows[:args['per_page']]
+        next_cursor = encode_cursor({'id': rows[-1].id, 'ticket_count': rows[-1].ticket_count})
+    
+    return add_page_headers(ranked_mechanics_schema.jsonify([row._mapping for row in rows]), next_cursor, total), 200
\ No newline at end of file
@@ -1,10 +1,36 @@
 from app.extensions import ma
 from app.models import Mechanic
+from app.utils.pagination import PageArgsSchema
+from app.utils.fieldsets import Fieldset
+from app.utils.date_window import DateWindowArgsSchema
+from marshmallow import fields
 
 class MechanicSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Mechanic
         
 mechanic_schema = MechanicSchema()
+mechanic_schema_no_password = MechanicSchema(exclude=['password'])
 mechanics_schema = MechanicSchema(many=True, exclude=['password', 'salary']) # Exclude password and salary when getting information for multiple mechanics
-login_schema = MechanicSchema(exclude=['name', 'phone', 'salary'])
\ No newline at end of file
+login_schema = MechanicSchema(exclude=['name', 'phone', 'salary'])
+mechanic_fieldset = Fieldset(mechanics_schema, Mechanic)
+
+# Query parameters for the mechanic list: pagination plus the fields to return (id, name, email, phone)
+class MechanicPageArgsSchema(PageArgsSchema):
+    field_names = mechanic_fieldset.args_field()
+
+# Leaderboard row: mechanic contact info and number of service tickets worked on
+class RankedMechanicSchema(ma.Schema):
+    id = fields.Int()
+    name = fields.Str()
+    email = fields.Str()
+    phone = fields.Str()
+    ticket_count = fields.Int()
+
+# Query parameters for the leaderboard: pagination plus an optional service_date window
+class RankedArgsSchema(PageArgsSchema, DateWindowArgsSchema):
+    pass
+
+ranked_mechanics_schema = RankedMechanicSchema(many=True)
+ranked_args_schema = RankedArgsSchema()
+mechanic_page_args_schema = MechanicPageArgsSchema()
@@ -0,0 +1,14 @@
+from flask import jsonify
+from app.utils.util import token_required_mechanic
+from app.utils.db_pool import pool_stats
+from . import metrics_bp
+
+# GET '/db-pool' : Connection pool numbers of the worker that answers (checkouts, wait time, overflow), for sizing workers against the database (mechanic login required)
+@metrics_bp.route("/db-pool", methods=["GET"])
+@token_required_mechanic
+def get_db_pool(mechanic_id):
+    stats = pool_stats()
+    if stats is None:
+        return jsonify({'error': 'Connection pool metrics are not enabled'}), 404
+    
+    return jsonify(stats), 200
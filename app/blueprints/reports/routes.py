@@ -0,0 +1,33 @@
+from flask import request, jsonify
+from marshmallow import ValidationError
+from app.utils.util import token_required_mechanic
+from app.utils.caching import cached_view
+from app.utils.rollups import daily_report, top_parts
+from .schemas import report_args_schema, top_parts_args_schema
+from . import reports_bp
+
+# Reports read the rollup tables (app/utils/rollups.py), so they cost the same however many tickets are stored
+
+# GET '/daily' : Tickets, parts used and revenue per service date, optional start_date/end_date window (mechanic login required)
+@reports_bp.route("/daily", methods=["GET"])
+@token_required_mechanic
+@cached_view('tickets', 'inventory', timeout=3600, args_schema=report_args_schema) # Same report for every mechanic, rebuilt as soon as tickets or prices change
+def get_daily_report(mechanic_id):
+    try:
+        args = report_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
+    
+    return jsonify(daily_report(args['start_date'], args['end_date'])), 200
+
+# GET '/top-parts' : Parts used most (by quantity) with their revenue, optional start_date/end_date window and limit (mechanic login required)
+@reports_bp.route("/top-parts", methods=["GET"])
+@token_required_mechanic
+@cached_view('tickets', 'inventory', timeout=3600, args_schema=top_parts_args_schema)
+def get_top_parts(mechanic_id):
+    try:
+        args = top_parts_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
+    
+    return jsonify(top_parts(args['start_date'], args['end_date'], args['limit'])), 200
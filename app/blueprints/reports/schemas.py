@@ -0,0 +1,14 @@
+from app.utils.date_window import DateWindowArgsSchema
+from marshmallow import fields
+from marshmallow.validate import Range
+
+# Query parameters of the reports: an optional service date window (inclusive)
+class ReportArgsSchema(DateWindowArgsSchema):
+    class Meta:
+        unknown = 'exclude'
+
+class TopPartsArgsSchema(ReportArgsSchema):
+    limit = fields.Int(load_default=10, validate=Range(min=1, max=100))
+
+report_args_schema = ReportArgsSchema()
+top_parts_args_schema = TopPartsArgsSchema()
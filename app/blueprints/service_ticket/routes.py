@@ -1,12 +1,24 @@
 from . import service_ticket_bp
-from .schemas import service_ticket_schema, service_tickets_schema, edit_service_ticket_schema, add_items_schema
-from flask import request, jsonify
-from sqlalchemy import select
+from .schemas import service_ticket_schema, edit_service_ticket_schema, add_items_schema, ticket_load_options, ticket_filter_args_schema, ticket_search_args_schema, ticket_fieldset, dump_tickets
+from flask import request, jsonify, Response, stream_with_context
+from sqlalchemy import select, delete
+import csv
+import io
+import json
 from marshmallow import ValidationError
-from app.models import ServiceTicket, db, Customer, Mechanic, Inventory, InventoryServiceTicket
-from app.extensions import cache
+from app.models import ServiceTicket, db, Mechanic, Inventory, InventoryServiceTicket, service_mechanics
 from app.extensions import limiter
-from app.utils.util import token_required_mechanic, token_required_customer
+from app.utils.util import token_required_mechanic, token_required_customer, current_mechanic, current_customer
+from app.utils.pagination import paginate_by_id, add_page_headers
+from app.utils.caching import cached_view, bump_cache_version
+from app.utils.search import search
+from app.utils.invoices import ticket_invoice
+from app.utils.rollups import record_ticket, record_parts, remove_tickets
+from app.utils.serializers import dump, load
+from app.utils.upsert import upsert_increments, insert_missing
+
+EXPORT_BATCH_SIZE = 500 # Tickets fetched from the database per round trip when exporting
+EXPORT_CSV_COLUMNS = ['id', 'VIN', 'service_date', 'service_desc', 'customer_name', 'customer_email', 'customer_phone', 'mechanics', 'items']
 
 
 # POST '/': Pass in all the required information to create the service_ticket.
@@ -14,7 +26,7 @@ from app.utils.util import token_required_mechanic, token_required_customer
 @limiter.limit('20 per hour') # Prevent too many service tickets from being created at once
 @token_required_customer #required customer log in to submit a service request
 def create_service_ticket(customer_id):
-    customer = db.session.get(Customer, customer_id)
+    customer = current_customer()
     if not customer:
         return jsonify({"error":"Customer not found"}), 404
 
@@ -26,16 +38,18 @@ def create_service_ticket(customer_id):
     new_ticket = ServiceTicket(**ticket, customer_id=customer.id)
     db.session.add(new_ticket)
     customer.tickets.append(new_ticket)
+    record_ticket(new_ticket.service_date)
     db.session.commit()
+    bump_cache_version('tickets')
     
-    return service_ticket_schema.jsonify(new_ticket), 201
+    return jsonify(dump(service_ticket_schema, new_ticket)), 201
         
 # PUT '/<ticket_id>/assign-mechanic: Adds a relationship between a service ticket and the logged in mechanics. For assigning other mechanics, use the '/<int:ticket_id>/edit' route to edit.
 @service_ticket_bp.route("/<int:ticket_id>/assign-mechanic", methods=["PUT"])
 @token_required_mechanic
 def assign_mechanic(mechanic_id, ticket_id):
     ticket = db.session.get(ServiceTicket, ticket_id)
-    mechanic = db.session.get(Mechanic, mechanic_id)
+    mechanic = current_mechanic()
     
     if not ticket:
         return jsonify({"error": "Service Ticket not found"}), 404
@@ -47,8 +61,9 @@ def assign_mechanic(mechanic_id, ticket_id):
     if mechanic in ticket.mechanics:
         return jsonify({"message": "Mechanic already assigned to service ticket"}), 200
     
-    ticket.mechanics.append(mechanic)
+    insert_missing(service_mechanics, ['ticket_id', 'mechanic_id'], [{'ticket_id': ticket.id, 'mechanic_id': mechanic.id}]) # Also when assigned by another request meanwhile
     db.session.commit()
+    bump_cache_version('tickets')
 
     return jsonify({"message":f"Mechanic {mechanic_id} added to Service Ticket #{ticket_id}"}), 200
 
@@ -57,7 +72,7 @@ def assign_mechanic(mechanic_id, ticket_id):
 @token_required_mechanic
 def remove_mechanic(mechanic_id, ticket_id):
     ticket = db.session.get(ServiceTicket, ticket_id)
-    mechanic = db.session.get(Mechanic, mechanic_id)
+    mechanic = current_mechanic()
     
     # Check if ticket or mechanic exists
     if not ticket or not mechanic:
@@ -70,24 +85,135 @@ def remove_mechanic(mechanic_id, ticket_id):
     # Remove Mechanic from Ticket
     ticket.mechanics.remove(mechanic)    
     db.session.commit()
+    bump_cache_version('tickets')
     
     return jsonify({"message":f"Mechanic successfully removed from Service Ticket #{ticket.id}"}), 200
 
-# GET '/': Retrieves all service tickets.
+# GET '/': Retrieves all service tickets (paginated with per_page and cursor query parameters).
+# Optional filters: VIN, start_date/end_date (service date window), customer_id and mechanic_id (tickets the mechanic is assigned to). 'fields' picks the fields returned, 'include=total' adds each ticket's cost.
 @service_ticket_bp.route("/", methods=["GET"])
-@cache.cached(timeout=60) # Cache all service ticket information for 1 min
+@cached_view('tickets', 'customers', 'mechanics', 'inventory', timeout=3600, args_schema=ticket_filter_args_schema) # Cache each page of service ticket information for 1 hour (rebuilt as soon as a ticket or anything shown on it changes)
 def get_tickets():
-    query = select(ServiceTicket)
-    tickets = db.session.execute(query).scalars().all()
+    try:
+        args = ticket_filter_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
+    
+    query = select(ServiceTicket).options(*ticket_fieldset.load_options(args['field_names']))
+    if args['VIN']:
+        query = query.where(ServiceTicket.VIN == args['VIN'])
+    if args['start_date']:
+        query = query.where(ServiceTicket.service_date >= args['start_date'])
+    if args['end_date']:
+        query = query.where(ServiceTicket.service_date <= args['end_date'])
+    if args['customer_id'] is not None:
+        query = query.where(ServiceTicket.customer_id == args['customer_id'])
+    if args['mechanic_id'] is not None:
+        # Ticket ids come from the (mechanic_id, ticket_id) index of service_mechanics
+        query = query.where(ServiceTicket.id.in_(select(service_mechanics.c.ticket_id).where(service_mechanics.c.mechanic_id == args['mechanic_id'])))
+    tickets, next_cursor, total = paginate_by_id(query, ServiceTicket.id, args)
+    
+    return add_page_headers(jsonify(dump_tickets(tickets, args['field_names'], args['include'])), next_cursor, total), 200
+
+# GET '/search': Search service tickets by description ('q' query parameter, the last letters of words may be left out), best matches first (paginated). 'include=total' adds each ticket's cost.
+@service_ticket_bp.route("/search", methods=["GET"])
+@cached_view('tickets', 'customers', 'mechanics', 'inventory', timeout=3600, args_schema=ticket_search_args_schema) # Cache each page of results for 1 hour (rebuilt as soon as a ticket or anything shown on it changes)
+def search_tickets():
+    try:
+        args = ticket_search_args_schema.load(request.args)
+    except ValidationError as e:
+        return jsonify(e.messages), 400
+    
+    tickets, next_cursor, total = search('ticket', args['q'], args, options=ticket_fieldset.load_options(args['field_names']))
+    
+    return add_page_headers(jsonify(dump_tickets(tickets, args['field_names'], args['include'])), next_cursor, total), 200
+
+# GET '/<int:ticket_id>/invoice': Item lines of a service ticket with their cost and the ticket total, computed in the database
+@service_ticket_bp.route("/<int:ticket_id>/invoice", methods=["GET"])
+@cached_view('tickets', 'inventory', timeout=3600) # Rebuilt as soon as the ticket's items or prices change
+def get_invoice(ticket_id):
+    invoice = ticket_invoice(ticket_id)
+    if invoice is None:
+        return jsonify({'error': 'Service Ticket not found'}), 404
+    
+    return jsonify(invoice), 200
+
+# GET '/export': Streams every service ticket as NDJSON (default) or CSV ('format' query parameter). Rows are read in batches, so memory use does not grow with the number of tickets.
+@service_ticket_bp.route("/export", methods=["GET"])
+def export_tickets():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': "format must be 'ndjson' or 'csv'"}), 400
     
-    return service_tickets_schema.jsonify(tickets), 200
+    # Keyset batches on the primary key: each batch is its own short query, no cursor stays open while the client reads
+    batch_size = EXPORT_BATCH_SIZE
+    query = select(ServiceTicket).options(*ticket_load_options).order_by(ServiceTicket.id).limit(batch_size)
+    
+    def batches():
+        last_id = 0
+        while batch := db.session.execute(query.where(ServiceTicket.id > last_id)).scalars().all():
+            yield batch
+            if len(batch) < batch_size:
+                return
+            last_id = batch[-1].id
+    
+    def generate():
+        if export_format == 'csv':
+            yield _csv_line(EXPORT_CSV_COLUMNS)
+        
+        for batch in batches():
+            if export_format == 'csv':
+                yield ''.join(_csv_line(_ticket_csv_row(ticket)) for ticket in batch)
+            else:
+                yield ''.join(json.dumps(dump(service_ticket_schema, ticket)) + '\n' for ticket in batch)
+            _expunge_tickets(batch) # Release the batch so the identity map does not grow with the export
+    
+    if export_format == 'csv':
+        return Response(stream_with_context(generate()), mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=service_tickets.csv'})
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+def _expunge_tickets(tickets):
+    loaded = set()
+    for ticket in tickets:
+        loaded.add(ticket)
+        loaded.add(ticket.customer)
+        loaded.update(ticket.mechanics)
+        for line in ticket.items:
+            loaded.add(line)
+            loaded.add(line.item)
+    for obj in loaded:
+        if obj is not None and obj in db.session:
+            db.session.expunge(obj)
+
+# The ticket with everything its response shows, loaded in a fixed number of queries rather than one per item line
+def _load_ticket(ticket_id):
+    query = select(ServiceTicket).where(ServiceTicket.id == ticket_id).options(*ticket_load_options)
+    return db.session.execute(query).scalar_one()
+
+def _ticket_csv_row(ticket):
+    return [
+        ticket.id,
+        ticket.VIN,
+        ticket.service_date.isoformat(),
+        ticket.service_desc,
+        ticket.customer.name if ticket.customer else '',
+        ticket.customer.email if ticket.customer else '',
+        ticket.customer.phone if ticket.customer else '',
+        ';'.join(mechanic.name for mechanic in ticket.mechanics),
+        ';'.join(f'{line.item.name} x{line.quantity}' for line in ticket.items),
+    ]
 
 # PUT '/<int:ticket_id>/edit' : Add/removes mechanics from service ticket. Takes in 'remove_ids', and 'add_ids'. Logged in mechanic may add/remove other mechanics by their ids passed in.
 @service_ticket_bp.route('/<int:ticket_id>/edit', methods=['PUT'])
 @token_required_mechanic
 def edit_ticket(mechanic_id, ticket_id):
     # Verify logged in mechanic exists
-    mechanic = db.session.get(Mechanic, mechanic_id)
+    mechanic = current_mechanic()
     if not mechanic:
         return jsonify({'error': 'Unauthorized Access'}), 400
     
@@ -99,53 +225,48 @@ def edit_ticket(mechanic_id, ticket_id):
     
     # Load client side data
     try:
-        ticket_edits = edit_service_ticket_schema.load(request.json)
+        ticket_edits = load(edit_service_ticket_schema, request.json)
     except ValidationError as e:
         return jsonify(e.messages), 400
     
-    # Loop through add list to add each mechanic
-    if 'add_mechanic_ids' in ticket_edits:
-        for mech_id in ticket_edits['add_mechanic_ids']:
-            query = select(Mechanic).where(Mechanic.id == mech_id)
-            mechanic = db.session.execute(query).scalar_one_or_none()
-            
-            # Check mechanic exists
-            if not mechanic:
-                return jsonify({'error':'One or more mechanics not found'}), 404
-            
-            # Add only if mechanic is not already in the list
-            if mechanic not in ticket.mechanics:
-                ticket.mechanics.append(mechanic)
-                
-    # Loop through add list to add each mechanic   
-    if 'remove_mechanic_ids' in ticket_edits:
-        for mech_id in ticket_edits['remove_mechanic_ids']:
-            query = select(Mechanic).where(Mechanic.id == mech_id)
-            mechanic = db.session.execute(query).scalar_one_or_none()
-            
-            # Check mechanic exists
-            if not mechanic:
-                return jsonify({'error':'One or more mechanics not found'}), 404
-            
-            # Remove only if mechanic is in the list
-            if mechanic in ticket.mechanics:
-                ticket.mechanics.remove(mechanic)
+    add_ids = list(dict.fromkeys(ticket_edits.get('add_mechanic_ids', []))) # Drop repeated ids but keep the order they were given in
+    remove_ids = set(ticket_edits.get('remove_mechanic_ids', []))
+    requested_ids = set(add_ids) | remove_ids
+    
+    if requested_ids:
+        # Check every mechanic exists with one IN query
+        query = select(Mechanic.id).where(Mechanic.id.in_(requested_ids))
+        if len(set(db.session.execute(query).scalars())) != len(requested_ids):
+            return jsonify({'error':'One or more mechanics not found'}), 404
+        
+        query = select(service_mechanics.c.mechanic_id).where(service_mechanics.c.ticket_id == ticket.id)
+        assigned_ids = set(db.session.execute(query).scalars())
+        
+        # Adds are applied before removes, so a mechanic in both lists ends up removed
+        to_add = [mech_id for mech_id in add_ids if mech_id not in assigned_ids and mech_id not in remove_ids]
+        to_remove = remove_ids & assigned_ids
+        
+        # A mechanic assigned by another request since the select above is skipped, not inserted twice
+        insert_missing(service_mechanics, ['ticket_id', 'mechanic_id'], [{'ticket_id': ticket.id, 'mechanic_id': mech_id} for mech_id in to_add])
+        if to_remove:
+            db.session.execute(delete(service_mechanics).where(service_mechanics.c.ticket_id == ticket.id, service_mechanics.c.mechanic_id.in_(to_remove)))
     
     db.session.commit()
-    return service_ticket_schema.jsonify(ticket), 200
+    bump_cache_version('tickets')
+    return jsonify(dump(service_ticket_schema, _load_ticket(ticket_id))), 200
     
 # PUT '/add_items' : Add item to service ticket
 @service_ticket_bp.route('/add_items', methods=['PUT'])
 @token_required_mechanic # Only mechanics can add items to service tickets
 def add_items(mechanic_id):   
     # Verify logged in mechanic exists
-    mechanic = db.session.get(Mechanic, mechanic_id)
+    mechanic = current_mechanic()
     if not mechanic:
         return jsonify({'error': 'Unauthorized Access'}), 400
  
     # Load data input
     try:
-        data = add_items_schema.load(request.json)
+        data = load(add_items_schema, request.json)
         ticket_id = data['ticket_id']
         items_quant = data['item_quant']
     except ValidationError as e:
@@ -158,32 +279,32 @@ def add_items(mechanic_id):
         return jsonify({'error':'no ticket found'}), 404
     
     # Only allow mechanics working on the service ticket to add items to the ticket
-    if mechanic not in ticket.mechanics:
+    query = select(service_mechanics.c.mechanic_id).where(service_mechanics.c.ticket_id == ticket.id, service_mechanics.c.mechanic_id == mechanic.id)
+    if db.session.execute(query).first() is None:
         return jsonify({'error':'Not authorized to make adjustments to this ticket'}), 400
     
-    # Add items
+    # Total quantity requested per item (non-positive quantities are ignored)
+    quantities = {}
     for item in items_quant:
         if item['quantity'] <= 0:
             continue
-        
-        itm = db.session.get(Inventory, item['item_id'])
+        quantities[item['item_id']] = quantities.get(item['item_id'], 0) + item['quantity']
     
-        if not itm:
+    if quantities:
+        # Resolve every requested item with one IN query
+        query = select(Inventory.id).where(Inventory.id.in_(quantities))
+        found_ids = set(db.session.execute(query).scalars())
+        if len(found_ids) != len(quantities):
             return jsonify({'error':'Item not found'}), 404
-
-        # If trying to add an item already on the service ticket, add to the quantity already stored for that item
-        found = False
-        for inventory_serviceticket in ticket.items:
-            if inventory_serviceticket.inventory_id == itm.id:
-                inventory_serviceticket.quantity += item['quantity']
-                found = True
-                
-        if found == False:
-            ticket_item = InventoryServiceTicket(inventory_id = itm.id, service_ticket_id = ticket.id, quantity = item['quantity'])
-            db.session.add(ticket_item)
+        
+        # One upsert for every line: items already on the service ticket add to the quantity stored for them
+        lines = [{'inventory_id': item_id, 'service_ticket_id': ticket.id, 'quantity': quantity} for item_id, quantity in quantities.items()]
+        upsert_increments(InventoryServiceTicket.__table__, ['service_ticket_id', 'inventory_id'], 'quantity', lines)
+        record_parts(ticket.service_date, quantities)
     
     db.session.commit()
-    return service_ticket_schema.jsonify(ticket), 200    
+    bump_cache_version('tickets')
+    return jsonify(dump(service_ticket_schema, _load_ticket(ticket_id))), 200    
     
 @service_ticket_bp.route('/<int:ticket_id>', methods=['DELETE'])
 @token_required_mechanic
@@ -192,12 +313,14 @@ def delete_ticket(mechanic_id, ticket_id):
     if not ticket:
         return jsonify({'error': 'Service Ticket not found'}), 404
     
-    mechanic = db.session.get(Mechanic, mechanic_id)
+    mechanic = current_mechanic()
     if not mechanic:
         return jsonify({'error': 'Unauthorized access'}), 400
     
+    remove_tickets(ServiceTicket.id == ticket.id)
     db.session.delete(ticket)
     db.session.commit()
+    bump_cache_version('tickets')
     return jsonify({'message': 'Successfully deleted service ticket'}), 200
     
     
\ No newline at end of file
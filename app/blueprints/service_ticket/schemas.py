@@ -1,6 +1,13 @@
 from app.extensions import ma
-from app.models import ServiceTicket, InventoryServiceTicket
+from app.models import ServiceTicket, InventoryServiceTicket, Customer, Mechanic
 from marshmallow import fields
+from marshmallow.validate import OneOf
+from app.utils.pagination import PageArgsSchema
+from app.utils.search import SearchArgsSchema
+from app.utils.date_window import DateWindowArgsSchema
+from app.utils.invoices import ticket_totals
+from app.utils.fieldsets import Fieldset
+from sqlalchemy.orm import joinedload, selectinload
 
 class ServiceTicketSchema(ma.SQLAlchemyAutoSchema):
     customer = fields.Nested('CustomerSchema', exclude=['id', 'password'])
@@ -35,4 +42,44 @@ class InventoryServiceTicketSchema(ma.SQLAlchemyAutoSchema):
 service_ticket_schema = ServiceTicketSchema()
 service_tickets_schema = ServiceTicketSchema(many=True)
 edit_service_ticket_schema = EditServiceTicket()
-add_items_schema = AddItems()
\ No newline at end of file
+add_items_schema = AddItems()
+
+# Loader options matching the nested fields of ServiceTicketSchema so a list of tickets is serialized in a fixed number of queries (no lazy loads per row).
+# Nested customers and mechanics only read the columns the schema shows.
+ticket_relationship_options = {
+    'customer': joinedload(ServiceTicket.customer).load_only(Customer.name, Customer.email, Customer.phone),
+    'mechanics': selectinload(ServiceTicket.mechanics).load_only(Mechanic.name, Mechanic.email, Mechanic.phone),
+    'items': selectinload(ServiceTicket.items).joinedload(InventoryServiceTicket.item),
+}
+ticket_load_options = tuple(ticket_relationship_options.values())
+ticket_fieldset = Fieldset(service_tickets_schema, ServiceTicket, relationships=ticket_relationship_options)
+
+# Query parameters of every ticket list: 'fields' picks the fields returned, 'include=total' adds each ticket's total cost
+class TicketListArgsSchema(ma.Schema):
+    field_names = ticket_fieldset.args_field()
+    include = fields.String(load_default=None, validate=OneOf(['total']))
+    
+    class Meta:
+        unknown = 'exclude'
+
+# Query parameters for the ticket list: pagination plus optional filters, each served by an index
+class TicketFilterArgsSchema(PageArgsSchema, TicketListArgsSchema, DateWindowArgsSchema):
+    VIN = fields.String(load_default=None)
+    customer_id = fields.Int(load_default=None)
+    mechanic_id = fields.Int(load_default=None)
+
+class TicketSearchArgsSchema(SearchArgsSchema, TicketListArgsSchema):
+    pass
+
+ticket_filter_args_schema = TicketFilterArgsSchema()
+ticket_search_args_schema = TicketSearchArgsSchema()
+ticket_list_args_schema = TicketListArgsSchema()
+
+# Serialized ticket list with the selected fields, and a 'total' per ticket when include is 'total' (one grouped query for the whole list)
+def dump_tickets(tickets, field_names=None, include=None):
+    data = ticket_fieldset.dump(field_names, tickets)
+    if include == 'total':
+        totals = ticket_totals([ticket.id for ticket in tickets])
+        for ticket, dumped in zip(tickets, data):
+            dumped['total'] = totals[ticket.id]
+    return data
@@ -0,0 +1,56 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.utils.search import rebuild_index
+from app.utils.rollups import rebuild_rollups
+from app.utils.schema import upgrade_schema
+from app.utils.slow_queries import read_entries, summarize
+
+# flask --app flask_app upgrade-schema : add the tables, indexes and keys of the current models to an existing database
+@click.command('upgrade-schema')
+@with_appcontext
+def upgrade_schema_command():
+    changes = upgrade_schema()
+    for change in changes:
+        click.echo(change)
+    if not changes:
+        click.echo('Schema is up to date')
+    if any(change in ('Created table search_terms', 'Created table daily_ticket_stats', 'Created table daily_part_usage') for change in changes):
+        click.echo('Fill the new tables with rebuild-search-index and rebuild-rollups')
+
+# flask --app flask_app rebuild-search-index : rebuild the search index from the customers, inventory and service_tickets tables
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    counts = rebuild_index()
+    for kind, count in counts.items():
+        click.echo(f'Indexed {count} {kind} rows')
+
+# flask --app flask_app rebuild-rollups : recompute the report rollups from the service tickets (backfill after an import or a repair)
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    counts = rebuild_rollups()
+    click.echo(f"Rebuilt {counts['days']} daily ticket rows and {counts['part_days']} daily part rows")
+
+# flask --app flask_app slow-queries : routes that sent the most slow statements (by total time), from the slow-query log
+@click.command('slow-queries')
+@click.option('--path', help='Slow-query log to read, SLOW_QUERY_LOG by default')
+@click.option('--top', default=10, show_default=True, help='Number of routes to show')
+@click.option('--plans', is_flag=True, help='Show the plan of each slowest statement')
+@with_appcontext
+def slow_queries_command(path, top, plans):
+    path = path or current_app.config.get('SLOW_QUERY_LOG')
+    if not path:
+        raise click.UsageError('No slow-query log: set SLOW_QUERY_LOG or pass --path')
+    routes = summarize(read_entries(path), top=top)
+    if not routes:
+        click.echo(f'No slow statements in {path}')
+        return
+    click.echo(f"{'route':<40} {'count':>7} {'total ms':>11} {'max ms':>10}")
+    for endpoint, route in routes:
+        click.echo(f"{endpoint:<40} {route['count']:>7} {route['total_ms']:>11.1f} {route['max_ms']:>10.1f}")
+        click.echo(f"    slowest: {' '.join(route['slowest']['statement'].split())[:200]}")
+        if plans:
+            for row in route['slowest'].get('plan', []):
+                click.echo(f'    plan: {row}')
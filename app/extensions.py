@@ -2,6 +2,7 @@ from flask_marshmallow import Marshmallow
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_caching import Cache
+from app.utils import sqlite_store # Registers the 'sqlite' rate limit storage scheme
 
 ma = Marshmallow()
 limiter = Limiter(key_func=get_remote_address, default_limits=["300 per day", "100 per hour"])
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from typing import List
 from datetime import date
@@ -11,8 +12,9 @@ db = SQLAlchemy(model_class=Base)
 service_mechanics = db.Table(
     "service_mechanics",
     Base.metadata,
-    db.Column('ticket_id', db.ForeignKey('service_tickets.id')),
-    db.Column('mechanic_id', db.ForeignKey('mechanics.id'))
+    db.Column('ticket_id', db.ForeignKey('service_tickets.id'), primary_key=True), # Primary key (ticket_id, mechanic_id) also serves lookups by ticket
+    db.Column('mechanic_id', db.ForeignKey('mechanics.id'), primary_key=True),
+    db.Index('ix_service_mechanics_mechanic_id_ticket_id', 'mechanic_id', 'ticket_id') # Covering index for counting tickets per mechanic (ranked mechanics)
 )
 
 class Customer(Base):
@@ -30,10 +32,10 @@ class ServiceTicket(Base):
     __tablename__ = "service_tickets"
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    VIN: Mapped[str] = mapped_column(db.String(255), nullable=False)
-    service_date: Mapped[date] = mapped_column(nullable=False)
+    VIN: Mapped[str] = mapped_column(db.String(255), nullable=False, index=True)
+    service_date: Mapped[date] = mapped_column(nullable=False, index=True)
     service_desc: Mapped[str] = mapped_column(db.String(255), nullable=False)
-    customer_id: Mapped[int] = mapped_column(db.ForeignKey("customers.id"))
+    customer_id: Mapped[int] = mapped_column(db.ForeignKey("customers.id"), index=True)
     
     customer: Mapped['Customer'] = db.relationship(back_populates='tickets')
     mechanics: Mapped[List['Mechanic']] = db.relationship(secondary=service_mechanics, back_populates='tickets')
@@ -55,18 +57,48 @@ class Inventory(Base):
     __tablename__ = 'inventory'
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    name: Mapped[str] = mapped_column(db.String(255), nullable=False)
+    name: Mapped[str] = mapped_column(db.String(255), nullable=False, unique=True, index=True) # Stored normalized (see normalize_item_name), so unique ignoring case and spacing
     price: Mapped[float] = mapped_column(nullable=False)
     
     service_tickets: Mapped[List['InventoryServiceTicket']] = db.relationship(back_populates='item', cascade='all, delete') # If item is deleted, entries in the 'InventoryServiceTicket' table will be deleted too
     
 class InventoryServiceTicket(Base):
     __tablename__ = 'inventory_service_ticket'
+    __table_args__ = (
+        db.UniqueConstraint('service_ticket_id', 'inventory_id'), # One line per item on a ticket, also serves lookups by ticket
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     quantity: Mapped[int] = mapped_column(nullable = False)
-    inventory_id: Mapped[int] = mapped_column(db.ForeignKey("inventory.id"), nullable = False)
+    inventory_id: Mapped[int] = mapped_column(db.ForeignKey("inventory.id"), nullable = False, index=True)
     service_ticket_id: Mapped[int] = mapped_column(db.ForeignKey("service_tickets.id"), nullable = False)
     
     item: Mapped['Inventory'] = db.relationship(back_populates = 'service_tickets')
-    tickets: Mapped['ServiceTicket'] = db.relationship(back_populates = 'items')
\ No newline at end of file
+    tickets: Mapped['ServiceTicket'] = db.relationship(back_populates = 'items')
+    
+class SearchTerm(Base):
+    __tablename__ = 'search_terms'
+    __table_args__ = (
+        db.Index('ix_search_terms_kind_ref_id', 'kind', 'ref_id'), # Finding a document's terms when it changes
+    )
+    
+    # Primary key (kind, term, ref_id) is the search index: prefix lookups are range scans on (kind, term)
+    kind: Mapped[str] = mapped_column(db.String(16), primary_key=True) # 'customer', 'inventory' or 'ticket'
+    # Binary collation on MySQL: prefix ranges need code point order, utf8mb4_0900_ai_ci sorts ':' and '{' before digits and letters
+    term: Mapped[str] = mapped_column(db.String(64).with_variant(mysql.VARCHAR(64, collation='utf8mb4_bin'), 'mysql'), primary_key=True)
+    ref_id: Mapped[int] = mapped_column(primary_key=True) # id of the customer, item or ticket
+    weight: Mapped[int] = mapped_column(nullable=False)
+    
+# Report rollups, kept up to date by app.utils.rollups when tickets and their items change
+class DailyTicketStats(Base):
+    __tablename__ = 'daily_ticket_stats'
+    
+    day: Mapped[date] = mapped_column(primary_key=True) # Service date
+    ticket_count: Mapped[int] = mapped_column(nullable=False)
+    
+class DailyPartUsage(Base):
+    __tablename__ = 'daily_part_usage'
+    
+    day: Mapped[date] = mapped_column(primary_key=True) # Service date of the tickets the part was used on
+    inventory_id: Mapped[int] = mapped_column(db.ForeignKey('inventory.id'), primary_key=True, index=True)
+    quantity: Mapped[int] = mapped_column(nullable=False)
@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+from itertools import islice
+from flask import request
+
+BULK_CHUNK_SIZE = 1000 # Rows checked and written per statement
+MAX_REPORTED_ERRORS = 1000 # Per-row errors listed in the response, the rest are only counted
+
+# Bulk uploads are read from the request body as it arrives: NDJSON (one JSON object per line) or CSV with a header row.
+# The format comes from the 'format' query parameter, or the Content-Type when it is not given.
+def upload_format():
+    upload = request.args.get('format')
+    if upload is None:
+        upload = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    return upload if upload in ('ndjson', 'csv') else None
+
+# Yields (row number, record, error) for every row of the upload. Row numbers start at 1 and do not count the CSV header
+# or blank lines. A row that cannot be parsed is yielded with record None and the error message.
+def read_upload(upload):
+    stream = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='utf-8-sig', newline='' if upload == 'csv' else None)
+
+    if upload == 'csv':
+        reader = csv.DictReader(stream)
+        for row, record in enumerate(reader, start=1):
+            if None in record:
+                yield row, None, 'Row has more values than the header'
+            else:
+                yield row, record, None
+        return
+
+    row = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row, None, 'Invalid JSON'
+            continue
+        if not isinstance(record, dict):
+            yield row, None, 'Each line must be a JSON object'
+        else:
+            yield row, record, None
+
+def chunked(iterable, size=BULK_CHUNK_SIZE):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+# Collects per-row errors for the response, keeping the first MAX_REPORTED_ERRORS
+class BulkErrors:
+    def __init__(self):
+        self.rows = []
+        self.count = 0
+
+    def add(self, row, error):
+        self.count += 1
+        if len(self.rows) < MAX_REPORTED_ERRORS:
+            self.rows.append({'row': row, 'error': error})
+
+    def report(self):
+        return {'error_count': self.count, 'errors': sorted(self.rows, key=lambda error: error['row'])}
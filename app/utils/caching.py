@@ -0,0 +1,93 @@
+import hashlib
+import json
+import time
+from functools import wraps
+from flask import request, make_response, current_app, g
+from marshmallow import ValidationError
+from app.extensions import cache
+from app.utils.compression import choose_encoding, compress_response
+from app.utils.pagination import next_page_link
+
+DEFAULT_MAX_VARIANTS = 100 # Distinct cached responses kept per endpoint (and principal) until the data changes
+
+# Cached list views are tagged with the resources they show (e.g. 'tickets' also shows customers, mechanics and inventory).
+# Every tag has a version number stored in the cache and the versions are part of the cache key, so write routes bump the
+# version of the resource they changed and every cached response built from the old data stops being used straight away.
+
+def _version_key(tag):
+    return f'version:{tag}'
+
+def get_cache_versions(tags):
+    keys = [_version_key(tag) for tag in tags]
+    versions = list(cache.get_many(*keys))
+
+    for i, key in enumerate(keys):
+        if versions[i] is None:
+            # Start from the current time so a version that was evicted never reuses an old number
+            cache.add(key, time.time_ns(), timeout=0)
+            versions[i] = cache.get(key)
+
+    return versions
+
+# Call after committing a write so cached views tagged with any of these resources are rebuilt
+def bump_cache_version(*tags):
+    for tag in tags:
+        key = _version_key(tag)
+        if cache.get(key) is None:
+            cache.add(key, time.time_ns(), timeout=0)
+        cache.cache.inc(key) # Atomic on backends that support it (e.g. Redis)
+
+# Query arguments are run through the view's own schema, so unknown arguments are dropped and equivalent values
+# (e.g. '?per_page=050' and '?per_page=50', or no per_page and the default) share one cache entry
+def _normalized_args(args_schema):
+    if args_schema is None:
+        return sorted(request.args.items(multi=True))
+    return args_schema.dump(args_schema.load(request.args))
+
+def _register_variant(scope, cache_key, timeout):
+    registry_key = f'variants:{scope}'
+    variants = cache.get(registry_key) or set()
+    if cache_key in variants:
+        return True
+    if len(variants) >= current_app.config.get('CACHE_MAX_VARIANTS', DEFAULT_MAX_VARIANTS):
+        return False
+    variants.add(cache_key)
+    cache.set(registry_key, variants, timeout=timeout)
+    return True
+
+# Cache successful responses of a view until the timeout runs out or one of its tags is bumped.
+# args_schema: schema for the view's query arguments, used to build the key from normalized arguments.
+# vary_on_principal: put below a token_required decorator to keep a separate entry per logged in customer/mechanic (read from g).
+def cached_view(*tags, timeout=None, args_schema=None, vary_on_principal=False):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                query_args = _normalized_args(args_schema)
+            except ValidationError:
+                return f(*args, **kwargs) # Let the view report invalid arguments, nothing is cached
+
+            versions = '.'.join(str(version) for version in get_cache_versions(tags))
+            principal = f'{g.principal_type}-{g.principal_id}' if vary_on_principal else ''
+            args_hash = hashlib.sha1(json.dumps(query_args, sort_keys=True, default=str).encode()).hexdigest()
+            scope = f'{request.endpoint}:{principal}:{versions}'
+            # One entry per content encoding, holding the compressed body: compressed once per fill, not per request
+            cache_key = f'view:{scope}:{request.path}:{args_hash}:{choose_encoding() or "identity"}'
+
+            cached = cache.get(cache_key)
+            if cached is not None:
+                body, status, headers = cached
+                response = current_app.response_class(body, status=status, headers=headers)
+                # The stored link was built from the query string of the request that filled the entry
+                if 'X-Next-Cursor' in response.headers:
+                    response.headers['Link'] = next_page_link(response.headers['X-Next-Cursor'])
+                return response
+
+            response = compress_response(make_response(f(*args, **kwargs)))
+            # Past the variant limit responses are still served, just not stored
+            if response.status_code == 200 and _register_variant(scope, cache_key, timeout):
+                cache.set(cache_key, (response.get_data(), response.status_code, list(response.headers.items())), timeout=timeout)
+            return response
+
+        return decorated
+    return decorator
@@ -0,0 +1,85 @@
+import gzip
+import zlib
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError: # Optional, only gzip is offered without it
+    brotli = None
+
+DEFAULT_MIN_SIZE = 500 # Bytes, smaller bodies are sent as they are (the gzip header alone is 18 bytes)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # Close to gzip's speed with smaller output, 11 is far too slow for response bodies
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv'}
+
+# Responses are compressed with the best encoding the client accepts (Accept-Encoding, q=0 refuses one): brotli when
+# installed, then gzip. Cached views store the compressed body per encoding, so a response is compressed once per
+# cache fill (see cached_view). Streamed responses are compressed chunk by chunk and flushed after every chunk, so the
+# client gets each batch as soon as it is written.
+
+def choose_encoding():
+    if not current_app.config.get('COMPRESS_RESPONSES', True):
+        return None
+    offered = ('br', 'gzip') if brotli is not None else ('gzip',)
+    return request.accept_encodings.best_match(offered)
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0) # No timestamp, the same body always gives the same bytes
+
+class _StreamCompressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # gzip container
+
+    def compress(self, chunk):
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+def _compress_stream(chunks, encoding):
+    compressor = _StreamCompressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+def _compressible(response):
+    return (response.mimetype in COMPRESSIBLE_MIMETYPES and not response.direct_passthrough
+            and 'Content-Encoding' not in response.headers and 200 <= response.status_code < 300 and response.status_code != 204)
+
+# after_request hook, also called by cached_view before storing a response
+def compress_response(response):
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding') # The body depends on the header even when it is sent uncompressed
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        chunks = response.response
+        response.response = _compress_stream(response.iter_encoded(), encoding)
+        if hasattr(chunks, 'close'):
+            response.call_on_close(chunks.close) # Ends stream_with_context's request context
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE):
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    app.after_request(compress_response)
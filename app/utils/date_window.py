@@ -0,0 +1,12 @@
+from marshmallow import fields, validates_schema, ValidationError
+from app.extensions import ma
+
+# Mixin for query parameter schemas: an optional service date window (inclusive), start_date no later than end_date
+class DateWindowArgsSchema(ma.Schema):
+    start_date = fields.Date(load_default=None)
+    end_date = fields.Date(load_default=None)
+    
+    @validates_schema
+    def validate_window(self, data, **kwargs):
+        if data['start_date'] and data['end_date'] and data['start_date'] > data['end_date']:
+            raise ValidationError('start_date must be before end_date.', 'start_date')
@@ -0,0 +1,90 @@
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from app.models import db
+
+# Applied to every new SQLite connection unless the config sets SQLITE_PRAGMAS (other databases are not affected)
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL', # Readers do not block the writer
+    'synchronous': 'NORMAL', # Safe with WAL, syncs only at checkpoints
+    'busy_timeout': 5000, # Wait up to 5s for a lock instead of failing straight away
+}
+
+# QueuePool that records how often connections are checked out and how long requests waited for one.
+# Used for every pool the config sizes (see init_pool_options), the numbers are reported by GET /metrics/db-pool (per worker process).
+class MeteredQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._checkouts = 0
+            self._timeouts = 0
+            self._wait_total = 0.0
+            self._wait_max = 0.0
+            self._overflow_max = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+
+        with self._stats_lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._overflow_max = max(self._overflow_max, self.overflow())
+        return connection
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'pool_size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_out': self.checkedout(),
+                'idle': self.checkedin(),
+                'overflow': max(self.overflow(), 0), # Connections open beyond pool_size right now
+                'overflow_max': max(self._overflow_max, 0),
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'wait_ms_total': round(self._wait_total * 1000, 3),
+                'wait_ms_avg': round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                'wait_ms_max': round(self._wait_max * 1000, 3),
+            }
+
+# Configs that size a connection pool (pool_size in SQLALCHEMY_ENGINE_OPTIONS) get a MeteredQueuePool unless they name
+# another poolclass. Call before db.init_app, which creates the engine from these options.
+def init_pool_options(app):
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    if 'pool_size' in options:
+        options.setdefault('poolclass', MeteredQueuePool)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+# Set the SQLite pragmas on each new connection. Call once the engine exists (after db.init_app).
+def init_engine(app):
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            return
+
+        pragmas = app.config.get('SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+
+# Pool numbers for the app's engine, None when it does not use MeteredQueuePool (e.g. in-memory SQLite)
+def pool_stats():
+    pool = db.engine.pool
+    return pool.stats() if isinstance(pool, MeteredQueuePool) else None
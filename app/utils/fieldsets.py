@@ -0,0 +1,54 @@
+from marshmallow import fields, ValidationError
+from sqlalchemy.orm import load_only
+from app.utils.serializers import dump
+
+# Sparse fieldsets: list routes take '?fields=id,name' to return only some fields of each object. The choice is pushed
+# down to the database (load_only for columns, relationship loaders only for the nested objects asked for) and to the
+# schema (a schema instance with only=), so both the rows read and the response shrink.
+
+# 'fields' query parameter: comma separated field names, loaded as a sorted tuple so the order does not change the cache key
+class FieldList(fields.Field):
+    def __init__(self, choices, **kwargs):
+        super().__init__(data_key='fields', load_default=None, **kwargs)
+        self.choices = choices
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        names = sorted({name.strip() for name in str(value).split(',') if name.strip()})
+        if not names:
+            raise ValidationError('Choose at least one field.')
+        unknown = [name for name in names if name not in self.choices]
+        if unknown:
+            raise ValidationError(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(self.choices)}.")
+        return tuple(names)
+
+# Fields a list route can return, built from its list schema (many=True, with any excludes already applied).
+# relationships: {nested field name: loader option}, used only when the field is returned.
+class Fieldset:
+    def __init__(self, schema, model, relationships=None):
+        self.list_schema = schema
+        self.model = model
+        self.relationships = relationships or {}
+        self.names = tuple(schema.fields)
+        self._schemas = {}
+
+    def args_field(self):
+        return FieldList(self.names)
+
+    # Loader options for the selected fields (None: every field). The id is always loaded, pagination and identity need it.
+    def load_options(self, selected):
+        if selected is None:
+            return tuple(self.relationships.values())
+        columns = [getattr(self.model, name) for name in selected if name not in self.relationships]
+        return (load_only(self.model.id, *columns), *(self.relationships[name] for name in selected if name in self.relationships))
+
+    # List schema dumping only the selected fields, one instance kept per selection
+    def schema(self, selected):
+        if selected is None:
+            return self.list_schema
+        if selected not in self._schemas:
+            self._schemas[selected] = type(self.list_schema)(many=True, only=selected)
+        return self._schemas[selected]
+
+    # The selected fields of each object, through the compiled dump function of the selection's schema
+    def dump(self, selected, objects):
+        return dump(self.schema(selected), objects)
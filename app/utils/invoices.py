@@ -0,0 +1,48 @@
+from sqlalchemy import select, func
+from app.models import db, ServiceTicket, Inventory, InventoryServiceTicket
+
+# Ticket costs are computed in SQL from inventory_service_ticket joined to inventory, reading only the columns needed
+# (no ORM objects are loaded). Amounts are rounded to cents.
+
+line_total = InventoryServiceTicket.quantity * Inventory.price
+
+def _money(amount):
+    return round(amount or 0, 2)
+
+# Invoice of one ticket: every item line with its price and line total, and the ticket total. None if the ticket does not exist.
+def ticket_invoice(ticket_id):
+    # Outer joins so a ticket without items still has a row, with a total of 0
+    query = (
+        select(ServiceTicket.id, func.sum(line_total).label('total'))
+        .outerjoin(InventoryServiceTicket, InventoryServiceTicket.service_ticket_id == ServiceTicket.id)
+        .outerjoin(Inventory, Inventory.id == InventoryServiceTicket.inventory_id)
+        .where(ServiceTicket.id == ticket_id)
+        .group_by(ServiceTicket.id)
+    )
+    ticket = db.session.execute(query).one_or_none()
+    if ticket is None:
+        return None
+
+    query = (
+        select(Inventory.id.label('item_id'), Inventory.name, Inventory.price, InventoryServiceTicket.quantity, line_total.label('line_total'))
+        .join(Inventory, Inventory.id == InventoryServiceTicket.inventory_id)
+        .where(InventoryServiceTicket.service_ticket_id == ticket_id)
+        .order_by(InventoryServiceTicket.id)
+    )
+    lines = [{**row._mapping, 'line_total': _money(row.line_total)} for row in db.session.execute(query)]
+
+    return {'ticket_id': ticket.id, 'lines': lines, 'total': _money(ticket.total)}
+
+# Totals of many tickets in one grouped query, {ticket id: total}. Tickets without items get 0.
+def ticket_totals(ticket_ids):
+    if not ticket_ids:
+        return {}
+    query = (
+        select(InventoryServiceTicket.service_ticket_id, func.sum(line_total))
+        .join(Inventory, Inventory.id == InventoryServiceTicket.inventory_id)
+        .where(InventoryServiceTicket.service_ticket_id.in_(ticket_ids))
+        .group_by(InventoryServiceTicket.service_ticket_id)
+    )
+    totals = dict.fromkeys(ticket_ids, 0.0)
+    totals.update((ticket_id, _money(total)) for ticket_id, total in db.session.execute(query))
+    return totals
@@ -0,0 +1,40 @@
+import re
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # Optional, responses are encoded by the standard library without it
+    orjson = None
+
+# orjson writes a few values differently from json.dumps(ensure_ascii=True): non-ASCII and DEL characters are not
+# escaped, exponents have no '+' or leading zero (1e16 instead of 1e+16) and numbers under 1e-4 have no exponent
+# (0.00001 instead of 1e-05). Output that may contain any of them is encoded again with the standard library, so
+# responses are byte for byte what Flask's default provider writes. The one exception is NaN/Infinity (null with
+# orjson, invalid JSON with the standard library); the API rejects them on input.
+# The checks are plain byte searches (the regex starts with a literal), a fraction of the cost of encoding.
+_EXPONENT = re.compile(rb'e(?<=[0-9]e)[-0-9]')
+
+def _needs_stdlib(data):
+    return not data.isascii() or b'\x7f' in data or b'0.0000' in data or _EXPONENT.search(data) is not None
+
+# Flask JSON provider that encodes compact responses (the default outside debug mode) with orjson.
+# Dates and other types orjson would write differently are passed to Flask's own default() (OPT_PASSTHROUGH_*).
+class FastJSONProvider(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        compact = not ((self.compact is None and self._app.debug) or self.compact is False)
+        if orjson is None or not compact or not self.sort_keys or not self.ensure_ascii:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_compact(obj) + b'\n', mimetype=self.mimetype)
+
+    # Same bytes as json.dumps(obj, separators=(',', ':'), sort_keys=True, ensure_ascii=True, default=self.default)
+    def dumps_compact(self, obj):
+        options = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        try:
+            data = orjson.dumps(obj, default=self.default, option=options)
+        except TypeError: # orjson.JSONEncodeError: integers over 64 bits, non-string keys, unknown types
+            data = None
+        if data is None or _needs_stdlib(data):
+            data = self.dumps(obj, separators=(',', ':')).encode()
+        return data
@@ -0,0 +1,83 @@
+import base64
+import binascii
+import json
+from urllib.parse import urlencode
+from flask import request
+from marshmallow import fields, ValidationError
+from marshmallow.validate import Range
+from sqlalchemy import select, func
+from app.extensions import ma
+from app.models import db
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 100 # Server enforced upper bound so no request can pull a whole table
+CURSOR_VALUE_LIMIT = 2**63 # Cursor values must fit a signed 64-bit column, larger integers cannot be bound to a query
+
+# Cursors are opaque to clients: url-safe base64 of the sort key values of the last row on the page
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+# A sort key value a cursor may hold: a non-negative integer the database accepts (JSON true/false decode to bool, an int subclass)
+def is_cursor_value(value):
+    return type(value) is int and 0 <= value < CURSOR_VALUE_LIMIT
+
+class CursorField(fields.Field):
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            values = decode_cursor(value)
+        except (binascii.Error, ValueError, UnicodeDecodeError):
+            raise ValidationError('Invalid cursor.')
+        if not isinstance(values, dict) or not is_cursor_value(values.get('id')):
+            raise ValidationError('Invalid cursor.')
+        return values
+
+class PageArgsSchema(ma.Schema):
+    per_page = fields.Int(load_default=DEFAULT_PER_PAGE, validate=Range(min=1, max=MAX_PER_PAGE))
+    cursor = CursorField(load_default=None)
+    count = fields.Bool(load_default=False) # Total row count is only computed when asked for
+
+    class Meta:
+        unknown = 'exclude' # Other query parameters (filters etc.) are handled by the route
+
+page_args_schema = PageArgsSchema()
+
+# Keyset pagination on a unique, increasing column (normally the primary key). Returns the rows of the page and the cursor of the next page (None on the last page).
+def paginate_by_id(query, id_column, page_args, scalars=True):
+    total = count_rows(query) if page_args['count'] else None
+
+    if page_args['cursor']:
+        query = query.where(id_column > page_args['cursor']['id'])
+    query = query.order_by(id_column).limit(page_args['per_page'] + 1) # Fetch one extra row to know whether there is a next page
+
+    result = db.session.execute(query)
+    rows = result.scalars().all() if scalars else result.all()
+
+    next_cursor = None
+    if len(rows) > page_args['per_page']:
+        rows = rows[:page_args['per_page']]
+        next_cursor = encode_cursor({'id': rows[-1].id})
+
+    return rows, next_cursor, total
+
+def count_rows(query):
+    return db.session.execute(select(func.count()).select_from(query.order_by(None).subquery())).scalar_one()
+
+# Link to the next page, keeping the current request's other query arguments
+def next_page_link(next_cursor):
+    args = request.args.to_dict()
+    args['cursor'] = next_cursor
+    return f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+
+# Page metadata is returned in headers so the response body stays a plain list
+def add_page_headers(response, next_cursor, total=None):
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = next_page_link(next_cursor)
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+    return response
@@ -0,0 +1,109 @@
+import hmac
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Passwords are stored as salted werkzeug hashes (scrypt by default). Hashing and checking them takes tens of
+# milliseconds of CPU, so it runs in a small per-worker process pool instead of on the request thread, with a bound on
+# how many requests may wait for the pool at once.
+
+# Full werkzeug hash format: method with its parameters, salt and hex digest separated by '$'
+HASH_FORMAT = re.compile(r'(scrypt(:\d+){0,3}|pbkdf2(:\w+)?(:\d+)?)\$[A-Za-z0-9]+\$[0-9a-f]+')
+HASH_BATCH_PER_WORKER = 8 # Passwords per pool process in one batch of hash_passwords, well within PASSWORD_HASH_TIMEOUT with scrypt
+UNUSABLE_PASSWORD = '!' # Stored for accounts created without a password (bulk imports), never matches any password
+
+class PasswordPoolBusy(Exception):
+    pass
+
+_pool = None
+_pool_pid = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+_dummy_hashes = {} # Hashing method: hash checked when there is no stored password, so the answer takes as long
+
+def _get_pool():
+    global _pool, _pool_pid, _pool_slots
+    with _pool_lock:
+        # One pool per worker process, created after gunicorn forks the worker
+        if _pool is None or _pool_pid != os.getpid():
+            workers = current_app.config['PASSWORD_HASH_WORKERS']
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+            _pool_slots = threading.BoundedSemaphore(workers * current_app.config.get('PASSWORD_HASH_QUEUE_PER_WORKER', 4))
+        return _pool, _pool_slots
+
+# Run a hashing function in the pool (or inline when PASSWORD_HASH_WORKERS is 0). Raises PasswordPoolBusy when too many requests are already waiting.
+def _run(fn, *args):
+    if not current_app.config.get('PASSWORD_HASH_WORKERS'):
+        return fn(*args)
+
+    pool, slots = _get_pool()
+    timeout = current_app.config.get('PASSWORD_HASH_TIMEOUT', 5)
+    if not slots.acquire(timeout=timeout):
+        raise PasswordPoolBusy
+    try:
+        future = pool.submit(fn, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordPoolBusy
+    finally:
+        slots.release()
+
+def is_password_hash(stored):
+    return HASH_FORMAT.fullmatch(stored) is not None
+
+def hash_password(password):
+    return _run(generate_password_hash, password, current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt'))
+
+# Hash many passwords at once (bulk imports), spread over every process of the pool. Sent in batches of
+# HASH_BATCH_PER_WORKER passwords per pool process, each batch has to finish within PASSWORD_HASH_TIMEOUT.
+def hash_passwords(passwords):
+    method = current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+    if not current_app.config.get('PASSWORD_HASH_WORKERS'):
+        return [generate_password_hash(password, method) for password in passwords]
+
+    pool, slots = _get_pool()
+    timeout = current_app.config.get('PASSWORD_HASH_TIMEOUT', 5)
+    if not slots.acquire(timeout=timeout):
+        raise PasswordPoolBusy
+    try:
+        batch_size = current_app.config['PASSWORD_HASH_WORKERS'] * HASH_BATCH_PER_WORKER
+        hashed = []
+        for start in range(0, len(passwords), batch_size):
+            batch = passwords[start:start + batch_size]
+            try:
+                hashed += pool.map(generate_password_hash, batch, [method] * len(batch), chunksize=HASH_BATCH_PER_WORKER, timeout=timeout)
+            except FutureTimeoutError:
+                raise PasswordPoolBusy
+        return hashed
+    finally:
+        slots.release()
+
+def _dummy_hash():
+    method = current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+    if method not in _dummy_hashes:
+        _dummy_hashes[method] = hash_password(os.urandom(16).hex())
+    return _dummy_hashes[method]
+
+# Returns (valid, needs_rehash). Rows created before passwords were hashed still hold the plain password, those are compared directly and flagged so the caller can store a hash.
+# stored is None for an unknown account: a dummy hash is still checked so the response time does not tell which emails are registered.
+def verify_password(stored, password):
+    if stored is None or stored == UNUSABLE_PASSWORD:
+        _run(check_password_hash, _dummy_hash(), password)
+        return False, False
+    if not is_password_hash(stored):
+        return hmac.compare_digest(stored.encode(), password.encode()), True
+    return _run(check_password_hash, stored, password), False
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
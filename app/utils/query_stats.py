@@ -0,0 +1,101 @@
+import time
+from contextlib import contextmanager
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session
+from app.models import db
+
+# Statements and database time of each request, counted by engine events. With SERVER_TIMING on, responses carry
+# a Server-Timing header (browsers show it in the network panel), e.g. 'db;dur=4.213;desc="3 statements", app;dur=11.802'.
+#
+# Strict loading (STRICT_LOADING, on in TestingConfig) catches N+1 queries: a relationship lazily loaded for more than
+# one object in the same request raises LazyLoadError. Lazy loads of one object (e.g. ticket.mechanics after
+# db.session.get) are still allowed, lists have to load their relationships in the query (selectinload, joinedload).
+
+class LazyLoadError(InvalidRequestError):
+    pass
+
+class QueryStats:
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.started = time.perf_counter()
+        self.lazy_loads = {} # relationship: identities of the objects it was lazily loaded for
+
+# Numbers of the current request, None outside requests
+def request_query_stats():
+    return g.get('query_stats') if has_request_context() else None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = request_query_stats()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += time.perf_counter() - context._query_started
+
+# Lazy loads are seen through the ORM's public execution state: lazy_loaded_from is the object whose relationship is
+# being loaded, loader_strategy_path ends with the relationship
+@event.listens_for(Session, 'do_orm_execute')
+def _check_lazy_load(orm_execute_state):
+    parent = orm_execute_state.lazy_loaded_from if orm_execute_state.is_relationship_load else None
+    if parent is None or not has_request_context() or not current_app.config.get('STRICT_LOADING'):
+        return
+    stats = request_query_stats()
+    if stats is None:
+        return
+    relationship = orm_execute_state.loader_strategy_path[-1]
+    parents = stats.lazy_loads.setdefault(relationship, set())
+    parents.add(parent.identity_key)
+    if len(parents) > 1:
+        raise LazyLoadError(f'{relationship} lazily loaded for {len(parents)} objects in {request.method} {request.path} (N+1 queries), '
+                            'load it in the query with selectinload or joinedload')
+
+def _start_request():
+    g.query_stats = QueryStats()
+
+def _add_server_timing(response):
+    stats = request_query_stats()
+    if stats is not None and current_app.config.get('SERVER_TIMING', True):
+        total = (time.perf_counter() - stats.started) * 1000
+        response.headers['Server-Timing'] = f'db;dur={stats.db_time * 1000:.3f};desc="{stats.statements} statements", app;dur={total:.3f}'
+    return response
+
+# Count the statements of each request on the app's engine. Call once the engine exists (after db.init_app).
+def init_query_stats(app):
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(_start_request)
+    app.after_request(_add_server_timing)
+
+# Statements run on the app's engine inside the block, for tests. with_parameters: record (statement, parameters, executemany) tuples
+@contextmanager
+def captured_statements(app, with_parameters=False):
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters, executemany) if with_parameters else statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+# unittest.TestCase mixin (needs self.app and self.client): a request has to stay within a number of SQL statements.
+# With STRICT_LOADING on, N+1 queries already raise, budgets also catch extra queries that are not lazy loads.
+class QueryBudgetMixin:
+    def assertQueryBudget(self, budget, method, path, **kwargs):
+        with captured_statements(self.app) as statements:
+            response = self.client.open(path, method=method, **kwargs)
+            response.get_data() # Streamed bodies run their queries while they are read
+        self.assertLess(response.status_code, 400, f'{method} {path}: {response.status_code} {response.get_data(as_text=True)[:200]}')
+        if len(statements) > budget:
+            self.fail(f'{method} {path} ran {len(statements)} SQL statements, budget {budget}:\n' + '\n'.join(statements))
+        return response
@@ -0,0 +1,105 @@
+from sqlalchemy import select, insert, delete, func
+from app.models import db, ServiceTicket, Inventory, InventoryServiceTicket, DailyTicketStats, DailyPartUsage
+from app.utils.upsert import upsert_increments
+
+# Report rollups: tickets per service date (daily_ticket_stats) and quantity of each part used per service date
+# (daily_part_usage). Write routes apply their changes to the rollups in the same transaction as the change itself, so
+# reports read a few rows per day however many tickets are stored. Revenue is quantity x the item's current price, the
+# same as invoices, so price changes need no rollup update. 'flask rebuild-rollups' recomputes both tables from the tickets.
+
+# Add deltas to a rollup's counter column. deltas: {key values tuple: delta}, in the order of key_columns.
+# One upsert creates missing rows and adds to existing ones, so two transactions creating the same day's row both
+# succeed. Rows are removed when they drop to 0, so the tables match a rebuild.
+def _apply_deltas(model, key_columns, counter, deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = model.__table__
+    names = [column.key for column in key_columns]
+
+    upsert_increments(table, names, counter, [{**dict(zip(names, key)), counter: delta} for key, delta in deltas.items()])
+    if any(delta < 0 for delta in deltas.values()):
+        db.session.execute(delete(table).where(table.c[counter] <= 0, table.c[names[0]].in_({key[0] for key in deltas})))
+
+# A ticket was created (delta 1) on this service date
+def record_ticket(day, delta=1):
+    _apply_deltas(DailyTicketStats, [DailyTicketStats.day], 'ticket_count', {(day,): delta})
+
+# Parts were added to a ticket of this service date. quantities: {inventory id: quantity}
+def record_parts(day, quantities):
+    _apply_deltas(DailyPartUsage, [DailyPartUsage.day, DailyPartUsage.inventory_id], 'quantity', {(day, item_id): quantity for item_id, quantity in quantities.items()})
+
+# Take the tickets matching the criteria (and their parts) out of the rollups. Call before deleting the tickets.
+def remove_tickets(*criteria):
+    query = select(ServiceTicket.service_date, func.count()).where(*criteria).group_by(ServiceTicket.service_date)
+    _apply_deltas(DailyTicketStats, [DailyTicketStats.day], 'ticket_count', {(day,): -count for day, count in db.session.execute(query)})
+
+    query = (
+        select(ServiceTicket.service_date, InventoryServiceTicket.inventory_id, func.sum(InventoryServiceTicket.quantity))
+        .join(InventoryServiceTicket, InventoryServiceTicket.service_ticket_id == ServiceTicket.id)
+        .where(*criteria)
+        .group_by(ServiceTicket.service_date, InventoryServiceTicket.inventory_id)
+    )
+    _apply_deltas(DailyPartUsage, [DailyPartUsage.day, DailyPartUsage.inventory_id], 'quantity', {(day, item_id): -quantity for day, item_id, quantity in db.session.execute(query)})
+
+# An item was deleted, its lines on tickets go with it
+def remove_part(item_id):
+    db.session.execute(delete(DailyPartUsage).where(DailyPartUsage.inventory_id == item_id))
+
+# Recompute both rollups from the tickets with two INSERT ... SELECT statements (backfills and repairs)
+def rebuild_rollups():
+    db.session.execute(delete(DailyTicketStats))
+    db.session.execute(delete(DailyPartUsage))
+    db.session.execute(insert(DailyTicketStats).from_select(
+        ['day', 'ticket_count'],
+        select(ServiceTicket.service_date, func.count()).group_by(ServiceTicket.service_date),
+    ))
+    db.session.execute(insert(DailyPartUsage).from_select(
+        ['day', 'inventory_id', 'quantity'],
+        select(ServiceTicket.service_date, InventoryServiceTicket.inventory_id, func.sum(InventoryServiceTicket.quantity))
+        .join(InventoryServiceTicket, InventoryServiceTicket.service_ticket_id == ServiceTicket.id)
+        .group_by(ServiceTicket.service_date, InventoryServiceTicket.inventory_id),
+    ))
+    db.session.commit()
+    return {
+        'days': db.session.execute(select(func.count()).select_from(DailyTicketStats)).scalar_one(),
+        'part_days': db.session.execute(select(func.count()).select_from(DailyPartUsage)).scalar_one(),
+    }
+
+def _window(column, start, end):
+    criteria = []
+    if start:
+        criteria.append(column >= start)
+    if end:
+        criteria.append(column <= end)
+    return criteria
+
+# Tickets, parts used and revenue per service date in the window, oldest first. Days without tickets are left out.
+def daily_report(start=None, end=None):
+    query = select(DailyTicketStats.day, DailyTicketStats.ticket_count).where(*_window(DailyTicketStats.day, start, end))
+    days = {day: {'day': day.isoformat(), 'tickets': count, 'parts_used': 0, 'revenue': 0.0} for day, count in db.session.execute(query)}
+
+    query = (
+        select(DailyPartUsage.day, func.sum(DailyPartUsage.quantity), func.sum(DailyPartUsage.quantity * Inventory.price))
+        .join(Inventory, Inventory.id == DailyPartUsage.inventory_id)
+        .where(*_window(DailyPartUsage.day, start, end))
+        .group_by(DailyPartUsage.day)
+    )
+    for day, quantity, revenue in db.session.execute(query):
+        if day in days:
+            days[day].update(parts_used=quantity, revenue=round(revenue, 2))
+
+    return [days[day] for day in sorted(days)]
+
+# Parts used most in the window, by quantity (ties by item id), with the revenue they brought in
+def top_parts(start=None, end=None, limit=10):
+    quantity = func.sum(DailyPartUsage.quantity).label('quantity')
+    query = (
+        select(Inventory.id, Inventory.name, quantity, func.sum(DailyPartUsage.quantity * Inventory.price).label('revenue'))
+        .join(Inventory, Inventory.id == DailyPartUsage.inventory_id)
+        .where(*_window(DailyPartUsage.day, start, end))
+        .group_by(Inventory.id, Inventory.name)
+        .order_by(quantity.desc(), Inventory.id)
+        .limit(limit)
+    )
+    return [{'item_id': row.id, 'name': row.name, 'quantity': row.quantity, 'revenue': round(row.revenue, 2)} for row in db.session.execute(query)]
@@ -0,0 +1,98 @@
+from sqlalchemy import inspect, select, insert, update, delete, func, text
+from app.models import db, service_mechanics, InventoryServiceTicket
+
+# The app creates its tables with db.create_all(), which never changes a table that already exists. upgrade_schema
+# brings a database created by an older version up to the models: missing tables, indexes, unique constraints, the
+# service_mechanics primary key and, on MySQL, the column collations the models ask for. Duplicate rows that would
+# block a unique key are merged first. Safe to run again, each step is skipped once it is done.
+
+def _column_sets(entries, key='column_names'):
+    return {tuple(entry[key]) for entry in entries}
+
+# Remove repeated (ticket, mechanic) assignments, which the primary key forbids
+def _dedupe_service_mechanics(conn):
+    columns = (service_mechanics.c.ticket_id, service_mechanics.c.mechanic_id)
+    pairs = conn.execute(select(*columns).group_by(*columns).having(func.count() > 1)).all()
+    for ticket_id, mechanic_id in pairs:
+        conn.execute(delete(service_mechanics).where(service_mechanics.c.ticket_id == ticket_id, service_mechanics.c.mechanic_id == mechanic_id))
+        conn.execute(insert(service_mechanics).values(ticket_id=ticket_id, mechanic_id=mechanic_id))
+    return len(pairs)
+
+# Merge repeated lines of the same item on a ticket into the first one, adding up their quantities
+def _dedupe_ticket_items(conn):
+    table = InventoryServiceTicket.__table__
+    groups = conn.execute(select(func.min(table.c.id), func.sum(table.c.quantity), table.c.service_ticket_id, table.c.inventory_id)
+                          .group_by(table.c.service_ticket_id, table.c.inventory_id).having(func.count() > 1)).all()
+    for kept_id, quantity, ticket_id, item_id in groups:
+        conn.execute(update(table).where(table.c.id == kept_id).values(quantity=quantity))
+        conn.execute(delete(table).where(table.c.service_ticket_id == ticket_id, table.c.inventory_id == item_id, table.c.id != kept_id))
+    return len(groups)
+
+DEDUPES = {'service_mechanics': _dedupe_service_mechanics, 'inventory_service_ticket': _dedupe_ticket_items}
+
+# Returns a description of every change made, empty when the database was already up to date
+def upgrade_schema():
+    changes = []
+    engine = db.engine
+    existing_tables = set(inspect(engine).get_table_names())
+    missing = [table for table in db.metadata.sorted_tables if table.name not in existing_tables]
+    if missing:
+        db.metadata.create_all(engine, tables=missing)
+        changes += [f'Created table {table.name}' for table in missing]
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            indexes = inspector.get_indexes(table.name)
+            unique_keys = _column_sets(inspector.get_unique_constraints(table.name)) | _column_sets(index for index in indexes if index['unique'])
+            indexed = _column_sets(indexes) | unique_keys
+
+            key_columns = [column.name for column in table.primary_key.columns]
+            unique_wanted = [tuple(column.name for column in constraint.columns) for constraint in table.constraints
+                             if isinstance(constraint, db.UniqueConstraint) and len(constraint.columns) > 1]
+            needs_pk = tuple(inspector.get_pk_constraint(table.name)['constrained_columns']) != tuple(key_columns) and tuple(key_columns) not in unique_keys
+            needs_unique = [columns for columns in unique_wanted if columns not in unique_keys]
+
+            if (needs_pk or needs_unique) and table.name in DEDUPES:
+                merged = DEDUPES[table.name](conn)
+                if merged:
+                    changes.append(f'Merged {merged} duplicate rows in {table.name}')
+
+            if needs_pk:
+                if conn.dialect.name == 'sqlite': # SQLite cannot add a primary key to a table, a unique index enforces the same
+                    conn.execute(text(f'CREATE UNIQUE INDEX pk_{table.name} ON {table.name} ({", ".join(key_columns)})'))
+                else:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD PRIMARY KEY ({", ".join(key_columns)})'))
+                changes.append(f'Added primary key ({", ".join(key_columns)}) to {table.name}')
+            for columns in needs_unique:
+                conn.execute(text(f'CREATE UNIQUE INDEX uq_{table.name}_{"_".join(columns)} ON {table.name} ({", ".join(columns)})'))
+                changes.append(f'Added unique key ({", ".join(columns)}) to {table.name}')
+
+            if conn.dialect.name == 'mysql':
+                reflected = {column['name']: column for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    collation = getattr(column.type.dialect_impl(conn.dialect), 'collation', None)
+                    if collation and getattr(reflected[column.name]['type'], 'collation', None) != collation:
+                        column_type = column.type.compile(dialect=conn.dialect)
+                        conn.execute(text(f'ALTER TABLE {table.name} MODIFY {column.name} {column_type}{"" if column.nullable else " NOT NULL"}'))
+                        changes.append(f'Set collation {collation} on {table.name}.{column.name}')
+
+            plain_indexes = {tuple(entry['column_names']): entry['name'] for entry in indexes if not entry['unique']}
+            for index in table.indexes:
+                columns = tuple(column.name for column in index.columns)
+                if index.unique and columns not in unique_keys:
+                    # Rows sharing a value are left to the user: merging them is not the schema's call (e.g. items with the same name)
+                    duplicated = conn.execute(select(func.count()).select_from(
+                        select(*index.columns).group_by(*index.columns).having(func.count() > 1).subquery())).scalar_one()
+                    if duplicated:
+                        changes.append(f'Skipped unique index {index.name}: {duplicated} values of ({", ".join(columns)}) are used by more than one row in {table.name}')
+                        continue
+                    if columns in plain_indexes: # Replace the index created before the column became unique
+                        conn.execute(text(f'DROP INDEX {plain_indexes[columns]}' + (f' ON {table.name}' if conn.dialect.name == 'mysql' else '')))
+                        indexed.discard(columns)
+                if columns not in indexed:
+                    index.create(conn)
+                    changes.append(f'Created index {index.name}')
+    return changes
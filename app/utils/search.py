@@ -0,0 +1,156 @@
+import re
+from functools import lru_cache
+from marshmallow import fields, validates_schema, ValidationError
+from marshmallow.validate import Length
+from sqlalchemy import event, select, insert, delete, case, union_all, func, or_, and_, inspect, bindparam
+from sqlalchemy.orm import Session
+from app.models import db, Customer, Inventory, ServiceTicket, SearchTerm
+from app.utils.pagination import PageArgsSchema, encode_cursor, is_cursor_value
+
+# Search index in the search_terms table: every word of the indexed fields is stored once per document, lowercased, so a
+# search term is a range scan on the (kind, term) primary key ('brak' finds terms from 'brak' up to 'bral'). The range
+# relies on code point order: SQLite's default BINARY collation, utf8mb4_bin for the term column on MySQL (see
+# SearchTerm; 'flask upgrade-schema' sets it on existing databases). The table is kept in sync by the session events below for ORM writes; bulk core inserts call
+# index_documents themselves. 'flask rebuild-search-index' rebuilds it from the tables.
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 5
+
+# kind -> (model, {field: weight}). A word in a field with a higher weight ranks the document higher.
+SEARCH_FIELDS = {
+    'customer': (Customer, {'name': 2, 'email': 1}),
+    'inventory': (Inventory, {'name': 1}),
+    'ticket': (ServiceTicket, {'service_desc': 1}),
+}
+_KINDS = {model: kind for kind, (model, weights) in SEARCH_FIELDS.items()}
+
+# Query parameters of the search routes: the search text plus pagination
+class SearchArgsSchema(PageArgsSchema):
+    q = fields.String(required=True, validate=Length(min=1, max=255))
+
+    @validates_schema
+    def validate_search(self, data, **kwargs):
+        if 'q' in data and not tokenize(data['q']):
+            raise ValidationError('Search must contain a letter or digit.', 'q')
+        if data.get('cursor') and not is_cursor_value(data['cursor'].get('score')):
+            raise ValidationError('Invalid cursor.', 'cursor')
+
+search_args_schema = SearchArgsSchema()
+
+def tokenize(text):
+    return [word[:MAX_TERM_LENGTH] for word in re.findall(r'[a-z0-9]+', (text or '').lower())]
+
+# Terms of one document, with the highest weight of the fields each word appears in
+def _document_terms(kind, values):
+    terms = {}
+    for field, weight in SEARCH_FIELDS[kind][1].items():
+        for term in tokenize(values[field]):
+            terms[term] = max(terms.get(term, 0), weight)
+    return terms
+
+# Add documents to the index. documents: iterable of (id, {field: value}) for the kind's fields.
+def index_documents(kind, documents, connection=None):
+    rows = [
+        {'kind': kind, 'term': term, 'ref_id': ref_id, 'weight': weight}
+        for ref_id, values in documents
+        for term, weight in _document_terms(kind, values).items()
+    ]
+    if rows:
+        (connection or db.session).execute(insert(SearchTerm), rows)
+
+def remove_documents(kind, ids, connection=None):
+    if ids:
+        (connection or db.session).execute(delete(SearchTerm).where(SearchTerm.kind == kind, SearchTerm.ref_id.in_(ids)))
+
+def rebuild_index(batch_size=1000):
+    counts = {}
+    for kind, (model, weights) in SEARCH_FIELDS.items():
+        db.session.execute(delete(SearchTerm).where(SearchTerm.kind == kind))
+        columns = [getattr(model, field) for field in weights]
+        query = select(model.id, *columns).order_by(model.id).execution_options(yield_per=batch_size)
+        counts[kind] = 0
+        for batch in db.session.execute(query).partitions():
+            index_documents(kind, [(row.id, row._mapping) for row in batch])
+            counts[kind] += len(batch)
+    db.session.commit()
+    return counts
+
+# Reindex indexed objects the flush inserted, changed or deleted, in the same transaction
+@event.listens_for(Session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    changed = {}
+    removed = {}
+    for obj in session.new | session.dirty:
+        kind = _KINDS.get(type(obj))
+        if kind is None:
+            continue
+        state = inspect(obj)
+        weights = SEARCH_FIELDS[kind][1]
+        if obj in session.new or any(state.attrs[field].history.has_changes() for field in weights):
+            changed.setdefault(kind, {})[obj.id] = {field: getattr(obj, field) for field in weights}
+    for obj in session.deleted:
+        kind = _KINDS.get(type(obj))
+        if kind is not None:
+            removed.setdefault(kind, set()).add(obj.id)
+
+    connection = session.connection()
+    for kind, ids in removed.items():
+        remove_documents(kind, ids, connection)
+    for kind, documents in changed.items():
+        remove_documents(kind, list(documents), connection)
+        index_documents(kind, documents.items(), connection)
+
+# Ranking query for a number of query words, built once and reused with bound parameters (building the statement costs more
+# than running it on small tables). Parameters: kind, term_<n> and upper_<n> for each word, limit, and cursor_score/cursor_id.
+@lru_cache(maxsize=None)
+def _ranking_query(term_count, with_cursor):
+    matches = []
+    for n in range(term_count):
+        term = bindparam(f'term_{n}')
+        term_score = func.max(case((SearchTerm.term == term, SearchTerm.weight * 2), else_=SearchTerm.weight))
+        matches.append(
+            select(SearchTerm.ref_id, term_score.label('score'))
+            .where(SearchTerm.kind == bindparam('kind'), SearchTerm.term >= term, SearchTerm.term < bindparam(f'upper_{n}'))
+            .group_by(SearchTerm.ref_id)
+        )
+    if term_count == 1:
+        query, score, ref_id = matches[0], term_score, SearchTerm.ref_id # Single word, rank its matches directly
+    else:
+        matches = union_all(*matches).subquery()
+        score, ref_id = func.sum(matches.c.score), matches.c.ref_id
+        query = select(ref_id, score.label('score')).group_by(ref_id).having(func.count() == term_count) # One row per query word, so every word matched
+
+    if with_cursor:
+        query = query.having(or_(score < bindparam('cursor_score'), and_(score == bindparam('cursor_score'), ref_id > bindparam('cursor_id'))))
+    return query.order_by(score.desc(), ref_id).limit(bindparam('limit'))
+
+# Documents that contain every word of the query (as a word or the start of one), best match first.
+# The score adds up, for each query word, the weight of the field it was found in, doubled for a whole word match.
+# Keyset pagination on (score descending, id ascending), the cursor holds the id and score of the last result.
+# Returns the page of objects (loaded with the given loader options), the next cursor and the total when asked for.
+def search(kind, text, page_args, options=()):
+    model = SEARCH_FIELDS[kind][0]
+    terms = list(dict.fromkeys(tokenize(text)))[:MAX_QUERY_TERMS]
+
+    params = {'kind': kind, 'limit': page_args['per_page'] + 1} # Fetch one extra row to know whether there is a next page
+    for n, term in enumerate(terms):
+        params[f'term_{n}'] = term
+        params[f'upper_{n}'] = term[:-1] + chr(ord(term[-1]) + 1) # First string after every term starting with this prefix
+
+    total = None
+    if page_args['count']:
+        total = db.session.execute(select(func.count()).select_from(_ranking_query(len(terms), False).limit(None).order_by(None).subquery()), params).scalar_one()
+
+    cursor = page_args['cursor']
+    if cursor:
+        params.update(cursor_score=cursor['score'], cursor_id=cursor['id'])
+    ranked = db.session.execute(_ranking_query(len(terms), bool(cursor)), params).all()
+
+    next_cursor = None
+    if len(ranked) > page_args['per_page']:
+        ranked = ranked[:page_args['per_page']]
+        next_cursor = encode_cursor({'id': ranked[-1].ref_id, 'score': ranked[-1].score})
+
+    ids = [row.ref_id for row in ranked]
+    objects = {obj.id: obj for obj in db.session.execute(select(model).where(model.id.in_(ids)).options(*options)).scalars()} if ids else {}
+    return [objects[ref_id] for ref_id in ids if ref_id in objects], next_cursor, total
@@ -0,0 +1,136 @@
+from marshmallow import fields, missing
+
+# Compiled serializers and validators for the hot schemas. Each schema is turned once into a plain function that reads
+# object attributes (dump) or dict keys (load) and converts them the way its marshmallow fields would, skipping
+# marshmallow's per-field machinery. dump is for ORM objects, mappings (e.g. row._mapping) still go through schema.dump.
+# Only simple schemas are compiled: anything the compiler does not know (hooks, custom fields, formats) leaves the
+# schema on marshmallow. Output is the same as schema.dump / schema.load, tests compare the two.
+
+class _NotCompiled(Exception):
+    pass
+
+# Field types whose dump is a plain conversion of a non-None value (None dumps as None)
+_DUMP_CONVERSIONS = {
+    fields.String: str,
+    fields.Integer: int,
+    fields.Float: float,
+}
+
+def _dump_conversion(field):
+    if field.attribute and '.' in field.attribute:
+        raise _NotCompiled
+    if type(field) in _DUMP_CONVERSIONS and not getattr(field, 'as_string', False):
+        return _DUMP_CONVERSIONS[type(field)]
+    if type(field) is fields.Date and field.format in (None, 'iso'):
+        return lambda value: value.isoformat()
+    if type(field) is fields.Nested:
+        dump_one = _compile_dump(field.schema)
+        if field.many:
+            return lambda value: [dump_one(item) for item in value]
+        return dump_one
+    raise _NotCompiled
+
+def _has_hooks(schema, kind):
+    return any(kind in hook for hook, registered in schema._hooks.items() if registered)
+
+# Dump function for one object of the schema, keys in the order marshmallow writes them
+def _compile_dump(schema):
+    if _has_hooks(schema, 'dump'):
+        raise _NotCompiled
+    plan = tuple((field.data_key or name, field.attribute or name, _dump_conversion(field)) for name, field in schema.dump_fields.items())
+
+    def dump_one(obj):
+        data = {}
+        for key, attribute, convert in plan:
+            value = getattr(obj, attribute)
+            data[key] = None if value is None else convert(value)
+        return data
+
+    return dump_one
+
+# Field types loaded on the fast path when the value already has the exact type (bool is not an int here, as in marshmallow)
+_LOAD_TYPES = {
+    fields.String: str,
+    fields.Integer: int,
+}
+
+def _load_check(field):
+    if field.validators or field.allow_none:
+        raise _NotCompiled
+    if type(field) in _LOAD_TYPES:
+        expected = _LOAD_TYPES[type(field)]
+        return lambda value: value if type(value) is expected else missing
+    if type(field) is fields.List:
+        return _list_check(_load_check(field.inner))
+    if type(field) is fields.Nested:
+        if field.only or field.exclude:
+            raise _NotCompiled
+        load_one = _compile_load(field.schema)
+        return _list_check(load_one) if field.many else load_one
+    raise _NotCompiled
+
+def _list_check(check_item):
+    def check_list(value):
+        if type(value) is not list:
+            return missing
+        items = [check_item(item) for item in value]
+        return missing if any(item is missing for item in items) else items
+    return check_list
+
+# Load function for one input dict: the loaded data, or missing when the input is not a plain valid case (wrong types,
+# unknown or absent required keys, None values), which marshmallow then loads or rejects with its usual messages
+def _compile_load(schema):
+    if _has_hooks(schema, 'load') or _has_hooks(schema, 'validates'):
+        raise _NotCompiled
+    plan = tuple((field.data_key or name, field.attribute or name, field.required, field.load_default, _load_check(field)) for name, field in schema.load_fields.items())
+    known_keys = frozenset(key for key, *rest in plan)
+
+    def load_one(data):
+        if type(data) is not dict or not known_keys.issuperset(data):
+            return missing
+        result = {}
+        for key, attribute, required, load_default, check in plan:
+            if key not in data:
+                if required:
+                    return missing
+                if load_default is not missing:
+                    result[attribute] = load_default() if callable(load_default) else load_default
+                continue
+            value = check(data[key])
+            if value is missing:
+                return missing
+            result[attribute] = value
+        return result
+
+    return load_one
+
+def _compile(compiler, schema):
+    try:
+        return compiler(schema)
+    except _NotCompiled:
+        return None
+
+_dumpers = {}
+_loaders = {}
+
+# schema.dump(obj) through the schema's compiled dump function when it has one
+def dump(schema, obj, many=None):
+    if id(schema) not in _dumpers:
+        _dumpers[id(schema)] = (schema, _compile(_compile_dump, schema))
+    dump_one = _dumpers[id(schema)][1]
+    many = schema.many if many is None else many
+    if dump_one is None:
+        return schema.dump(obj, many=many)
+    return [dump_one(item) for item in obj] if many else dump_one(obj)
+
+# schema.load(data), checked by the compiled load function first. Anything it does not accept goes to marshmallow,
+# so invalid input raises the same ValidationError as before. Schemas with many=True are always loaded by marshmallow.
+def load(schema, data):
+    if id(schema) not in _loaders:
+        _loaders[id(schema)] = (schema, None if schema.many else _compile(_compile_load, schema))
+    load_one = _loaders[id(schema)][1]
+    if load_one is not None:
+        result = load_one(data)
+        if result is not missing:
+            return result
+    return schema.load(data)
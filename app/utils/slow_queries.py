@@ -0,0 +1,148 @@
+import glob
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from flask import request, has_request_context
+from sqlalchemy import event
+from app.models import db
+
+DEFAULT_THRESHOLD_MS = 200
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+# Opt-in slow-query log (SLOW_QUERY_LOG = path of the file, off when unset). Every statement slower than
+# SLOW_QUERY_THRESHOLD_MS is written as one JSON line with the endpoint that sent it, the types of its bound parameters
+# (never their values, they hold emails and names), its duration and its plan, taken right away on the same connection
+# so it reflects the data and indexes of that moment. Each process writes its own file, with its pid before the extension
+# (slow_queries.log -> slow_queries.<pid>.log): a rotating handler is only safe with one writer, several gunicorn
+# workers rotating one file would lose or mix up records. Each file rotates at SLOW_QUERY_LOG_MAX_BYTES, keeping
+# SLOW_QUERY_LOG_BACKUPS old files. Summarize them all with: flask --app flask_app slow-queries
+
+# Types of the bound parameters, e.g. ['int', 'str'] or {'email_1': 'str'}
+def parameter_shape(parameters):
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+# Plan of a statement, as a list of rows (column: value). Runs on a raw cursor of the same connection, so it is not
+# counted by the query stats or seen by other engine listeners.
+def explain(connection, statement, parameters):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        columns = [column[0] for column in cursor.description]
+        return [{column: value if isinstance(value, (int, float, type(None))) else str(value) for column, value in zip(columns, row)}
+                for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+# File written by the process with this pid
+def process_log_path(path, pid):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{pid}{ext}'
+
+class SlowQueryLog:
+    def __init__(self, path, threshold_ms=DEFAULT_THRESHOLD_MS, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.handler = None
+        self.pid = None
+
+    # Handler of the current process, opened again after a fork (gunicorn --preload creates the app before forking workers)
+    def process_handler(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            # delay: the file is only created by the first slow statement
+            self.handler = RotatingFileHandler(process_log_path(self.path, self.pid), maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8', delay=True)
+        return self.handler
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_started = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context._slow_query_started
+        if duration >= self.threshold:
+            self.record(conn, statement, parameters, duration, executemany)
+
+    def record(self, conn, statement, parameters, duration, executemany=False):
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'endpoint': request.endpoint if has_request_context() else None, # None for CLI commands and scripts
+            'method': request.method if has_request_context() else None,
+            'duration_ms': round(duration * 1000, 3),
+            'statement': statement,
+        }
+        if executemany:
+            entry['rows'] = len(parameters)
+            entry['parameters'] = parameter_shape(parameters[0]) if parameters else []
+        else:
+            entry['parameters'] = parameter_shape(parameters)
+            if statement.lstrip()[:6].upper() in EXPLAINED_STATEMENTS:
+                try:
+                    entry['plan'] = explain(conn, statement, parameters)
+                except Exception as e: # The log must never fail the request
+                    entry['plan_error'] = str(e)
+        self.process_handler().handle(logging.makeLogRecord({'msg': json.dumps(entry, default=str)}))
+
+    def close(self):
+        if self.handler is not None:
+            self.handler.close()
+
+def init_slow_query_log(app):
+    path = app.config.get('SLOW_QUERY_LOG')
+    if not path:
+        return None
+    log = SlowQueryLog(path, threshold_ms=app.config.get('SLOW_QUERY_THRESHOLD_MS', DEFAULT_THRESHOLD_MS),
+                       max_bytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', DEFAULT_MAX_BYTES),
+                       backups=app.config.get('SLOW_QUERY_LOG_BACKUPS', DEFAULT_BACKUPS))
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', log.before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', log.after_cursor_execute)
+    app.extensions['slow_query_log'] = log
+    return log
+
+# The file and its rotated copies (file.1 newest ... file.N oldest), oldest first
+def _with_rotated(file_path):
+    rotated = [rotated_path for rotated_path in glob.glob(glob.escape(file_path) + '.*') if rotated_path.rsplit('.', 1)[1].isdigit()]
+    return sorted(rotated, key=lambda rotated_path: int(rotated_path.rsplit('.', 1)[1]), reverse=True) + [file_path]
+
+# Entries of every process's log and their rotated files (and of the file at path itself), oldest file of each first
+def read_entries(path):
+    root, ext = os.path.splitext(path)
+    pids = set()
+    for file_path in glob.glob(glob.escape(root) + '.*'): # <root>.<pid><ext>, or a rotated copy of it
+        match = re.fullmatch(r'(\d+)' + re.escape(ext) + r'(\.\d+)?', file_path[len(root) + 1:])
+        if match:
+            pids.add(int(match.group(1)))
+    for log_path in [process_log_path(path, pid) for pid in sorted(pids)] + [path]:
+        for file_path in _with_rotated(log_path):
+            if not os.path.exists(file_path):
+                continue
+            with open(file_path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+# Slow statements per endpoint, worst total time first: count, total and max duration, and the slowest statement
+def summarize(entries, top=10):
+    routes = {}
+    for entry in entries:
+        route = routes.setdefault(entry['endpoint'] or '(no request)', {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slowest': None})
+        route['count'] += 1
+        route['total_ms'] += entry['duration_ms']
+        if entry['duration_ms'] >= route['max_ms']:
+            route['max_ms'] = entry['duration_ms']
+            route['slowest'] = entry
+    ranked = sorted(routes.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+    return ranked[:top]
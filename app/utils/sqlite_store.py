@@ -0,0 +1,168 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from flask_caching.backends.base import BaseCache
+from limits.storage import Storage
+
+# SQLite backed stores for the cache and the rate limiter. Every worker process on a host opens the same database
+# file, so cached responses, cache invalidations and rate limit counters are shared between workers without running
+# a Redis server. Use ':memory:' (cache) or 'sqlite://' (limiter) for a private store, e.g. in tests.
+
+class _SQLiteConnection:
+    def __init__(self, path, schema):
+        self._path = path
+        self._schema = schema
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Connections are opened lazily and reopened after a fork (gunicorn workers must not share the parent's connection)
+    def connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._pid = os.getpid()
+            if self._path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(self._schema)
+        return self._conn
+
+    # Returns the number of rows changed
+    def execute(self, statement, parameters=()):
+        with self._lock:
+            return self.connection().execute(statement, parameters).rowcount
+
+    def fetchone(self, statement, parameters=()):
+        with self._lock:
+            return self.connection().execute(statement, parameters).fetchone()
+
+    # Runs fn(connection) in a write transaction so read-modify-write updates are atomic across processes
+    def transaction(self, fn):
+        with self._lock:
+            conn = self.connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(conn)
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            return result
+
+
+# Expired rows are skipped on read and deleted every prune_interval writes of a worker (like FileSystemCache pruning
+# past its threshold): cached_view keys change with every cache version and encoding, so old rows are never overwritten.
+class SQLiteCache(BaseCache):
+    def __init__(self, path=':memory:', default_timeout=300, prune_interval=100):
+        super().__init__(default_timeout)
+        self._db = _SQLiteConnection(path, 'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL);'
+                                           'CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires)')
+        self._prune_interval = prune_interval
+        self._writes = 0
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        args.insert(0, config.get('CACHE_SQLITE_PATH', ':memory:'))
+        kwargs.setdefault('prune_interval', config.get('CACHE_SQLITE_PRUNE_INTERVAL', 100))
+        return cls(*args, **kwargs)
+
+    # Deletes the expired rows, returns how many
+    def prune(self):
+        return self._db.execute('DELETE FROM cache WHERE expires != 0 AND expires <= ?', (time.time(),))
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout else 0 # 0 means the entry never expires
+
+    def get(self, key):
+        row = self._db.fetchone('SELECT value FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)', (key, time.time()))
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, timeout=None):
+        self._db.execute('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)', (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout)))
+        self._writes += 1
+        if self._writes % self._prune_interval == 0:
+            self.prune()
+        return True
+
+    def add(self, key, value, timeout=None):
+        def add_value(conn):
+            conn.execute('DELETE FROM cache WHERE key = ? AND expires != 0 AND expires <= ?', (key, time.time()))
+            cursor = conn.execute('INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)', (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout)))
+            return cursor.rowcount == 1
+        return self._db.transaction(add_value)
+
+    def delete(self, key):
+        return self._db.execute('DELETE FROM cache WHERE key = ?', (key,)) == 1
+
+    def has(self, key):
+        return self._db.fetchone('SELECT 1 FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)', (key, time.time())) is not None
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+        return True
+
+    def inc(self, key, delta=1):
+        def increment(conn):
+            now = time.time()
+            row = conn.execute('SELECT value, expires FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)', (key, now)).fetchone()
+            value = (pickle.loads(row[0]) if row else 0) + delta
+            expires = row[1] if row else self._expires(None)
+            conn.execute('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)', (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires))
+            return value
+        return self._db.transaction(increment)
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+
+# Fixed window rate limit counters for Flask-Limiter, selected with RATELIMIT_STORAGE_URI = 'sqlite:///<path>'
+class SQLiteStorage(Storage):
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        path = uri.split('://', 1)[1] if uri else ''
+        self._db = _SQLiteConnection(path or ':memory:', 'CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)')
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        def increment(conn):
+            now = time.time()
+            row = conn.execute('SELECT count, expires FROM rate_limits WHERE key = ? AND expires > ?', (key, now)).fetchone()
+            if row is None:
+                count, expires = amount, now + expiry
+            else:
+                count, expires = row[0] + amount, (now + expiry if elastic_expiry else row[1])
+            conn.execute('INSERT OR REPLACE INTO rate_limits (key, count, expires) VALUES (?, ?, ?)', (key, count, expires))
+            return count
+        return self._db.transaction(increment)
+
+    def get(self, key):
+        row = self._db.fetchone('SELECT count FROM rate_limits WHERE key = ? AND expires > ?', (key, time.time()))
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._db.fetchone('SELECT expires FROM rate_limits WHERE key = ? AND expires > ?', (key, time.time()))
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._db.fetchone('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._db.execute('DELETE FROM rate_limits')
+
+    def clear(self, key):
+        self._db.execute('DELETE FROM rate_limits WHERE key = ?', (key,))
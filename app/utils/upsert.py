@@ -0,0 +1,81 @@
+from sqlalchemy import select, insert, update, bindparam
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from app.models import db
+
+# Insert rows, or add their counter to the row already stored under the same unique key, in one statement per batch.
+# Unlike reading the existing keys first and then choosing UPDATE or INSERT, two transactions adding the same new key
+# both succeed: the second one adds to the first one's row instead of failing on the unique key.
+# key_names: columns of the table's unique key (ON CONFLICT target on SQLite and Postgres, MySQL uses whichever unique key conflicts)
+def upsert_increments(table, key_names, counter, rows):
+    _upsert(table, key_names, rows, lambda new: {counter: table.c[counter] + new[counter]})
+
+# Insert rows, or overwrite the other columns of the row already stored under the same unique key
+def upsert_rows(table, key_names, rows):
+    _upsert(table, key_names, rows, lambda new: {name: new[name] for name in rows[0] if name not in key_names})
+
+# Insert rows, skipping those whose unique key is already stored, also when another transaction stored it meanwhile
+def insert_missing(table, key_names, rows):
+    if not rows:
+        return
+    statement = insert_missing_statement(table, key_names, db.session.get_bind().dialect.name)
+    if statement is None:
+        query = select(*(table.c[name] for name in key_names))
+        for name in key_names:
+            query = query.where(table.c[name].in_({row[name] for row in rows}))
+        existing = set(tuple(key) for key in db.session.execute(query))
+        rows = [row for row in rows if tuple(row[name] for name in key_names) not in existing]
+        if rows:
+            db.session.execute(insert(table), rows)
+    else:
+        db.session.execute(statement, rows)
+
+# The dialect's insert-unless-stored statement, None when the dialect has none
+def insert_missing_statement(table, key_names, dialect):
+    if dialect == 'mysql':
+        # A no-op update rather than INSERT IGNORE, which would also turn foreign key and other errors into warnings
+        statement = mysql.insert(table)
+        return statement.on_duplicate_key_update({key_names[0]: statement.inserted[key_names[0]]})
+    if dialect in ('postgresql', 'sqlite'):
+        return (postgresql if dialect == 'postgresql' else sqlite).insert(table).on_conflict_do_nothing(index_elements=key_names)
+    return None
+
+# The dialect's insert-or-add statement, None when the dialect has no upsert
+def upsert_statement(table, key_names, counter, dialect):
+    return _upsert_statement(table, key_names, dialect, lambda new: {counter: table.c[counter] + new[counter]})
+
+# set_values(new) gives the columns to change on a conflict, new holds the values of the row that was not inserted
+def _upsert_statement(table, key_names, dialect, set_values):
+    if dialect == 'mysql':
+        statement = mysql.insert(table)
+        return statement.on_duplicate_key_update(set_values(statement.inserted))
+    if dialect in ('postgresql', 'sqlite'):
+        statement = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+        return statement.on_conflict_do_update(index_elements=key_names, set_=set_values(statement.excluded))
+    return None
+
+def _upsert(table, key_names, rows, set_values):
+    if not rows:
+        return
+    statement = _upsert_statement(table, key_names, db.session.get_bind().dialect.name, set_values)
+    if statement is None:
+        _update_then_insert(table, key_names, rows, set_values)
+    else:
+        db.session.execute(statement, rows)
+
+# Other dialects: read the existing keys, update those rows and insert the rest. A key inserted by a concurrent
+# transaction in between fails on the unique key.
+def _update_then_insert(table, key_names, rows, set_values):
+    # Filtering on each column separately may return extra rows, they are ignored
+    query = select(*(table.c[name] for name in key_names))
+    for name in key_names:
+        query = query.where(table.c[name].in_({row[name] for row in rows}))
+    existing = set(tuple(key) for key in db.session.execute(query))
+
+    updates = [{f'new_{name}': value for name, value in row.items()} for row in rows if tuple(row[name] for name in key_names) in existing]
+    inserts = [row for row in rows if tuple(row[name] for name in key_names) not in existing]
+    if updates:
+        new = {name: bindparam(f'new_{name}') for name in rows[0]}
+        statement = update(table).where(*(table.c[name] == new[name] for name in key_names)).values(set_values(new))
+        db.session.execute(statement, updates)
+    if inserts:
+        db.session.execute(insert(table), inserts)
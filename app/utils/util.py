@@ -1,11 +1,16 @@
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from functools import wraps
-from flask import request, jsonify
+from collections import OrderedDict
+from flask import request, jsonify, g
+from app.models import db, Customer, Mechanic
 import jose
 import os
+import threading
+import time
 
 SECRET_KEY = os.environ.get('SECRET_KEY') or 'Secret_key'
+TOKEN_CACHE_SIZE = 4096 # Verified tokens remembered per worker
 
 # Encode token when customer or mechanic logs in. Encodes extra piece of information for whether they are customer or mechanic.
 def encode_token(customer_id, customer_or_mechanic):
@@ -15,61 +20,78 @@ def encode_token(customer_id, customer_or_mechanic):
         'sub': str(customer_id),
         'type': str(customer_or_mechanic)
     }
-    
+
     token = jwt.encode(payload, SECRET_KEY, algorithm='HS256')
-    
+
     return token
 
+# LRU of token -> verified claims. A token is only decoded and its signature checked the first time it is seen, after that its claims are reused until the token expires.
+_verified_tokens = OrderedDict()
+_verified_tokens_lock = threading.Lock()
+
+def decode_token(token):
+    with _verified_tokens_lock:
+        claims = _verified_tokens.get(token)
+        if claims is not None:
+            if claims['exp'] > time.time():
+                _verified_tokens.move_to_end(token)
+                return claims
+            del _verified_tokens[token] # Expired, decode again so the usual expired error is raised
+
+    claims = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+
+    with _verified_tokens_lock:
+        _verified_tokens[token] = claims
+        if len(_verified_tokens) > TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+
+    return claims
+
+# Verify the token in the Authorization header belongs to a customer or mechanic, and store who is logged in on g for the rest of the request
+def token_required(customer_or_mechanic):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            token = None
+
+            # Check for token in Authorization header
+            if 'Authorization' in request.headers:
+                token = request.headers['Authorization'].split(' ')[-1] # Get token from string "Bearer <token>"
+
+            if not token:
+                return jsonify({'error':'Token not found'}), 401
+
+            try:
+                data = decode_token(token)
+                principal_id = data['sub']
+                if data['type'] != customer_or_mechanic:
+                    raise jose.exceptions.JWTError
+            except jose.exceptions.ExpiredSignatureError:
+                return jsonify({'error': 'token has expired'}), 401
+            except jose.exceptions.JWTError:
+                return jsonify({'error': 'Invalid token'}), 401
+
+            g.principal_type = customer_or_mechanic
+            g.principal_id = principal_id
+
+            return f(principal_id, *args, **kwargs)
+
+        return decorated
+    return decorator
+
 # Verify customer token
-def token_required_customer(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        
-        # Check for token in Authorization header
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(' ')[1] # Get token from string "Bearer <token>"
-            
-        if not token:
-            return jsonify({'error':'Token not found'}), 401
-        
-        try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            customer_id = data['sub']
-            customer_or_mechanic = data['type']
-            if customer_or_mechanic != 'customer':
-                raise jose.exceptions.JWTError
-        except jose.exceptions.ExpiredSignatureError:
-            return jsonify({'error': 'token has expired'}), 401
-        except jose.exceptions.JWTError:
-            return jsonify({'error': 'Invalid token'}), 401
-        
-        return f(customer_id, *args, **kwargs)
-    
-    return decorated
+token_required_customer = token_required('customer')
 
 # Verify mechanic token
-def token_required_mechanic(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(' ')[1]
-            
-        if not token:
-            return jsonify({"error":'Token not found'}), 401
-        
-        try:
-            data=jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            mechanic_id = data['sub']
-            customer_or_mechanic = data['type']
-            if customer_or_mechanic != 'mechanic':
-                raise jose.exceptions.JWTError
-        except jose.exceptions.ExpiredSignatureError:
-            return jsonify({'error':'token has expired'}), 401
-        except jose.exceptions.JWTError:
-            return jsonify({'error':'Invalid token'}), 401
-        
-        return f(mechanic_id, *args, **kwargs)
-    return decorated
\ No newline at end of file
+token_required_mechanic = token_required('mechanic')
+
+# Logged in customer or mechanic for this request. Loaded from the database at most once per request, None if they no longer exist.
+def current_customer():
+    if 'customer' not in g:
+        g.customer = db.session.get(Customer, g.principal_id) if g.get('principal_type') == 'customer' else None
+    return g.customer
+
+def current_mechanic():
+    if 'mechanic' not in g:
+        g.mechanic = db.session.get(Mechanic, g.principal_id) if g.get('principal_type') == 'mechanic' else None
+    return g.mechanic
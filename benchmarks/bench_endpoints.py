@@ -0,0 +1,345 @@
+# Latency percentiles, SQL statements and memory of every API route, on a seeded SQLite database (BenchmarkConfig).
+# The seeded database is kept in instance/ and reused by later runs with the same volumes, every run starts from a
+# fresh copy of it. Results are saved as JSON, --compare prints the changes against an earlier result file.
+#
+#   python benchmarks/bench_endpoints.py [--customers 10000] [--tickets 100000] [--items-per-ticket 10]
+#                                        [--repeat 50] [--only serviceticket] [--output results.json] [--compare old.json]
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from config import BENCHMARK_DB_PATH
+from app import create_app
+from app.models import db, Customer, Mechanic, Inventory, ServiceTicket, InventoryServiceTicket, service_mechanics
+from app.utils.bulk import chunked
+from app.utils.passwords import hash_password
+from app.utils.rollups import rebuild_rollups
+from app.utils.search import rebuild_index
+from app.utils.util import encode_token
+
+PASSWORD = 'benchmark'
+WARMUP = 2 # Untimed requests per route before measuring
+SEED_CHUNK_SIZE = 10000 # Rows per INSERT statement while seeding
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+FIRST_NAMES = ['Ana', 'Ben', 'Chloe', 'Dev', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jon', 'Kemal', 'Lea', 'Mateo', 'Nia', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sven', 'Tara']
+LAST_NAMES = ['Garcia', 'Smith', 'Nguyen', 'Okafor', 'Muller', 'Rossi', 'Tanaka', 'Silva', 'Kowalski', 'Haddad', 'Larsen', 'Novak', 'Patel', 'Dubois', 'Kim', 'Moreau', 'Ivanova', 'Costa', 'Evans', 'Sato']
+PARTS = ['brake pad', 'brake rotor', 'oil filter', 'air filter', 'cabin filter', 'spark plug', 'wiper blade', 'tire', 'battery', 'serpentine belt', 'radiator hose', 'headlight bulb', 'o2 sensor', 'alternator', 'starter', 'water pump', 'thermostat', 'fuel pump', 'cv axle', 'tie rod end']
+SERVICES = ['Brake job', 'Oil change', 'Tire rotation', 'Battery replacement', 'Engine diagnostics', 'Wiper blade replacement', 'Coolant flush', 'Spark plug replacement', 'Suspension repair', 'Alignment']
+VIN_CHARS = 'ABCDEFGHJKLMNPRSTUVWXYZ0123456789'
+
+# Seeding
+
+def _insert(table, rows):
+    for chunk in chunked(rows, SEED_CHUNK_SIZE):
+        db.session.execute(table.insert(), chunk)
+
+def seed_database(volumes, seed):
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    password = hash_password(PASSWORD) # One hash shared by every account, hashing each would dominate seeding
+
+    _insert(Customer.__table__, ({
+        'name': f'{FIRST_NAMES[i % 20]} {LAST_NAMES[i // 20 % 20]}',
+        'email': f'customer{i + 1}@example.com',
+        'phone': f'555{i:07d}',
+        'password': password,
+    } for i in range(volumes['customers'])))
+    _insert(Mechanic.__table__, ({
+        'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        'email': f'mechanic{i + 1}@example.com',
+        'phone': f'555{i:07d}',
+        'password': password,
+        'salary': rng.randrange(50000, 120000),
+    } for i in range(volumes['mechanics'])))
+    _insert(Inventory.__table__, ({'name': f'{PARTS[i % 20]} {i + 1}', 'price': round(rng.uniform(2, 400), 2)} for i in range(volumes['inventory'])))
+
+    start = date.today() - timedelta(days=730)
+    _insert(ServiceTicket.__table__, ({
+        'VIN': ''.join(rng.choices(VIN_CHARS, k=17)),
+        'service_date': start + timedelta(days=rng.randrange(730)),
+        'service_desc': rng.choice(SERVICES),
+        'customer_id': rng.randrange(volumes['customers']) + 1,
+    } for i in range(volumes['tickets'])))
+    _insert(service_mechanics, ({'ticket_id': ticket_id, 'mechanic_id': mechanic_id}
+                                for ticket_id in range(1, volumes['tickets'] + 1)
+                                for mechanic_id in rng.sample(range(1, volumes['mechanics'] + 1), rng.randint(1, 2))))
+    _insert(InventoryServiceTicket.__table__, ({'service_ticket_id': ticket_id, 'inventory_id': inventory_id, 'quantity': rng.randint(1, 4)}
+                                                for ticket_id in range(1, volumes['tickets'] + 1)
+                                                for inventory_id in rng.sample(range(1, volumes['inventory'] + 1), volumes['items_per_ticket'])))
+
+    rebuild_index()
+    rebuild_rollups()
+    db.session.commit()
+
+def _remove_database(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+# Copy of the seeded database for this run, seeding it first if no earlier run used the same volumes
+def prepare_database(volumes, seed, reseed):
+    seed_path = BENCHMARK_DB_PATH.replace('.db', '') + '-seed-' + '-'.join(str(volumes[key]) for key in sorted(volumes)) + f'-{seed}.db'
+    _remove_database(BENCHMARK_DB_PATH)
+    app = create_app('BenchmarkConfig')
+    if os.path.exists(seed_path) and not reseed:
+        shutil.copyfile(seed_path, BENCHMARK_DB_PATH)
+        return app
+
+    print(f'Seeding {seed_path} ...')
+    started = time.perf_counter()
+    with app.app_context():
+        seed_database(volumes, seed)
+        db.engine.dispose() # Closing the last connection checkpoints the WAL into the database file
+    shutil.copyfile(BENCHMARK_DB_PATH, seed_path)
+    print(f'Seeded in {time.perf_counter() - started:.1f}s')
+    return app
+
+# Routes
+
+# One benchmarked request: make_request(i) returns the test client arguments of the i-th request. It runs untimed,
+# so it can also set up what the request needs (e.g. an item to delete). repeat: fraction of --repeat for slow routes.
+class Scenario:
+    def __init__(self, name, make_request, status=200, repeat=1.0):
+        self.name = name
+        self.make_request = make_request
+        self.status = status
+        self.repeat = repeat
+
+def scenarios(client, volumes, run_id):
+    customers, tickets, items = volumes['customers'], volumes['tickets'], volumes['inventory']
+    mechanic_headers = {'Authorization': 'Bearer ' + encode_token(1, 'mechanic')}
+
+    def customer_headers(i):
+        return {'Authorization': 'Bearer ' + encode_token(i % customers + 1, 'customer')}
+
+    def get(path, headers=None):
+        return lambda i: {'method': 'GET', 'path': path(i) if callable(path) else path, 'headers': headers}
+
+    # Objects the write routes need, created through the API so rollups and search terms stay consistent
+    def new_customer(i):
+        response = client.post('/customers/', json={'name': 'Delete Me', 'email': f'delete{run_id}-{i}@example.com', 'phone': '5550000000', 'password': PASSWORD})
+        headers = {'Authorization': 'Bearer ' + encode_token(response.json['id'], 'customer')}
+        for ticket in range(2):
+            new_ticket(i, headers)
+        return headers
+
+    def new_ticket(i, headers=None):
+        response = client.post('/serviceticket/', json={'VIN': f'DEL{i:014d}', 'service_date': date.today().isoformat(), 'service_desc': 'Brake job'}, headers=headers or customer_headers(i))
+        ticket_id = response.json['id']
+        client.put(f'/serviceticket/{ticket_id}/assign-mechanic', headers=mechanic_headers) # Only assigned mechanics add items
+        client.put('/serviceticket/add_items', json={'ticket_id': ticket_id, 'item_quant': [{'item_id': item % items + 1, 'quantity': 1} for item in range(i, i + 3)]}, headers=mechanic_headers)
+        return ticket_id
+
+    def assigned_ticket(i):
+        client.put(f'/serviceticket/{i % tickets + 1}/assign-mechanic', headers=mechanic_headers)
+        return i % tickets + 1
+
+    def new_item(i):
+        return client.post('/inventory/', json={'name': f'delete me {run_id} {i}', 'price': 9.99}, headers=mechanic_headers).json['id']
+
+    def new_mechanic(i):
+        response = client.post('/mechanics/', json={'name': 'Delete Me', 'email': f'delete{run_id}-{i}@example.com', 'phone': '5550000000', 'password': PASSWORD, 'salary': 60000})
+        return {'Authorization': 'Bearer ' + encode_token(response.json['id'], 'mechanic')}
+
+    return [
+        # Reads
+        Scenario('GET /customers/', get('/customers/')),
+        Scenario('GET /customers/?fields=id,name', get('/customers/?fields=id,name')),
+        Scenario('GET /customers/search', get(lambda i: f'/customers/search?q={LAST_NAMES[i % 20]}')),
+        Scenario('GET /customers/<id>', get(lambda i: f'/customers/{i % customers + 1}')),
+        Scenario('GET /customers/my-tickets', lambda i: {'method': 'GET', 'path': '/customers/my-tickets', 'headers': customer_headers(i)}),
+        Scenario('GET /mechanics/', get('/mechanics/')),
+        Scenario('GET /mechanics/ranked', get('/mechanics/ranked')),
+        Scenario('GET /serviceticket/', get('/serviceticket/')),
+        Scenario('GET /serviceticket/?include=total', get('/serviceticket/?include=total')),
+        Scenario('GET /serviceticket/?customer_id=', get(lambda i: f'/serviceticket/?customer_id={i % customers + 1}')),
+        Scenario('GET /serviceticket/search', get(lambda i: f'/serviceticket/search?q={SERVICES[i % 10].split()[0]}')),
+        Scenario('GET /serviceticket/<id>/invoice', get(lambda i: f'/serviceticket/{i % tickets + 1}/invoice')),
+        Scenario('GET /serviceticket/export', get('/serviceticket/export'), repeat=0.02), # Every ticket, about a minute at the default volumes
+        Scenario('GET /inventory/', get('/inventory/')),
+        Scenario('GET /inventory/search', get(lambda i: f'/inventory/search?q={PARTS[i % 20]}')),
+        Scenario('GET /inventory/<id>', get(lambda i: f'/inventory/{i % items + 1}')),
+        Scenario('GET /metrics/db-pool', get('/metrics/db-pool', mechanic_headers)),
+        Scenario('GET /reports/daily', get('/reports/daily', mechanic_headers)),
+        Scenario('GET /reports/top-parts', get('/reports/top-parts', mechanic_headers)),
+
+        # Writes
+        Scenario('POST /customers/login', lambda i: {'method': 'POST', 'path': '/customers/login', 'json': {'email': f'customer{i % customers + 1}@example.com', 'password': PASSWORD}}),
+        Scenario('POST /mechanics/login', lambda i: {'method': 'POST', 'path': '/mechanics/login', 'json': {'email': 'mechanic1@example.com', 'password': PASSWORD}}),
+        Scenario('POST /customers/', lambda i: {'method': 'POST', 'path': '/customers/', 'json': {'name': 'New Customer', 'email': f'new{run_id}-{i}@example.com', 'phone': '5550000000', 'password': PASSWORD}}, status=201),
+        Scenario('POST /customers/bulk', lambda i: {
+            'method': 'POST', 'path': '/customers/bulk', 'headers': mechanic_headers, 'content_type': 'application/x-ndjson',
+            'data': '\n'.join(json.dumps({'name': 'Bulk Customer', 'email': f'bulk{run_id}-{i}-{row}@example.com', 'phone': '5550000000'}) for row in range(100)),
+        }),
+        Scenario('PUT /customers/', lambda i: {'method': 'PUT', 'path': '/customers/', 'headers': customer_headers(i), 'json': {'name': f'Renamed {i}', 'email': f'customer{i % customers + 1}@example.com', 'phone': '5550000000', 'password': PASSWORD}}),
+        Scenario('POST /mechanics/', lambda i: {'method': 'POST', 'path': '/mechanics/', 'json': {'name': 'New Mechanic', 'email': f'new{run_id}-{i}@example.com', 'phone': '5550000000', 'password': PASSWORD, 'salary': 60000}}, status=201),
+        Scenario('PUT /mechanics/', lambda i: {'method': 'PUT', 'path': '/mechanics/', 'headers': mechanic_headers, 'json': {'name': f'Renamed {i}', 'email': 'mechanic1@example.com', 'phone': '5550000000', 'password': PASSWORD, 'salary': 70000}}),
+        Scenario('POST /serviceticket/', lambda i: {'method': 'POST', 'path': '/serviceticket/', 'headers': customer_headers(i), 'json': {'VIN': f'NEW{i:014d}', 'service_date': date.today().isoformat(), 'service_desc': 'Oil change'}}, status=201),
+        # Mechanic 1 is on a few seeded tickets, assigning an already assigned mechanic is a 200 as well
+        Scenario('PUT /serviceticket/<id>/assign-mechanic', lambda i: {'method': 'PUT', 'path': f'/serviceticket/{i % tickets + 1}/assign-mechanic', 'headers': mechanic_headers}),
+        Scenario('PUT /serviceticket/<id>/remove-mechanic', lambda i: {'method': 'PUT', 'path': f'/serviceticket/{assigned_ticket(i)}/remove-mechanic', 'headers': mechanic_headers}),
+        Scenario('PUT /serviceticket/<id>/edit', lambda i: {'method': 'PUT', 'path': f'/serviceticket/{i // 2 % tickets + 1}/edit', 'headers': mechanic_headers, 'json': {'add_mechanic_ids' if i % 2 == 0 else 'remove_mechanic_ids': [1]}}),
+        Scenario('PUT /serviceticket/add_items', lambda i: {'method': 'PUT', 'path': '/serviceticket/add_items', 'headers': mechanic_headers, 'json': {'ticket_id': assigned_ticket(i), 'item_quant': [{'item_id': item % items + 1, 'quantity': 1} for item in range(i, i + 5)]}}),
+        Scenario('POST /inventory/', lambda i: {'method': 'POST', 'path': '/inventory/', 'headers': mechanic_headers, 'json': {'name': f'new part {run_id} {i}', 'price': 19.99}}, status=201),
+        Scenario('POST /inventory/bulk', lambda i: {
+            'method': 'POST', 'path': '/inventory/bulk', 'headers': mechanic_headers, 'content_type': 'text/csv',
+            'data': 'name,price\n' + ''.join(f'{PARTS[row % 20]} {row % items + 1},{10 + i % 7}.50\n' for row in range(50)) + ''.join(f'bulk part {run_id} {i} {row},4.25\n' for row in range(50)),
+        }),
+        Scenario('PUT /inventory/<id>', lambda i: {'method': 'PUT', 'path': f'/inventory/{i % items + 1}', 'headers': mechanic_headers, 'json': {'name': f'{PARTS[i % items % 20]} {i % items + 1}', 'price': 10 + i % 7}}),
+
+        # Deletes
+        Scenario('DELETE /serviceticket/<id>', lambda i: {'method': 'DELETE', 'path': f'/serviceticket/{new_ticket(i)}', 'headers': mechanic_headers}),
+        Scenario('DELETE /inventory/<id>', lambda i: {'method': 'DELETE', 'path': f'/inventory/{new_item(i)}', 'headers': mechanic_headers}),
+        Scenario('DELETE /customers/', lambda i: {'method': 'DELETE', 'path': '/customers/', 'headers': new_customer(i)}),
+        Scenario('DELETE /mechanics/', lambda i: {'method': 'DELETE', 'path': '/mechanics/', 'headers': new_mechanic(i)}),
+    ]
+
+# Measuring
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def _request(client, kwargs, scenario):
+    response = client.open(**kwargs, buffered=False)
+    if response.status_code != scenario.status:
+        raise RuntimeError(f'{scenario.name}: expected {scenario.status}, got {response.status_code} {response.get_data(as_text=True)[:200]}')
+    for chunk in response.response: # Streamed responses are produced while they are read, without keeping the body
+        pass
+    response.close()
+
+def measure(client, scenario, repeat, memory_repeat, statements):
+    count = max(1, round(repeat * scenario.repeat))
+    warmup, memory_repeat = min(WARMUP, count), min(memory_repeat, count) # Slow routes are not run many more times than measured
+    latencies, statement_counts, peaks = [], [], []
+
+    for i in range(warmup + count + memory_repeat):
+        kwargs = scenario.make_request(i)
+        if i < warmup:
+            _request(client, kwargs, scenario)
+        elif i < warmup + count:
+            statements.clear()
+            started = time.perf_counter()
+            _request(client, kwargs, scenario)
+            latencies.append(time.perf_counter() - started)
+            statement_counts.append(len(statements))
+        else:
+            # Memory in separate requests, tracemalloc slows everything down
+            tracemalloc.start()
+            try:
+                _request(client, kwargs, scenario)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+    return {
+        'requests': count,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / count * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+        'statements': percentile(statement_counts, 50),
+        'statements_max': max(statement_counts),
+        'peak_memory_kib': round(percentile(peaks, 50) / 1024, 1) if peaks else None,
+    }
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(volumes, seed, repeat, memory_repeat, only=None, reseed=False):
+    app = prepare_database(volumes, seed, reseed)
+    client = app.test_client()
+    run_id = time.time_ns()
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    selected = [scenario for scenario in scenarios(client, volumes, run_id) if not only or any(name in scenario.name for name in only)]
+    adapter = app.url_map.bind('localhost')
+    covered = {adapter.match(scenario.name.split()[1].split('?')[0].replace('<id>', '1'), method=scenario.name.split()[0])[0] for scenario in selected}
+    missing = sorted(rule.endpoint for rule in app.url_map.iter_rules() if '.' in rule.endpoint and not rule.endpoint.startswith('swagger_ui.') and rule.endpoint not in covered)
+    if missing and not only:
+        print(f"Routes without a benchmark: {', '.join(missing)}")
+
+    results = {}
+    print(f"{'':>44} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'SQL':>5} {'peak KiB':>9}")
+    for scenario in selected:
+        result = measure(client, scenario, repeat, memory_repeat, statements) # No app context around it: every request gets its own session and g
+        results[scenario.name] = result
+        print(f"{scenario.name:>44} {result['p50_ms']:9.2f} {result['p90_ms']:9.2f} {result['p99_ms']:9.2f} {result['statements']:5d} {result['peak_memory_kib'] if result['peak_memory_kib'] is not None else '-':>9}")
+
+    return {
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'volumes': volumes,
+        'seed': seed,
+        'repeat': repeat,
+        'routes': results,
+    }
+
+# Changes of the median latency, statements and memory of each route against an earlier result file
+def compare(previous, current, threshold):
+    print(f"\nAgainst {previous.get('revision')} ({previous.get('started')}), volumes {'same' if previous.get('volumes') == current['volumes'] else 'DIFFERENT'}")
+    for name, result in current['routes'].items():
+        before = previous['routes'].get(name)
+        if before is None:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+        flag = ' <-- slower' if change > threshold or result['statements'] > before['statements'] else ''
+        print(f"{name:>44} p50 {before['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} ms ({change:+6.1f}%)   SQL {before['statements']:3d} -> {result['statements']:3d}{flag}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--mechanics', type=int, default=50)
+    parser.add_argument('--inventory', type=int, default=1000)
+    parser.add_argument('--tickets', type=int, default=100000)
+    parser.add_argument('--items-per-ticket', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reseed', action='store_true', help='seed again even if a seeded database with these volumes exists')
+    parser.add_argument('--repeat', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--memory-repeat', type=int, default=3, help='requests per route measured with tracemalloc')
+    parser.add_argument('--only', nargs='*', help='benchmark only the routes whose name contains one of these')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<time>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare with')
+    parser.add_argument('--threshold', type=float, default=10.0, help='p50 change (%%) flagged by --compare')
+    args = parser.parse_args()
+
+    volumes = {
+        'customers': args.customers,
+        'mechanics': args.mechanics,
+        'inventory': args.inventory,
+        'tickets': args.tickets,
+        'items_per_ticket': args.items_per_ticket,
+    }
+    results = run(volumes, args.seed, args.repeat, args.memory_repeat, args.only, args.reseed)
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nSaved {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results, args.threshold)
@@ -0,0 +1,59 @@
+# Login throughput under concurrency, with passwords checked on the request thread and in the hashing process pool.
+# Rebuilds its own database on every run (ScratchBenchmarkConfig, instance/benchmark-scratch.db) and uses the production hash method.
+#
+#   python benchmarks/bench_login.py [--threads 16] [--logins 200] [--workers 2]
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import limiter
+from app.models import db, Customer
+from app.utils.passwords import hash_password, shutdown_pool
+
+def run(workers, threads, logins):
+    app = create_app('ScratchBenchmarkConfig')
+    app.config['PASSWORD_HASH_WORKERS'] = workers
+    app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+    app.config['PASSWORD_HASH_QUEUE_PER_WORKER'] = threads
+    app.config['PASSWORD_HASH_TIMEOUT'] = 60
+    limiter.enabled = False
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        password = hash_password('benchmark')
+        db.session.add_all([Customer(name=f'Customer {i}', email=f'customer{i}@email.com', phone='1234567890', password=password) for i in range(threads)])
+        db.session.commit()
+
+    def login(i):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/customers/login', json={'email': f'customer{i % threads}@email.com', 'password': 'benchmark'})
+        assert response.status_code == 200, response.json
+        return time.perf_counter() - started
+
+    login(0) # Start the pool before timing
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    shutdown_pool()
+
+    mode = f'{workers} pool processes' if workers else 'inline'
+    print(f'{mode:>18}: {logins / elapsed:7.1f} logins/s   p50 {latencies[len(latencies) // 2] * 1000:6.1f} ms   p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.1f} ms')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    run(0, args.threads, args.logins)
+    run(args.workers, args.threads, args.logins)
@@ -0,0 +1,70 @@
+# CPU cost of serializing ticket lists and validating add_items payloads. Before: marshmallow and Flask's default
+# JSON provider, after: the compiled dump/load functions and the orjson provider. Rebuilds its own database on every run
+# (ScratchBenchmarkConfig, instance/benchmark-scratch.db).
+#
+#   python benchmarks/bench_serialization.py [--tickets 100] [--repeat 200]
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+from app import create_app
+from app.models import db, Customer, Mechanic, Inventory, ServiceTicket, InventoryServiceTicket
+from app.blueprints.service_ticket.schemas import service_tickets_schema, add_items_schema, ticket_load_options
+from app.utils.json_provider import FastJSONProvider
+from app.utils.serializers import dump, load
+
+def timed(repeat, f):
+    f()
+    started = time.perf_counter()
+    for i in range(repeat):
+        f()
+    return (time.perf_counter() - started) / repeat
+
+def report(name, old, new):
+    print(f'{name:>28}: before {old * 1000:8.3f} ms   after {new * 1000:8.3f} ms   {old / new:5.1f}x')
+
+def run(ticket_count, repeat):
+    app = create_app('ScratchBenchmarkConfig')
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        customer = Customer(name='Customer', email='customer@email.com', phone='1234567890', password='123')
+        mechanics = [Mechanic(name=f'Mechanic {i}', email=f'mechanic{i}@email.com', phone='1234567890', password='123', salary=90000) for i in range(3)]
+        items = [Inventory(name=f'part {i}', price=4.99 + i) for i in range(5)]
+        for i in range(ticket_count):
+            ticket = ServiceTicket(VIN=f'VIN{i}', service_date=date(2025, 8, 6), service_desc='Brake job', customer=customer)
+            ticket.mechanics.extend(mechanics[:2])
+            ticket.items.extend(InventoryServiceTicket(item=item, quantity=2) for item in items[:3])
+            db.session.add(ticket)
+        db.session.commit()
+
+        tickets = db.session.execute(select(ServiceTicket).options(*ticket_load_options)).scalars().all()
+        default = DefaultJSONProvider(app)
+        fast = FastJSONProvider(app)
+        default.compact = fast.compact = True # As in production (not debug)
+        assert default.response(service_tickets_schema.dump(tickets)).get_data() == fast.response(dump(service_tickets_schema, tickets)).get_data()
+
+        print(f'{ticket_count} tickets, 2 mechanics and 3 items each')
+        report('dump', timed(repeat, lambda: service_tickets_schema.dump(tickets)), timed(repeat, lambda: dump(service_tickets_schema, tickets)))
+        data = service_tickets_schema.dump(tickets)
+        report('encode', timed(repeat, lambda: default.response(data)), timed(repeat, lambda: fast.response(data)))
+        report('dump + encode', timed(repeat, lambda: default.response(service_tickets_schema.dump(tickets))), timed(repeat, lambda: fast.response(dump(service_tickets_schema, tickets))))
+
+        payload = {'ticket_id': 1, 'item_quant': [{'item_id': i, 'quantity': 1} for i in range(1, 51)]}
+        report('add_items load (50 items)', timed(repeat, lambda: add_items_schema.load(payload)), timed(repeat, lambda: load(add_items_schema, payload)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickets', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    run(args.tickets, args.repeat)
@@ -0,0 +1,64 @@
+from app import create_app
+from app.models import db, Mechanic, Inventory
+from app.utils import util
+from app.utils.util import encode_token
+from app.utils.query_stats import captured_statements
+from unittest.mock import patch
+import time
+import unittest
+
+class TestAuth(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        self.mechanic = Mechanic(name="Jim", email="jim@email.com", phone="1234567890", password='123', salary=90000)
+        self.inventory = Inventory(name='wheels', price=10.99)
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(self.mechanic)
+            db.session.add(self.inventory)
+            db.session.commit()
+        util._verified_tokens.clear()
+        self.mechanic_token = encode_token(1, 'mechanic')
+        self.client = self.app.test_client()
+        
+    # Token signature is only verified the first time the token is seen
+    def test_verified_token_cached(self):
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        with patch('app.utils.util.jwt.decode', wraps=util.jwt.decode) as decode:
+            for i in range(3):
+                response = self.client.put('/inventory/1', json={'name': 'wheels', 'price': 11.99 + i}, headers=headers)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(decode.call_count, 1)
+        
+    def test_expired_cached_token(self):
+        util._verified_tokens[self.mechanic_token] = {'sub': '1', 'type': 'mechanic', 'exp': time.time() - 1}
+        with patch('app.utils.util.jwt.decode', side_effect=util.jose.exceptions.ExpiredSignatureError):
+            response = self.client.delete('/inventory/1', headers={'Authorization': 'Bearer ' + self.mechanic_token})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json['error'], 'token has expired')
+        
+    def test_token_cache_bounded(self):
+        with patch('app.utils.util.TOKEN_CACHE_SIZE', 2):
+            tokens = [encode_token(i, 'customer') for i in range(3)]
+            for token in tokens:
+                util.decode_token(token)
+        self.assertEqual(list(util._verified_tokens), tokens[1:])
+        
+    def test_wrong_type_cached_token(self):
+        customer_token = encode_token(1, 'customer')
+        util.decode_token(customer_token)
+        response = self.client.delete('/inventory/1', headers={'Authorization': 'Bearer ' + customer_token})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json['error'], 'Invalid token')
+        
+    # Logged in mechanic is loaded once per request
+    def test_principal_loaded_once(self):
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/1/assign-mechanic', headers=headers) # Ticket doesn't exist, just warms the token cache
+        with captured_statements(self.app) as statements:
+            response = self.client.delete('/inventory/1', headers=headers)
+        
+        self.assertEqual(response.status_code, 200)
+        mechanic_selects = [statement for statement in statements if statement.startswith('SELECT') and 'FROM mechanics' in statement]
+        self.assertEqual(len(mechanic_selects), 1)
@@ -0,0 +1,78 @@
+from app import create_app
+from app.models import db, Customer, ServiceTicket
+from app.utils.compression import compress
+from datetime import date
+from unittest.mock import patch
+import gzip
+import json
+import unittest
+import zlib
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("TestingConfig")
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            customers = [Customer(name=f"Customer {i}", email=f"customer{i}@email.com", phone="1234567890", password="123") for i in range(20)]
+            db.session.add_all(customers)
+            db.session.add_all(ServiceTicket(VIN=f"VIN{i}", service_date=date(2025, 8, 6), service_desc="Car work", customer=customers[i % 20]) for i in range(30))
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def test_gzip_response(self):
+        plain = self.client.get('/customers/')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(plain.headers['Vary'], 'Accept-Encoding')
+
+        response = self.client.get('/customers/', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(json.loads(gzip.decompress(response.data)), plain.json)
+
+    def test_encoding_refused(self):
+        for accept in ('identity', 'gzip;q=0', 'deflate'):
+            response = self.client.get('/customers/', headers={'Accept-Encoding': accept})
+            self.assertNotIn('Content-Encoding', response.headers, accept)
+            self.assertEqual(len(response.json), 20)
+
+    # Small bodies and error responses are sent as they are
+    def test_small_response_not_compressed(self):
+        response = self.client.get('/customers/?per_page=1', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(len(response.json), 1)
+
+        response = self.client.get('/serviceticket/export?format=xml', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    # Cached views store the compressed body: later requests are served without compressing again
+    def test_cached_response_compressed_once(self):
+        with patch('app.utils.compression.compress', wraps=compress) as compress_calls:
+            first = self.client.get('/customers/', headers={'Accept-Encoding': 'gzip'})
+            second = self.client.get('/customers/', headers={'Accept-Encoding': 'gzip'})
+            plain = self.client.get('/customers/')
+        self.assertEqual(compress_calls.call_count, 1)
+        self.assertEqual(second.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(second.data, first.data)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(json.loads(gzip.decompress(second.data)), plain.json)
+
+    # Streamed exports are compressed chunk by chunk, each batch can be decompressed as soon as it arrives
+    def test_streamed_export_compressed(self):
+        plain = self.client.get('/serviceticket/export').get_data()
+        with patch('app.blueprints.service_ticket.routes.EXPORT_BATCH_SIZE', 10):
+            response = self.client.get('/serviceticket/export', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertNotIn('Content-Length', response.headers)
+
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunks = [decompressor.decompress(chunk) for chunk in response.response]
+            response.close()
+        self.assertEqual([len(chunk.splitlines()) for chunk in chunks if chunk], [10, 10, 10])
+        self.assertEqual(b''.join(chunks), plain)
+        self.assertEqual(gzip.decompress(self.client.get('/serviceticket/export', headers={'Accept-Encoding': 'gzip'}).data), plain)
@@ -1,7 +1,12 @@
 from app import create_app
-from app.models import db, Customer, ServiceTicket
+from app.models import db, Customer, ServiceTicket, Mechanic, Inventory, InventoryServiceTicket
 from app.utils.util import encode_token
+from app.utils.passwords import is_password_hash, shutdown_pool
+from app.utils.query_stats import captured_statements
+from app.utils.pagination import encode_cursor
 from datetime import datetime
+from sqlalchemy import event, insert
+import json
 import unittest
 
 class TestCustomer(unittest.TestCase):
@@ -115,6 +120,133 @@ class TestCustomer(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json[0]["email"], "wasabi@email.com")
 
+
+    # Only the selected columns are read and returned
+    def test_get_customers_fields(self):
+        with captured_statements(self.app) as statements:
+            response = self.client.get('/customers/?fields=email, name')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{'email': 'wasabi@email.com', 'name': 'Wasabi'}])
+        select_customers = [statement for statement in statements if 'FROM customers' in statement]
+        self.assertEqual(len(select_customers), 1)
+        self.assertNotIn('customers.phone', select_customers[0])
+        self.assertNotIn('customers.password', select_customers[0])
+        
+        response = self.client.get('/customers/search?q=wasabi&fields=id')
+        self.assertEqual(response.json, [{'id': 1}])
+        
+    def test_invalid_fields_get_customers(self):
+        response = self.client.get('/customers/?fields=name,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['fields'], ['Unknown fields: password. Choose from: id, name, email, phone.'])
+        
+        response = self.client.get('/customers/?fields=,')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_get_customers_cache_invalidated(self):
+        self.client.get('/customers/')
+        with captured_statements(self.app) as statements:
+            response = self.client.get('/customers/')
+        self.assertEqual(len(response.json), 1)
+        self.assertEqual(statements, []) # Served from the cache
+        
+        customer_payload = {
+            "name": "Sashimi",
+            "email": "sashimi@email.com",
+            "phone": "1234567890",
+            "password": "123"
+        }
+        self.client.post('/customers/', json=customer_payload)
+        response = self.client.get('/customers/')
+        self.assertEqual(len(response.json), 2)
+        
+        headers = {"Authorization": "Bearer " + self.token}
+        self.client.put('/customers/', json={"name": "Wasabi new", "email": "", "phone": "", "password": ""}, headers=headers)
+        response = self.client.get('/customers/')
+        self.assertEqual(response.json[0]['name'], 'Wasabi new')
+        
+    def test_get_customers_cache_key(self):
+        with self.app.app_context():
+            for i in range(4):
+                db.session.add(Customer(name=f"Customer {i}", email=f"customer{i}@email.com", phone="1234567890", password="123"))
+            db.session.commit()
+        
+        # Each page gets its own entry
+        self.assertEqual([customer['id'] for customer in self.client.get('/customers/?per_page=2').json], [1, 2])
+        self.assertEqual([customer['id'] for customer in self.client.get('/customers/?per_page=3').json], [1, 2, 3])
+        self.assertEqual(len(self.client.get('/customers/').json), 5)
+        
+        # Equivalent query strings and unknown arguments are served from the same entries
+        with captured_statements(self.app) as statements:
+            self.assertEqual(len(self.client.get('/customers/?per_page=02&utm=abc').json), 2)
+            self.assertEqual(len(self.client.get('/customers/?per_page=50').json), 5)
+        self.assertEqual(statements, [])
+        
+    # A cache hit links to the next page with its own query arguments, not those of the request that filled the entry
+    def test_get_customers_cached_next_link(self):
+        with self.app.app_context():
+            db.session.add(Customer(name="Customer 1", email="customer1@email.com", phone="1234567890", password="123"))
+            db.session.commit()
+        
+        first = self.client.get('/customers/?per_page=1&utm=abc')
+        second = self.client.get('/customers/?per_page=01')
+        self.assertEqual(second.headers['X-Next-Cursor'], first.headers['X-Next-Cursor'])
+        self.assertIn('utm=abc', first.headers['Link'])
+        self.assertEqual(second.headers['Link'], f'<http://localhost/customers/?per_page=01&cursor={second.headers["X-Next-Cursor"]}>; rel="next"')
+        
+    def test_get_customers_cache_variant_limit(self):
+        self.app.config['CACHE_MAX_VARIANTS'] = 2
+        self.client.get('/customers/?per_page=1')
+        self.client.get('/customers/?per_page=2')
+        
+        # A third variant is served but not stored
+        with captured_statements(self.app) as statements:
+            self.assertEqual(self.client.get('/customers/?per_page=3').status_code, 200)
+            self.assertEqual(self.client.get('/customers/?per_page=3').status_code, 200)
+            self.client.get('/customers/?per_page=1')
+        self.assertEqual(len(statements), 2)
+        
+    def test_paginate_customers(self):
+        with self.app.app_context():
+            for i in range(4):
+                db.session.add(Customer(name=f"Customer {i}", email=f"customer{i}@email.com", phone="1234567890", password="123"))
+            db.session.commit()
+        
+        response = self.client.get('/customers/?per_page=2&count=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([customer['id'] for customer in response.json], [1, 2])
+        self.assertEqual(response.headers['X-Total-Count'], '5')
+        
+        cursor = response.headers['X-Next-Cursor']
+        response = self.client.get(f'/customers/?per_page=2&cursor={cursor}')
+        self.assertEqual([customer['id'] for customer in response.json], [3, 4])
+        self.assertNotIn('X-Total-Count', response.headers)
+        
+        cursor = response.headers['X-Next-Cursor']
+        response = self.client.get(f'/customers/?per_page=2&cursor={cursor}')
+        self.assertEqual([customer['id'] for customer in response.json], [5])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+        
+    def test_invalid_pagination_get_customers(self):
+        response = self.client.get('/customers/?per_page=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['per_page'], ['Not a valid integer.'])
+        
+        response = self.client.get('/customers/?per_page=1000')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['per_page'], ['Must be greater than or equal to 1 and less than or equal to 100.'])
+        
+        response = self.client.get('/customers/?cursor=invalid')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['cursor'], ['Invalid cursor.'])
+        
+    # Crafted cursors with ids the database can't take are rejected, not sent to the query
+    def test_crafted_cursor_get_customers(self):
+        for values in ({'id': True}, {'id': 2**70}, {'id': -1}, {'id': 1.5}, {'id': '1'}, [1]):
+            response = self.client.get('/customers/?cursor=' + encode_cursor(values))
+            self.assertEqual(response.status_code, 400, values)
+            self.assertEqual(response.json['cursor'], ['Invalid cursor.'])
         
     def test_get_customer_by_id(self):
         response = self.client.get('/customers/1')
@@ -139,7 +271,33 @@ class TestCustomer(unittest.TestCase):
         response = self.client.put('/customers/', json=update_payload, headers=headers)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['name'], "Wasabi")
-        self.assertEqual(response.json['password'], "1234")
+        self.assertNotIn('password', response.json)
+        
+        response = self.client.post('/customers/login', json={"email": "wasabi@email.com", "password": "1234"})
+        self.assertEqual(response.status_code, 200)
+        
+    def test_create_customer_hashes_password(self):
+        response = self.client.post('/customers/', json={"name": "Nori", "email": "nori@email.com", "phone": "1234567890", "password": "secret"})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('password', response.json)
+        
+        with self.app.app_context():
+            customer = db.session.get(Customer, response.json['id'])
+            self.assertNotEqual(customer.password, "secret")
+            self.assertTrue(is_password_hash(customer.password))
+        
+    def test_login_upgrades_plain_text_password(self):
+        # Customer from setUp was stored with a plain text password
+        response = self.client.post('/customers/login', json={"email": "wasabi@email.com", "password": "123"})
+        self.assertEqual(response.status_code, 200)
+        
+        with self.app.app_context():
+            self.assertTrue(is_password_hash(db.session.get(Customer, 1).password))
+        
+        response = self.client.post('/customers/login', json={"email": "wasabi@email.com", "password": "123"})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/customers/login', json={"email": "wasabi@email.com", "password": "wrong"})
+        self.assertEqual(response.status_code, 401)
         
     def test_invalid_payload_update_customer(self):
         update_payload = {
@@ -247,9 +405,159 @@ class TestCustomer(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json[0]["VIN"], "123")
         
+    def test_get_service_tickets_cached_per_customer(self):
+        with self.app.app_context():
+            db.session.add(Customer(name="Sashimi", email="sashimi@email.com", phone="1234567890", password="123"))
+            db.session.add(ServiceTicket(VIN="456", service_date=datetime.strptime("2025-08-07","%Y-%m-%d").date(), service_desc="Oil change", customer_id = 2))
+            db.session.commit()
+        
+        headers = {"Authorization": "Bearer " + self.token}
+        other_headers = {"Authorization": "Bearer " + encode_token(2, "customer")}
+        self.assertEqual(self.client.get('/customers/my-tickets', headers=headers).json[0]["VIN"], "123")
+        self.assertEqual(self.client.get('/customers/my-tickets', headers=other_headers).json[0]["VIN"], "456")
+        self.assertEqual(self.client.get('/customers/my-tickets', headers=headers).json[0]["VIN"], "123")
+        
+    def test_get_service_tickets_query_count(self):
+        with self.app.app_context():
+            mechanic = Mechanic(name="Jim", email="jim@email.com", phone="1234567890", password='123', salary=90000)
+            item = Inventory(name='wheels', price=29.99)
+            for i in range(30):
+                ticket = ServiceTicket(VIN=f"VIN{i}", service_date=datetime.strptime("2025-08-06","%Y-%m-%d").date(), service_desc="Car work", customer_id=1)
+                ticket.mechanics.append(mechanic)
+                ticket.items.append(InventoryServiceTicket(item=item, quantity=1))
+                db.session.add(ticket)
+            db.session.commit()
+        
+        headers = {"Authorization": "Bearer " + self.token}
+        with captured_statements(self.app) as statements:
+            response = self.client.get('/customers/my-tickets', headers=headers)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), 31)
+        self.assertEqual(response.json[-1]['items'][0]['item']['name'], 'wheels')
+        self.assertLessEqual(len(statements), 6)
+        
+    # Nested objects that are not asked for are not loaded
+    def test_get_service_tickets_fields(self):
+        headers = {"Authorization": "Bearer " + self.token}
+        with captured_statements(self.app) as statements:
+            response = self.client.get('/customers/my-tickets?fields=VIN,service_date', headers=headers)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{'VIN': '123', 'service_date': '2025-08-06'}])
+        self.assertFalse(any('mechanics' in statement or 'inventory' in statement or 'service_desc' in statement for statement in statements))
+        
     def test_invalid_customer_get_tickets(self):        
         headers = {"Authorization": "Bearer " + self.token}
         self.client.delete('/customers/', headers=headers)
         response = self.client.get('/customers/my-tickets', headers=headers)
         self.assertEqual(response.status_code, 404)
         self.assertEqual(response.json['error'], "customer not found")
+        
+    def add_mechanic(self):
+        with self.app.app_context():
+            db.session.add(Mechanic(name="Jim", email="jim@email.com", phone="1234567890", password='123', salary=90000))
+            db.session.commit()
+        return {'Authorization': 'Bearer ' + encode_token(1, 'mechanic')}
+        
+    def test_bulk_create_customers_ndjson(self):
+        headers = self.add_mechanic()
+        upload = '\n'.join([
+            json.dumps({"name": "Nori", "email": "Nori@email.com", "phone": "1234567890", "password": "abc"}),
+            json.dumps({"name": "Ebi", "email": "ebi@email.com", "phone": "1234567890"}),
+            json.dumps({"name": "Nori again", "email": "nori@email.com", "phone": "1234567890"}),
+            json.dumps({"name": "Wasabi", "email": "WASABI@email.com", "phone": "1234567890"}),
+            '{not json',
+            json.dumps({"email": "tamago@email.com", "phone": "1234567890"}),
+            '',
+            json.dumps({"name": "Tamago", "email": "tamago@email.com", "phone": "1234567890"}),
+        ])
+        
+        response = self.client.post('/customers/bulk', data=upload, headers=headers, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 3)
+        self.assertEqual(response.json['error_count'], 4)
+        self.assertEqual(response.json['errors'], [
+            {'row': 3, 'error': 'Duplicate email in upload'},
+            {'row': 4, 'error': 'Customer exists already'},
+            {'row': 5, 'error': 'Invalid JSON'},
+            {'row': 6, 'error': {'name': ['Missing data for required field.']}},
+        ])
+        
+        # Imported password works, customers imported without one cannot log in
+        response = self.client.post('/customers/login', json={"email": "nori@email.com", "password": "abc"})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/customers/login', json={"email": "ebi@email.com", "password": "!"})
+        self.assertEqual(response.status_code, 401)
+        
+        response = self.client.get('/customers/?count=true')
+        self.assertEqual(response.headers['X-Total-Count'], '4')
+        
+    def test_bulk_create_customers_csv(self):
+        headers = self.add_mechanic()
+        upload = "name,email,phone,password\nNori,nori@email.com,1234567890,\nEbi,ebi@email.com,1234567890,abc,extra\nTamago,tamago@email.com,1234567890,xyz\n"
+        
+        response = self.client.post('/customers/bulk', data=upload, headers=headers, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 2)
+        self.assertEqual(response.json['errors'], [{'row': 2, 'error': 'Row has more values than the header'}])
+        
+        response = self.client.post('/customers/login', json={"email": "tamago@email.com", "password": "xyz"})
+        self.assertEqual(response.status_code, 200)
+        
+    # An email registered by another request between the check and the insert is reported for its row, the rest of the chunk is imported
+    def test_bulk_create_customers_concurrent_email(self):
+        headers = self.add_mechanic()
+        upload = '\n'.join(json.dumps({"name": name, "email": f"{name.lower()}@email.com", "phone": "1234567890"}) for name in ('Nori', 'Ebi', 'Tamago'))
+        
+        def register_ebi(conn, cursor, statement, parameters, context, executemany):
+            if executemany and statement.startswith('INSERT INTO customers'):
+                with db.engine.begin() as other:
+                    other.execute(insert(Customer).values(name='Ebi', email='ebi@email.com', phone='1234567890', password='123'))
+        
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', register_ebi)
+            try:
+                response = self.client.post('/customers/bulk', data=upload, headers=headers, content_type='application/x-ndjson')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', register_ebi)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 2)
+        self.assertEqual(response.json['errors'], [{'row': 2, 'error': 'Customer exists already'}])
+        response = self.client.get('/customers/?count=true')
+        self.assertEqual(response.headers['X-Total-Count'], '4')
+        self.assertEqual(len(self.client.get('/customers/search?q=tamago').json), 1)
+        
+    # Password hashing that does not keep up gives a 503 with the rows imported so far, instead of hanging the request
+    def test_bulk_create_customers_hash_timeout(self):
+        headers = self.add_mechanic()
+        self.app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_TIMEOUT=0.001)
+        upload = json.dumps({"name": "Nori", "email": "nori@email.com", "phone": "1234567890", "password": "abc"})
+        try:
+            response = self.client.post('/customers/bulk', data=upload, headers=headers, content_type='application/x-ndjson')
+        finally:
+            shutdown_pool()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json['inserted'], 0)
+        
+    def test_bulk_create_customers_requires_mechanic(self):
+        response = self.client.post('/customers/bulk', data='', headers={"Authorization": "Bearer " + self.token})
+        self.assertEqual(response.status_code, 401)
+        
+        headers = self.add_mechanic()
+        response = self.client.post('/customers/bulk?format=xml', data='', headers=headers)
+        self.assertEqual(response.status_code, 400)
+        
+    # Each chunk costs one query for existing emails and one executemany insert, however many rows it has
+    def test_bulk_create_customers_query_count(self):
+        headers = self.add_mechanic()
+        upload = '\n'.join(json.dumps({"name": f"Customer {i}", "email": f"customer{i}@email.com", "phone": "1234567890"}) for i in range(2500))
+        
+        with captured_statements(self.app) as statements:
+            response = self.client.post('/customers/bulk', data=upload, headers=headers, content_type='application/x-ndjson')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 2500)
+        self.assertEqual(len([statement for statement in statements if statement.startswith('SELECT customers.email')]), 3)
+        self.assertEqual(len([statement for statement in statements if statement.startswith('INSERT INTO customers')]), 3)
@@ -1,7 +1,10 @@
 from app import create_app
 from app.models import db, Inventory, Mechanic, Customer
 import unittest
+import json
+from sqlalchemy import event
 from app.utils.util import encode_token
+from app.utils.query_stats import captured_statements
 
 class TestInventory(unittest.TestCase):
     def setUp(self):
@@ -98,11 +101,47 @@ class TestInventory(unittest.TestCase):
         self.assertEqual(response.json['message'], 'Item already exists')
         
     #  Test get items
+    def test_duplicate_item_other_price_create_inventory(self):
+        create_payload = {
+            'name': ' Wheels ',
+            'price': 12.50
+        }
+        
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        response = self.client.post('/inventory/', json=create_payload, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['message'], 'Item already exists')
+        
     def test_get_items(self):
         response = self.client.get('/inventory/')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json[0]['name'], 'wheels')
         
+    def test_get_items_fields(self):
+        response = self.client.get('/inventory/?fields=price')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{'price': 10.99}])
+        
+        response = self.client.get('/inventory/search?q=wheel&fields=name,id')
+        self.assertEqual(response.json, [{'id': 1, 'name': 'wheels'}])
+        
+        response = self.client.get('/inventory/?fields=cost')
+        self.assertEqual(response.status_code, 400)
+        
+    def test_paginate_items(self):
+        with self.app.app_context():
+            db.session.add(Inventory(name='screws', price=1.99))
+            db.session.commit()
+        
+        response = self.client.get('/inventory/?per_page=1&count=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json[0]['name'], 'wheels')
+        self.assertEqual(response.headers['X-Total-Count'], '2')
+        
+        response = self.client.get('/inventory/?per_page=1&cursor=' + response.headers['X-Next-Cursor'])
+        self.assertEqual(response.json[0]['name'], 'screws')
+        self.assertNotIn('X-Next-Cursor', response.headers)
+        
     def test_get_single_item(self):
         response = self.client.get('/inventory/1')
         self.assertEqual(response.status_code, 200)
@@ -125,6 +164,21 @@ class TestInventory(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['price'], 20.00)
 
+    # Renaming an item to the (normalized) name of another item is refused
+    def test_duplicate_name_update_item(self):
+        with self.app.app_context():
+            db.session.add(Inventory(name='brake pads', price=40.00))
+            db.session.commit()
+        
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        response = self.client.put('/inventory/2', json={'name': 'Wheels ', 'price': 40.00}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['message'], 'Item already exists')
+        
+        response = self.client.put('/inventory/1', json={'name': 'WHEELS', 'price': 11.99}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['price'], 11.99)
+        
     def test_invalid_id_update_item(self):
         update_payload = {
             "name": "",
@@ -163,4 +217,64 @@ class TestInventory(unittest.TestCase):
         headers = {'Authorization': 'Bearer ' + self.customer_token}
         response = self.client.delete('/inventory/4', headers=headers)
         self.assertEqual(response.status_code, 401)
-        self.assertEqual(response.json['error'], 'Invalid token')
\ No newline at end of file
+        self.assertEqual(response.json['error'], 'Invalid token')
+        
+    def test_bulk_upsert_items_csv(self):
+        with self.app.app_context():
+            db.session.add(Inventory(name='brake pads', price=40.00))
+            db.session.commit()
+        
+        upload = "name,price\nWheels,12.50\nBrake  Pads,40.00\nScrews,0.25\nscrews,0.30\nBolts,cheap\n"
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        response = self.client.post('/inventory/bulk', data=upload, headers=headers, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 1)
+        self.assertEqual(response.json['updated'], 1)
+        self.assertEqual(response.json['unchanged'], 1)
+        self.assertEqual(response.json['errors'], [
+            {'row': 4, 'error': 'Duplicate name in upload'},
+            {'row': 5, 'error': {'price': ['Not a valid number.']}},
+        ])
+        
+        response = self.client.get('/inventory/')
+        self.assertEqual({item['name']: item['price'] for item in response.json}, {'wheels': 12.50, 'brake pads': 40.00, 'screws': 0.25})
+        
+    def test_bulk_upsert_items_requires_mechanic(self):
+        headers = {'Authorization': 'Bearer ' + self.customer_token}
+        response = self.client.post('/inventory/bulk', data='{"name": "bolts", "price": 1}', headers=headers)
+        self.assertEqual(response.status_code, 401)
+        
+    # One select and one executemany upsert per chunk
+    def test_bulk_upsert_items_query_count(self):
+        with self.app.app_context():
+            db.session.add_all(Inventory(name=f'part {i}', price=1.00) for i in range(1000))
+            db.session.commit()
+        
+        upload = '\n'.join(json.dumps({'name': f'Part {i}', 'price': 2.00 if i % 2 else 1.00}) for i in range(2000))
+        with captured_statements(self.app) as statements:
+            headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+            response = self.client.post('/inventory/bulk', data=upload, headers=headers, content_type='application/x-ndjson')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json['inserted'], response.json['updated'], response.json['unchanged']), (1000, 500, 500))
+        self.assertEqual(len([statement for statement in statements if statement.startswith('SELECT inventory.name')]), 2)
+        self.assertEqual(len([statement for statement in statements if statement.startswith('UPDATE inventory')]), 0)
+        self.assertEqual(len([statement for statement in statements if statement.startswith('INSERT INTO inventory') and 'ON CONFLICT (name)' in statement]), 2)
+        
+    # An item inserted by another upload in the meantime gets this upload's price instead of a second row
+    def test_bulk_upsert_items_concurrent_insert(self):
+        def insert_other_item(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO inventory '):
+                cursor.execute("INSERT INTO inventory (name, price) VALUES ('bolts', 2.00)")
+        
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', insert_other_item)
+            try:
+                response = self.client.post('/inventory/bulk', data='{"name": "Bolts", "price": 1.50}', headers=headers, content_type='application/x-ndjson')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', insert_other_item)
+        self.assertEqual(response.status_code, 200)
+        
+        response = self.client.get('/inventory/')
+        self.assertEqual([(item['name'], item['price']) for item in response.json], [('wheels', 10.99), ('bolts', 1.50)])
@@ -1,7 +1,11 @@
 from app import create_app
 from app.utils.util import encode_token
+from app.utils.pagination import encode_cursor
+from app.utils.passwords import is_password_hash, shutdown_pool
 from app.models import Mechanic, db, ServiceTicket
 from datetime import datetime
+from unittest.mock import patch
+from werkzeug.security import generate_password_hash, check_password_hash
 import unittest
 
 class TestMechanic(unittest.TestCase):
@@ -77,6 +81,56 @@ class TestMechanic(unittest.TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.json['email'], 'larry@email.com')
         self.assertEqual(response.json['salary'], 90000)
+        self.assertNotIn('password', response.json)
+        
+    # Hashing and checking in the process pool instead of inline
+    def test_password_pool(self):
+        self.app.config['PASSWORD_HASH_WORKERS'] = 1
+        try:
+            create_payload = {'name': "Larry", 'email': "larry@email.com", 'phone': "1234567890", 'password': "abc", 'salary': 90000}
+            response = self.client.post('/mechanics/', json=create_payload)
+            self.assertEqual(response.status_code, 201)
+            
+            response = self.client.post('/mechanics/login', json={'email': 'larry@email.com', 'password': 'abc'})
+            self.assertEqual(response.status_code, 200)
+            response = self.client.post('/mechanics/login', json={'email': 'larry@email.com', 'password': 'abd'})
+            self.assertEqual(response.status_code, 401)
+        finally:
+            shutdown_pool()
+        
+        with self.app.app_context():
+            mechanic = db.session.execute(db.select(Mechanic).where(Mechanic.email == 'larry@email.com')).scalar_one()
+            self.assertTrue(is_password_hash(mechanic.password))
+        
+    # A pool that does not answer in time gives a 503, not an unhandled timeout
+    def test_password_pool_timeout(self):
+        self.app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_TIMEOUT=0.001)
+        try:
+            create_payload = {'name': "Larry", 'email': "larry@email.com", 'phone': "1234567890", 'password': "abc", 'salary': 90000}
+            response = self.client.post('/mechanics/', json=create_payload)
+            self.assertEqual(response.status_code, 503)
+        finally:
+            shutdown_pool()
+        
+    # Only complete werkzeug hashes count as hashes, a plain password that looks like one is still compared as plain text
+    def test_password_hash_format(self):
+        self.assertTrue(is_password_hash(generate_password_hash('abc', 'scrypt')))
+        self.assertTrue(is_password_hash(generate_password_hash('abc', 'pbkdf2:sha256:1000')))
+        for plain in ('pbkdf2:secret', 'scrypt:', 'scrypt:32768:8:1$salt', 'pbkdf2:sha256:1000$salt$not-hex'):
+            self.assertFalse(is_password_hash(plain), plain)
+        
+        with self.app.app_context():
+            db.session.add(Mechanic(name="Larry", email="larry@email.com", phone="1234567890", password='pbkdf2:secret', salary=90000))
+            db.session.commit()
+        response = self.client.post('/mechanics/login', json={'email': 'larry@email.com', 'password': 'pbkdf2:secret'})
+        self.assertEqual(response.status_code, 200)
+        
+    # Unknown emails still check a hash, so they take as long to reject as a wrong password
+    def test_login_unknown_email_checks_hash(self):
+        with patch('app.utils.passwords.check_password_hash', wraps=check_password_hash) as check:
+            response = self.client.post('/mechanics/login', json={'email': 'nobody@email.com', 'password': '123'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(check.call_count, 1)
         
     def test_invalid_payload_create_mechanic(self):
         create_payload = {
@@ -122,6 +176,15 @@ class TestMechanic(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json[0]['email'], 'jim@email.com')
     
+    def test_get_mechanics_fields(self):
+        response = self.client.get('/mechanics/?fields=name&per_page=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{'name': 'Jim'}])
+        self.assertIn('X-Next-Cursor', response.headers)
+        
+        response = self.client.get('/mechanics/?fields=name,salary')
+        self.assertEqual(response.status_code, 400)
+        
     # Test update mechanic
     def test_update_mechanic(self):
         update_payload = {
@@ -240,4 +303,60 @@ class TestMechanic(unittest.TestCase):
         self.assertEqual(initial.json[0]['name'], 'Jim')
         self.assertEqual(response.json[0]['name'], 'Dan')
         self.assertEqual(response.json[1]['name'], 'Jim')
-        self.assertEqual(response.json[2]['name'], 'Amy')
\ No newline at end of file
+        self.assertEqual(response.json[2]['name'], 'Amy')
+        
+    def test_paginate_ranked_mechanic(self):
+        create_payload = {
+            'name': "Amy", 
+            'email': "amy@email.com", 
+            'phone': "1234567890", 
+            'password': "123", 
+            'salary': 90000
+        }
+        
+        self.client.post('/mechanics/', json=create_payload)
+        
+        response = self.client.get('/mechanics/ranked?per_page=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([mechanic['name'] for mechanic in response.json], ['Dan', 'Jim'])
+        
+        response = self.client.get('/mechanics/ranked?per_page=2&cursor=' + response.headers['X-Next-Cursor'])
+        self.assertEqual([mechanic['name'] for mechanic in response.json], ['Amy'])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+        
+    def test_ranked_mechanic_crafted_cursor(self):
+        for values in ({'id': 1, 'ticket_count': 2**70}, {'id': 1, 'ticket_count': True}, {'id': 1}, {'id': 2**63, 'ticket_count': 0}):
+            response = self.client.get('/mechanics/ranked?cursor=' + encode_cursor(values))
+            self.assertEqual(response.status_code, 400, values)
+            self.assertEqual(response.json['cursor'], ['Invalid cursor.'])
+        
+    def test_paginate_get_mechanics(self):
+        response = self.client.get('/mechanics/?per_page=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json[0]['name'], 'Jim')
+        self.assertIn('rel="next"', response.headers['Link'])
+        
+        response = self.client.get('/mechanics/?per_page=1&cursor=' + response.headers['X-Next-Cursor'])
+        self.assertEqual(response.json[0]['name'], 'Dan')
+        self.assertNotIn('X-Next-Cursor', response.headers)
+        
+    def test_ranked_mechanic_ticket_count(self):
+        response = self.client.get('/mechanics/ranked')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json[0], {'id': 2, 'name': 'Dan', 'email': 'dan@email.com', 'phone': '1234567892', 'ticket_count': 1})
+        self.assertEqual(response.json[1]['ticket_count'], 0)
+        
+    def test_ranked_mechanic_date_window(self):
+        response = self.client.get('/mechanics/ranked?start_date=2025-08-01&end_date=2025-08-31')
+        self.assertEqual(response.json[0]['name'], 'Dan')
+        self.assertEqual(response.json[0]['ticket_count'], 1)
+        
+        # Ticket is outside the window so neither mechanic has any tickets and they are ranked by id
+        response = self.client.get('/mechanics/ranked?start_date=2025-09-01')
+        self.assertEqual([mechanic['name'] for mechanic in response.json], ['Jim', 'Dan'])
+        self.assertEqual(response.json[1]['ticket_count'], 0)
+        
+    def test_invalid_date_window_ranked_mechanic(self):
+        response = self.client.get('/mechanics/ranked?start_date=2025-09-01&end_date=2025-08-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['start_date'], ['start_date must be before end_date.'])
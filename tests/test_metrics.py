@@ -0,0 +1,75 @@
+from app import create_app
+from app.models import db, Mechanic
+from app.utils.util import encode_token
+from app.utils.db_pool import MeteredQueuePool
+from sqlalchemy import exc, text
+import config
+import sqlite3
+import unittest
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("TestingConfig")
+        self.mechanic = Mechanic(name="Jim", email="jim@email.com", phone="1234567890", password='123', salary=90000)
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(self.mechanic)
+            db.session.commit()
+        self.token = encode_token(1, 'mechanic')
+        self.client = self.app.test_client()
+
+    def test_db_pool_metrics(self):
+        self.client.get('/mechanics/')
+        self.client.get('/inventory/')
+
+        headers = {'Authorization': 'Bearer ' + self.token}
+        response = self.client.get('/metrics/db-pool', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['pool_size'], 5)
+        self.assertEqual(response.json['max_overflow'], 5)
+        self.assertGreaterEqual(response.json['checkouts'], 3)
+        self.assertEqual(response.json['timeouts'], 0)
+        self.assertIn('wait_ms_max', response.json)
+
+    # The pool class is chosen by the app, the config only sizes the pool
+    def test_metered_pool_from_config_sizes(self):
+        self.assertNotIn('poolclass', config.TestingConfig.SQLALCHEMY_ENGINE_OPTIONS)
+        with self.app.app_context():
+            self.assertIsInstance(db.engine.pool, MeteredQueuePool)
+            self.assertEqual(db.engine.pool.size(), 5)
+
+    def test_db_pool_metrics_requires_mechanic(self):
+        response = self.client.get('/metrics/db-pool')
+        self.assertEqual(response.status_code, 401)
+
+        headers = {'Authorization': 'Bearer ' + encode_token(1, 'customer')}
+        response = self.client.get('/metrics/db-pool', headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+    def test_sqlite_pragmas(self):
+        with self.app.app_context():
+            self.assertEqual(db.session.execute(text('PRAGMA journal_mode')).scalar(), 'memory')
+            self.assertEqual(db.session.execute(text('PRAGMA synchronous')).scalar(), 0)
+            self.assertEqual(db.session.execute(text('PRAGMA busy_timeout')).scalar(), 5000)
+
+    def test_overflow_and_timeouts(self):
+        pool = MeteredQueuePool(lambda: sqlite3.connect(':memory:'), pool_size=1, max_overflow=1, timeout=0.05)
+        first = pool.connect()
+        second = pool.connect()
+        self.assertEqual(pool.stats()['overflow'], 1)
+
+        with self.assertRaises(exc.TimeoutError):
+            pool.connect()
+
+        stats = pool.stats()
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['checked_out'], 2)
+        self.assertEqual(stats['overflow_max'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+
+        first.close()
+        second.close()
+        self.assertEqual(pool.stats()['checked_out'], 0)
+        pool.dispose()
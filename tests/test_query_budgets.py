@@ -0,0 +1,100 @@
+from app import create_app
+from app.models import db, Customer, Mechanic, Inventory, ServiceTicket, InventoryServiceTicket
+from app.utils.rollups import rebuild_rollups
+from app.utils.query_stats import QueryBudgetMixin, LazyLoadError, captured_statements
+from app.utils.util import encode_token
+from datetime import date
+from sqlalchemy import select
+import re
+import unittest
+
+# SQL statements each route may run, whatever the number of rows it returns. A route going over its budget (an N+1
+# query, a lost eager load) fails here instead of slowing down production.
+READ_BUDGETS = [
+    ('GET', '/customers/', 1),
+    ('GET', '/customers/search?q=customer', 2),
+    ('GET', '/customers/1', 1),
+    ('GET', '/customers/my-tickets', 4),
+    ('GET', '/customers/my-tickets?include=total', 5),
+    ('GET', '/mechanics/', 1),
+    ('GET', '/mechanics/ranked', 1),
+    ('GET', '/serviceticket/', 3),
+    ('GET', '/serviceticket/?include=total', 4),
+    ('GET', '/serviceticket/?mechanic_id=1', 3),
+    ('GET', '/serviceticket/search?q=brake', 4),
+    ('GET', '/serviceticket/1/invoice', 2),
+    ('GET', '/serviceticket/export', 3),
+    ('GET', '/serviceticket/export?format=csv', 3),
+    ('GET', '/inventory/', 1),
+    ('GET', '/inventory/search?q=part', 2),
+    ('GET', '/inventory/1', 1),
+    ('GET', '/reports/daily', 2),
+    ('GET', '/reports/top-parts', 1),
+]
+
+class TestQueryBudgets(QueryBudgetMixin, unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("TestingConfig")
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            customers = [Customer(name=f"Customer {i}", email=f"customer{i}@email.com", phone="1234567890", password="123") for i in range(5)]
+            mechanics = [Mechanic(name=f"Mechanic {i}", email=f"mechanic{i}@email.com", phone="1234567890", password='123', salary=90000) for i in range(4)]
+            items = [Inventory(name=f'part {i}', price=5.00 + i) for i in range(6)]
+            for i in range(12):
+                ticket = ServiceTicket(VIN=f"VIN{i}", service_date=date(2025, 8, i % 4 + 1), service_desc="Brake job", customer=customers[i % 2])
+                ticket.mechanics.extend(mechanics[i % 3:i % 3 + 2])
+                ticket.items.extend(InventoryServiceTicket(item=item, quantity=i + 1) for item in items[i % 4:i % 4 + 3])
+                db.session.add(ticket)
+            db.session.add_all(customers + mechanics)
+            db.session.commit()
+            rebuild_rollups()
+            db.session.commit()
+        self.customer_headers = {'Authorization': 'Bearer ' + encode_token(1, 'customer')}
+        self.mechanic_headers = {'Authorization': 'Bearer ' + encode_token(1, 'mechanic')}
+        self.client = self.app.test_client()
+
+    def test_read_budgets(self):
+        for method, path, budget in READ_BUDGETS:
+            with self.subTest(path=path):
+                self.assertQueryBudget(budget, method, path, headers=self.mechanic_headers if path.startswith('/reports') else self.customer_headers)
+
+    def test_write_budgets(self):
+        self.assertQueryBudget(4, 'PUT', '/serviceticket/2/assign-mechanic', headers=self.mechanic_headers)
+        self.assertQueryBudget(9, 'PUT', '/serviceticket/1/edit', json={'add_mechanic_ids': [3, 4], 'remove_mechanic_ids': [2]}, headers=self.mechanic_headers)
+        response = self.assertQueryBudget(9, 'PUT', '/serviceticket/add_items', json={'ticket_id': 1, 'item_quant': [{'item_id': i, 'quantity': 1} for i in range(1, 7)]}, headers=self.mechanic_headers)
+        self.assertEqual(len(response.json['items']), 6)
+        self.assertQueryBudget(14, 'DELETE', '/serviceticket/3', headers=self.mechanic_headers)
+        self.assertQueryBudget(17, 'DELETE', '/customers/', headers=self.customer_headers)
+
+    # Requests report their statements and database time
+    def test_server_timing(self):
+        with captured_statements(self.app) as statements:
+            response = self.client.get('/serviceticket/')
+        timing = re.fullmatch(r'db;dur=([0-9.]+);desc="(\d+) statements", app;dur=([0-9.]+)', response.headers['Server-Timing'])
+        self.assertIsNotNone(timing, response.headers['Server-Timing'])
+        self.assertEqual(int(timing.group(2)), len(statements))
+        self.assertLessEqual(float(timing.group(1)), float(timing.group(3)))
+
+        self.app.config['SERVER_TIMING'] = False
+        self.assertNotIn('Server-Timing', self.client.get('/serviceticket/').headers)
+
+    # A relationship lazily loaded for every object of a list raises in strict mode, a single lazy load does not
+    def test_strict_loading(self):
+        @self.app.route('/test/ticket-items')
+        def ticket_items():
+            tickets = db.session.execute(select(ServiceTicket).order_by(ServiceTicket.id)).scalars().all()
+            return {'items': [len(ticket.items) for ticket in tickets]}
+
+        @self.app.route('/test/one-ticket-items')
+        def one_ticket_items():
+            return {'items': len(db.session.get(ServiceTicket, 1).items)}
+
+        with self.assertRaises(LazyLoadError) as error:
+            self.client.get('/test/ticket-items')
+        self.assertIn('ServiceTicket.items lazily loaded for 2 objects in GET /test/ticket-items', str(error.exception))
+        self.assertEqual(self.client.get('/test/one-ticket-items').json, {'items': 3})
+
+        self.app.config['STRICT_LOADING'] = False
+        self.assertEqual(len(self.client.get('/test/ticket-items').json['items']), 12)
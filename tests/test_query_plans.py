@@ -0,0 +1,117 @@
+from app import create_app
+from app.models import db, ServiceTicket, Mechanic, Customer, Inventory, InventoryServiceTicket
+from app.utils.util import encode_token
+from app.utils.pagination import encode_cursor
+from app.utils.rollups import rebuild_rollups
+from app.utils.query_stats import captured_statements
+from datetime import datetime
+import unittest
+
+# Runs the routes on SQLite, then runs EXPLAIN QUERY PLAN on every statement they sent and fails when a table is read
+# with a full scan instead of an index search. Keeps lookups logarithmic as the tables grow.
+class TestQueryPlans(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("TestingConfig")
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            mechanics = [Mechanic(name=f"Mechanic {i}", email=f"mechanic{i}@email.com", phone="1234567890", password='123', salary=90000) for i in range(3)]
+            items = [Inventory(name=f'item {i}', price=5.00) for i in range(3)]
+            for i in range(3):
+                customer = Customer(name=f"Customer {i}", email=f"customer{i}@email.com", phone="1234567890", password="123")
+                ticket = ServiceTicket(VIN=f"VIN{i}", service_date=datetime.strptime("2025-08-06","%Y-%m-%d").date(), service_desc="Car work", customer=customer)
+                ticket.mechanics.extend(mechanics)
+                ticket.items.extend(InventoryServiceTicket(item=item, quantity=1) for item in items)
+                db.session.add(ticket)
+            db.session.commit()
+        self.customer_headers = {'Authorization': 'Bearer ' + encode_token(1, 'customer')}
+        self.mechanic_headers = {'Authorization': 'Bearer ' + encode_token(1, 'mechanic')}
+        self.client = self.app.test_client()
+
+    # Send one request and return the query plan lines of every statement it ran, as (statement, plan details)
+    def query_plans(self, method, url, **kwargs):
+        with captured_statements(self.app, with_parameters=True) as statements:
+            response = self.client.open(url, method=method, **kwargs)
+        self.assertLess(response.status_code, 400, response.json)
+
+        with self.app.app_context():
+            plans = []
+            with db.engine.connect() as conn:
+                for statement, parameters, executemany in statements:
+                    if executemany or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                        continue
+                    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+                    plans.append((statement, [row[3] for row in rows]))
+        self.assertTrue(plans)
+        return plans
+
+    # A full scan shows up as 'SCAN <table>' (or 'SCAN <table> USING COVERING INDEX', which still reads every index entry)
+    def assertNoFullScans(self, method, url, allowed_tables=(), **kwargs):
+        for statement, details in self.query_plans(method, url, **kwargs):
+            for detail in details:
+                if detail.startswith('SCAN '):
+                    table = detail.split(' ')[1]
+                    self.assertIn(table, allowed_tables, f'Full scan of {table} in:\n{statement}\n{details}')
+
+    def test_customer_login(self):
+        self.assertNoFullScans('POST', '/customers/login', json={'email': 'customer1@email.com', 'password': '123'})
+
+    def test_mechanic_login(self):
+        self.assertNoFullScans('POST', '/mechanics/login', json={'email': 'mechanic1@email.com', 'password': '123'})
+
+    def test_my_tickets(self):
+        self.assertNoFullScans('GET', '/customers/my-tickets', headers=self.customer_headers)
+
+    # Pages after the first start from the cursor with an index search on the primary key
+    def test_list_pages(self):
+        cursor = encode_cursor({'id': 1})
+        for url in ['/serviceticket/', '/customers/', '/mechanics/', '/inventory/']:
+            self.assertNoFullScans('GET', f'{url}?cursor={cursor}')
+
+    # Every ticket filter is an index search, also combined with the cursor
+    def test_ticket_filters(self):
+        cursor = encode_cursor({'id': 1})
+        for query in ['VIN=VIN1', 'customer_id=2', 'mechanic_id=2', 'start_date=2025-08-01&end_date=2025-08-31', 'VIN=VIN1&customer_id=2']:
+            self.assertNoFullScans('GET', f'/serviceticket/?{query}')
+            self.assertNoFullScans('GET', f'/serviceticket/?{query}&cursor={cursor}')
+
+    def test_edit_ticket(self):
+        self.assertNoFullScans('PUT', '/serviceticket/1/edit', json={'add_mechanic_ids': [1], 'remove_mechanic_ids': [2]}, headers=self.mechanic_headers)
+
+    def test_add_items(self):
+        self.assertNoFullScans('PUT', '/serviceticket/add_items', json={'ticket_id': 1, 'item_quant': [{'item_id': 1, 'quantity': 1}]}, headers=self.mechanic_headers)
+
+    def test_create_item(self):
+        self.assertNoFullScans('POST', '/inventory/', json={'name': 'Bolt', 'price': 1.00}, headers=self.mechanic_headers)
+
+    def test_delete_item(self):
+        self.assertNoFullScans('DELETE', '/inventory/1', headers=self.mechanic_headers)
+
+    def test_delete_ticket(self):
+        self.assertNoFullScans('DELETE', '/serviceticket/1', headers=self.mechanic_headers)
+
+    def test_delete_mechanic(self):
+        self.assertNoFullScans('DELETE', '/mechanics/', headers=self.mechanic_headers)
+
+    def test_delete_customer(self):
+        self.assertNoFullScans('DELETE', '/customers/', headers=self.customer_headers)
+
+    def test_search(self):
+        for url in ['/inventory/search?q=item', '/customers/search?q=customer 1', '/serviceticket/search?q=car&count=true']:
+            self.assertNoFullScans('GET', url, allowed_tables=('anon_1', 'anon_2'))
+        cursor = encode_cursor({'id': 1, 'score': 2})
+        self.assertNoFullScans('GET', f'/inventory/search?q=item&cursor={cursor}', allowed_tables=('anon_1',))
+
+    # Ranking has to count every assignment (the counts come from the covering mechanic_id index), but the date window must be an index range on service_date
+    def test_ranked_mechanics_date_window(self):
+        self.assertNoFullScans('GET', '/mechanics/ranked?start_date=2025-08-01&end_date=2025-08-31', allowed_tables=('mechanics', 'service_mechanics', 'counts', 'anon_1'))
+        plans = self.query_plans('GET', '/mechanics/ranked?start_date=2025-08-01&end_date=2025-08-31&per_page=5')
+        details = [detail for statement, plan in plans for detail in plan]
+        self.assertTrue(any('service_tickets' in detail and 'service_date' in detail for detail in details), details)
+
+    def test_reports_date_window(self):
+        with self.app.app_context():
+            rebuild_rollups()
+        for url in ('/reports/daily', '/reports/top-parts'):
+            self.assertNoFullScans('GET', f'{url}?start_date=2025-08-01&end_date=2025-08-31', headers=self.mechanic_headers)
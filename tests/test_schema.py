@@ -0,0 +1,77 @@
+from app import create_app
+from app.models import db
+from app.utils.schema import upgrade_schema
+from sqlalchemy import inspect, text
+import unittest
+
+# Tables as created before the lookup indexes, keys and the search and rollup tables were added
+OLD_SCHEMA = [
+    'CREATE TABLE customers (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, email VARCHAR(255) NOT NULL UNIQUE, phone VARCHAR(255) NOT NULL, password VARCHAR(255) NOT NULL)',
+    'CREATE TABLE mechanics (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, email VARCHAR(255) NOT NULL UNIQUE, phone VARCHAR(255) NOT NULL, password VARCHAR(255) NOT NULL, salary FLOAT NOT NULL)',
+    'CREATE TABLE inventory (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, price FLOAT NOT NULL)',
+    'CREATE TABLE service_tickets (id INTEGER PRIMARY KEY, "VIN" VARCHAR(255) NOT NULL, service_date DATE NOT NULL, service_desc VARCHAR(255) NOT NULL, customer_id INTEGER REFERENCES customers (id))',
+    'CREATE TABLE service_mechanics (ticket_id INTEGER REFERENCES service_tickets (id), mechanic_id INTEGER REFERENCES mechanics (id))',
+    'CREATE TABLE inventory_service_ticket (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL, inventory_id INTEGER NOT NULL REFERENCES inventory (id), service_ticket_id INTEGER NOT NULL REFERENCES service_tickets (id))',
+]
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("TestingConfig")
+        with self.app.app_context():
+            db.drop_all()
+            with db.engine.begin() as conn:
+                for statement in OLD_SCHEMA:
+                    conn.execute(text(statement))
+                conn.execute(text("INSERT INTO customers VALUES (1, 'Customer', 'customer@email.com', '1234567890', '123')"))
+                conn.execute(text("INSERT INTO mechanics VALUES (1, 'Mechanic', 'mechanic@email.com', '1234567890', '123', 90000)"))
+                conn.execute(text("INSERT INTO inventory VALUES (1, 'part', 5.0)"))
+                conn.execute(text("INSERT INTO service_tickets VALUES (1, 'VIN1', '2025-08-06', 'Brake job', 1)"))
+                conn.execute(text('INSERT INTO service_mechanics VALUES (1, 1), (1, 1)'))
+                conn.execute(text('INSERT INTO inventory_service_ticket VALUES (1, 2, 1, 1), (2, 3, 1, 1)'))
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.drop_all()
+
+    def test_upgrade_schema(self):
+        with self.app.app_context():
+            changes = upgrade_schema()
+            self.assertIn('Created table search_terms', changes)
+            self.assertIn('Merged 1 duplicate rows in inventory_service_ticket', changes)
+            self.assertIn('Added unique key (service_ticket_id, inventory_id) to inventory_service_ticket', changes)
+            self.assertIn('Added primary key (ticket_id, mechanic_id) to service_mechanics', changes)
+            self.assertIn('Created index ix_service_tickets_customer_id', changes)
+
+            inspector = inspect(db.engine)
+            indexed = {tuple(index['column_names']) for table in ('service_tickets', 'inventory', 'inventory_service_ticket') for index in inspector.get_indexes(table)}
+            self.assertTrue({('service_date',), ('customer_id',), ('VIN',), ('name',), ('inventory_id',)} <= indexed, indexed)
+            self.assertTrue(any(index['unique'] for index in inspector.get_indexes('inventory') if index['column_names'] == ['name']))
+            with db.engine.connect() as conn:
+                self.assertEqual(conn.execute(text('SELECT id, quantity FROM inventory_service_ticket')).all(), [(1, 5)])
+                self.assertEqual(conn.execute(text('SELECT COUNT(*) FROM service_mechanics')).scalar(), 1)
+
+            # Nothing left to do on a second run
+            self.assertEqual(upgrade_schema(), [])
+
+    # A plain index on a column that became unique is replaced, unless rows share a value: those are reported, not merged
+    def test_upgrade_schema_unique_index(self):
+        with self.app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(text('CREATE INDEX ix_inventory_name ON inventory (name)'))
+                conn.execute(text("INSERT INTO inventory VALUES (2, 'part', 6.0)"))
+            changes = upgrade_schema()
+            self.assertIn('Skipped unique index ix_inventory_name: 1 values of (name) are used by more than one row in inventory', changes)
+            self.assertNotIn('Created index ix_inventory_name', changes)
+
+            with db.engine.begin() as conn:
+                conn.execute(text("UPDATE inventory SET name = 'other part' WHERE id = 2"))
+            self.assertEqual(upgrade_schema(), ['Created index ix_inventory_name'])
+            self.assertEqual([index['unique'] for index in inspect(db.engine).get_indexes('inventory') if index['column_names'] == ['name']], [1])
+            self.assertEqual(upgrade_schema(), [])
+
+    def test_upgrade_schema_command(self):
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['upgrade-schema'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Fill the new tables with rebuild-search-index and rebuild-rollups', result.output)
+        self.assertEqual(runner.invoke(args=['upgrade-schema']).output, 'Schema is up to date\n')
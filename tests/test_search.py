@@ -0,0 +1,129 @@
+from app import create_app
+from app.models import db, Customer, Inventory, Mechanic, ServiceTicket, SearchTerm
+from app.utils.util import encode_token
+from app.utils.pagination import encode_cursor
+from datetime import datetime
+from sqlalchemy import delete
+from sqlalchemy.dialects import mysql
+from sqlalchemy.schema import CreateTable
+import unittest
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("TestingConfig")
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(Mechanic(name="Jim", email="jim@email.com", phone="1234567890", password='123', salary=90000))
+            db.session.add_all([Inventory(name='brake pads', price=40.00), Inventory(name='brakes', price=90.00), Inventory(name='brake fluid', price=12.00), Inventory(name='wiper blades', price=15.00)])
+            customer = Customer(name="Wasabi Lee", email="wasabi@email.com", phone="1234567890", password="123")
+            db.session.add(customer)
+            db.session.add(Customer(name="Nori Kim", email="lee.nori@email.com", phone="1234567890", password="123"))
+            for i in range(5):
+                db.session.add(ServiceTicket(VIN=f"VIN{i}", service_date=datetime.strptime("2025-08-06","%Y-%m-%d").date(), service_desc=f"Front brake job {i}", customer=customer))
+            db.session.add(ServiceTicket(VIN="VIN9", service_date=datetime.strptime("2025-08-06","%Y-%m-%d").date(), service_desc="Oil change", customer=customer))
+            db.session.commit()
+        self.mechanic_headers = {'Authorization': 'Bearer ' + encode_token(1, 'mechanic')}
+        self.client = self.app.test_client()
+
+    # Whole word matches rank above prefix matches, ties are in id order
+    def test_search_items(self):
+        response = self.client.get('/inventory/search?q=Brake')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['name'] for item in response.json], ['brake pads', 'brake fluid', 'brakes'])
+
+        response = self.client.get('/inventory/search?q=bra pad')
+        self.assertEqual([item['name'] for item in response.json], ['brake pads'])
+
+        response = self.client.get('/inventory/search?q=tire')
+        self.assertEqual(response.json, [])
+
+    # Prefixes ending in the last digit or letter: the range ends at ':' or '{', which only sort after them in code point order
+    def test_search_prefix_ending_in_z_or_9(self):
+        with self.app.app_context():
+            db.session.add_all([Inventory(name='oil filter kz9', price=4.00), Inventory(name='quartz kit', price=4.00)])
+            db.session.commit()
+        self.assertEqual([item['name'] for item in self.client.get('/inventory/search?q=kz9').json], ['oil filter kz9'])
+        self.assertEqual([item['name'] for item in self.client.get('/inventory/search?q=quarz').json], [])
+        self.assertEqual([item['name'] for item in self.client.get('/inventory/search?q=kz').json], ['oil filter kz9'])
+        self.assertEqual([item['name'] for item in self.client.get('/inventory/search?q=quartz').json], ['quartz kit'])
+
+        # On MySQL the term column is compared in binary (code point) order
+        ddl = str(CreateTable(SearchTerm.__table__).compile(dialect=mysql.dialect()))
+        self.assertIn('term VARCHAR(64) COLLATE utf8mb4_bin NOT NULL', ddl)
+
+    # Name matches rank above email matches
+    def test_search_customers(self):
+        response = self.client.get('/customers/search?q=lee')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([customer['name'] for customer in response.json], ['Wasabi Lee', 'Nori Kim'])
+        self.assertNotIn('password', response.json[0])
+
+        response = self.client.get('/customers/search?q=wasabi@email')
+        self.assertEqual([customer['email'] for customer in response.json], ['wasabi@email.com'])
+
+    def test_search_tickets_paginated(self):
+        response = self.client.get('/serviceticket/search?q=brake&per_page=2&count=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Total-Count'], '5')
+        ids = [ticket['id'] for ticket in response.json]
+
+        while 'X-Next-Cursor' in response.headers:
+            response = self.client.get(f"/serviceticket/search?q=brake&per_page=2&cursor={response.headers['X-Next-Cursor']}")
+            ids.extend(ticket['id'] for ticket in response.json)
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+        self.assertEqual(response.json[0]['customer']['name'], 'Wasabi Lee')
+
+    def test_invalid_search(self):
+        response = self.client.get('/inventory/search')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['q'], ['Missing data for required field.'])
+
+        response = self.client.get('/inventory/search?q=--')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/inventory/search?q=brake&cursor=eyJpZCI6MX0')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['cursor'], ['Invalid cursor.'])
+
+        for values in ({'id': 1, 'score': 2**70}, {'id': 1, 'score': False}):
+            response = self.client.get('/inventory/search?q=brake&cursor=' + encode_cursor(values))
+            self.assertEqual(response.status_code, 400, values)
+
+    # The index follows inserts, renames and deletes made through the routes
+    def test_index_follows_writes(self):
+        response = self.client.put('/inventory/4', json={'name': 'Wiper Motor', 'price': 80.00}, headers=self.mechanic_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/inventory/search?q=blades').json, [])
+        self.assertEqual([item['id'] for item in self.client.get('/inventory/search?q=motor').json], [4])
+
+        self.client.delete('/inventory/1', headers=self.mechanic_headers)
+        self.assertEqual([item['name'] for item in self.client.get('/inventory/search?q=brake').json], ['brake fluid', 'brakes'])
+
+        # Deleting a customer deletes their tickets too
+        headers = {'Authorization': 'Bearer ' + encode_token(1, 'customer')}
+        self.client.delete('/customers/', headers=headers)
+        self.assertEqual(self.client.get('/serviceticket/search?q=brake').json, [])
+        with self.app.app_context():
+            self.assertEqual(db.session.query(SearchTerm).filter(SearchTerm.kind.in_(['customer', 'ticket']), SearchTerm.ref_id == 1).count(), 0)
+
+    def test_bulk_imports_are_indexed(self):
+        upload = '{"name": "Ebi Tanaka", "email": "ebi@email.com", "phone": "1234567890"}'
+        self.client.post('/customers/bulk', data=upload, headers=self.mechanic_headers, content_type='application/x-ndjson')
+        self.assertEqual([customer['name'] for customer in self.client.get('/customers/search?q=tanaka').json], ['Ebi Tanaka'])
+
+        upload = 'name,price\nCabin Filter,25.00\nBrakes,95.00\n'
+        self.client.post('/inventory/bulk', data=upload, headers=self.mechanic_headers, content_type='text/csv')
+        self.assertEqual([item['name'] for item in self.client.get('/inventory/search?q=filt').json], ['cabin filter'])
+        self.assertEqual(len(self.client.get('/inventory/search?q=brakes').json), 1)
+
+    def test_rebuild_search_index_command(self):
+        with self.app.app_context():
+            db.session.execute(delete(SearchTerm))
+            db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(args=['rebuild-search-index'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Indexed 4 inventory rows', result.output)
+        self.assertEqual(len(self.client.get('/inventory/search?q=brake').json), 3)
@@ -0,0 +1,107 @@
+from app import create_app
+from app.models import db, ServiceTicket, Mechanic, Customer, Inventory, InventoryServiceTicket
+from app.blueprints.service_ticket.schemas import service_ticket_schema, service_tickets_schema, add_items_schema, edit_service_ticket_schema, ticket_fieldset, ticket_load_options
+from app.blueprints.customers.schemas import customer_fieldset, bulk_customer_schema
+from app.blueprints.inventory.schemas import inventory_fieldset
+from app.utils.serializers import dump, load, _compile, _compile_load
+from app.utils.json_provider import FastJSONProvider
+from datetime import date, datetime
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import ValidationError
+from sqlalchemy import select
+import json
+import random
+import unittest
+
+class TestSerializers(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("TestingConfig")
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            mechanics = [Mechanic(name="Jim", email="jim@email.com", phone="1234567890", password='123', salary=90000), Mechanic(name="Dan", email="dan@email.com", phone="1234567890", password='123', salary=90000)]
+            items = [Inventory(name='wheels', price=29.99), Inventory(name='screw', price=5), Inventory(name='bolt', price=1e-05)]
+            customer = Customer(name="Wasabi Lée", email="wasabi@email.com", phone="1234567890", password="123")
+            for i in range(5):
+                ticket = ServiceTicket(VIN=f"VIN{i}", service_date=date(2025, 8, i + 1), service_desc=f"Car work {i}", customer=customer)
+                ticket.mechanics.extend(mechanics[:i % 3])
+                ticket.items.extend(InventoryServiceTicket(item=item, quantity=i + 1) for item in items[:i % 4])
+                db.session.add(ticket)
+            db.session.add(ServiceTicket(VIN="VIN9", service_date=date(2025, 8, 9), service_desc="No customer", customer_id=99)) # Dumps customer as null
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    # Compiled dump functions write the same data, in the same key order, as the marshmallow schemas
+    def test_dump_matches_schema(self):
+        with self.app.app_context():
+            tickets = db.session.execute(select(ServiceTicket).options(*ticket_load_options)).scalars().all()
+            selections = [None, ('VIN', 'id'), ('customer', 'items'), ('mechanics',)]
+            for selected in selections:
+                schema = ticket_fieldset.schema(selected)
+                self.assertEqual(json.dumps(dump(schema, tickets)), json.dumps(schema.dump(tickets)))
+            self.assertEqual(json.dumps(dump(service_ticket_schema, tickets[3])), json.dumps(service_ticket_schema.dump(tickets[3])))
+
+            customers = db.session.execute(select(Customer)).scalars().all()
+            self.assertEqual(dump(customer_fieldset.schema(None), customers), customer_fieldset.schema(None).dump(customers))
+            items = db.session.execute(select(Inventory)).scalars().all()
+            self.assertEqual(dump(inventory_fieldset.schema(('price',)), items), inventory_fieldset.schema(('price',)).dump(items))
+
+    # Responses are byte for byte what Flask's default JSON provider writes (compact output, as outside debug mode)
+    def test_json_provider_matches_default(self):
+        self.app.json.compact = True
+        values = [
+            {'b': [1, 2.5, None, True], 'a': {'z': [], 'y': 'x'}},
+            'Wasabi Lée', '\x7f', 'a/b"\\\n', 1e16, 1e-05, 0.1, -0.0, 2 ** 70,
+            date(2025, 8, 6), datetime(2025, 8, 6, 10, 30), Decimal('1.10'), {1: 'one'},
+        ]
+        generator = random.Random(21)
+        values.extend([generator.uniform(0, 1) * 10 ** generator.randint(-8, 20) for i in range(200)] for i in range(10)) # Float formatting across magnitudes
+        with self.app.app_context():
+            fast = FastJSONProvider(self.app)
+            default = DefaultJSONProvider(self.app)
+            fast.compact = default.compact = True
+            for value in values:
+                self.assertEqual(fast.response(value).get_data(), default.response(value).get_data(), value)
+
+        response = self.client.get('/serviceticket/?include=total')
+        with self.app.app_context():
+            tickets = db.session.execute(select(ServiceTicket).options(*ticket_load_options).order_by(ServiceTicket.id)).scalars().all()
+            expected = service_tickets_schema.dump(tickets)
+            for ticket in expected:
+                ticket['total'] = round(sum((line['quantity'] * line['item']['price'] for line in ticket['items']), 0.0), 2)
+            self.assertEqual(response.get_data(), default.response(expected).get_data())
+
+    def test_load_matches_schema(self):
+        payloads = [
+            {'ticket_id': 1, 'item_quant': [{'item_id': 1, 'quantity': 2}, {'item_id': 2, 'quantity': -1}]},
+            {'ticket_id': 1, 'item_quant': []},
+            {'ticket_id': '1', 'item_quant': [{'item_id': 1.0, 'quantity': '2'}]}, # Coerced by marshmallow
+        ]
+        for payload in payloads:
+            self.assertEqual(load(add_items_schema, payload), add_items_schema.load(payload))
+        self.assertEqual(load(edit_service_ticket_schema, {'add_mechanic_ids': [1, 2]}), {'add_mechanic_ids': [1, 2]})
+
+        # Invalid input is rejected by marshmallow with its usual messages
+        invalid = [
+            {'item_quant': [{'item_id': 1, 'quantity': 2}]},
+            {'ticket_id': True, 'item_quant': []},
+            {'ticket_id': 1, 'item_quant': [{'item_id': 1}]},
+            {'ticket_id': 1, 'item_quant': {'item_id': 1, 'quantity': 2}},
+            {'ticket_id': None},
+            {'ticket_id': 1, 'extra': 1},
+            [1, 2],
+        ]
+        for payload in invalid:
+            with self.assertRaises(ValidationError) as fast_error:
+                load(add_items_schema, payload)
+            with self.assertRaises(ValidationError) as schema_error:
+                add_items_schema.load(payload)
+            self.assertEqual(fast_error.exception.messages, schema_error.exception.messages)
+
+    # Schemas with validators are left to marshmallow
+    def test_load_not_compiled(self):
+        self.assertIsNone(_compile(_compile_load, bulk_customer_schema))
+        with self.assertRaises(ValidationError):
+            load(bulk_customer_schema, {'name': 'x' * 300, 'email': 'a@email.com', 'phone': '1'})
@@ -1,8 +1,14 @@
 from app import create_app
-from app.models import db, ServiceTicket, Mechanic, Customer, Inventory
+from app.models import db, ServiceTicket, Mechanic, Customer, Inventory, InventoryServiceTicket, service_mechanics
 import unittest
+import csv
+import io
+import json
+from unittest.mock import patch
 from datetime import datetime
+from sqlalchemy import event, select
 from app.utils.util import encode_token
+from app.utils.query_stats import captured_statements
 
 class TestServiceTickets(unittest.TestCase):
     def setUp(self):
@@ -167,7 +173,202 @@ class TestServiceTickets(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json[0]['service_date'], '2025-08-06')
         self.assertEqual(response.json[1]['service_date'], '2025-08-10')
+        
+    def test_get_service_tickets_cache_invalidated(self):
+        self.assertEqual(self.client.get('/serviceticket/').json[0]['mechanics'], [])
+        
+        # Writes to tickets and to data shown on tickets both rebuild the cached list
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/1/assign-mechanic', headers=headers)
+        self.assertEqual(self.client.get('/serviceticket/').json[0]['mechanics'][0]['name'], 'Jim')
+        
+        self.client.put('/serviceticket/add_items', json={'ticket_id': 1, 'item_quant': [{'item_id': 1, 'quantity': 2}]}, headers=headers)
+        self.assertEqual(self.client.get('/serviceticket/').json[0]['items'][0]['item']['price'], 29.99)
+        
+        self.client.put('/inventory/1', json={'name': 'wheels', 'price': 31.99}, headers=headers)
+        self.assertEqual(self.client.get('/serviceticket/').json[0]['items'][0]['item']['price'], 31.99)
+        
+        self.client.delete('/serviceticket/1', headers=headers)
+        self.assertEqual(self.client.get('/serviceticket/').json, [])
+        
+    def test_paginate_service_tickets(self):
+        create_payload = {
+            "VIN": "456",
+            'service_date': '2025-08-10',
+            'service_desc': 'Tire rotation'
+        }
+        
+        headers = {'Authorization': 'Bearer ' + self.customer_token}
+        self.client.post('/serviceticket/', json=create_payload, headers=headers)
+        
+        response = self.client.get('/serviceticket/?per_page=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), 1)
+        self.assertEqual(response.json[0]['VIN'], '123')
+        
+        # Each page is cached separately
+        response = self.client.get('/serviceticket/?per_page=1&cursor=' + response.headers['X-Next-Cursor'])
+        self.assertEqual(len(response.json), 1)
+        self.assertEqual(response.json[0]['VIN'], '456')
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+    def test_filter_service_tickets(self):
+        with self.app.app_context():
+            customer = Customer(name="Nori", email="nori@email.com", phone="1234567890", password="123")
+            for i, day in enumerate(['2025-08-20', '2025-09-01', '2025-09-15']):
+                db.session.add(ServiceTicket(VIN="456", service_date=datetime.strptime(day,"%Y-%m-%d").date(), service_desc=f"Visit {i}", customer=customer))
+            db.session.commit()
+        
+        def ticket_ids(query):
+            response = self.client.get('/serviceticket/?' + query)
+            self.assertEqual(response.status_code, 200)
+            return [ticket['id'] for ticket in response.json]
+        
+        self.assertEqual(ticket_ids('VIN=456'), [2, 3, 4])
+        self.assertEqual(ticket_ids('customer_id=1'), [1])
+        self.assertEqual(ticket_ids('start_date=2025-08-10&end_date=2025-09-01'), [2, 3])
+        self.assertEqual(ticket_ids('start_date=2025-09-01&VIN=456&customer_id=2'), [3, 4])
+        self.assertEqual(ticket_ids('mechanic_id=1'), [])
+        
+        # Mechanic filter follows assignments straight away (cached page is rebuilt)
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/3/edit', json={'add_mechanic_ids': [1, 2]}, headers=headers)
+        self.client.put('/serviceticket/1/assign-mechanic', headers=headers)
+        self.assertEqual(ticket_ids('mechanic_id=1'), [1, 3])
+        self.assertEqual(ticket_ids('mechanic_id=2&VIN=456'), [3])
+        
+        # Filters combine with pagination
+        response = self.client.get('/serviceticket/?VIN=456&per_page=2&count=true')
+        self.assertEqual([ticket['id'] for ticket in response.json], [2, 3])
+        self.assertEqual(response.headers['X-Total-Count'], '3')
+        self.assertIn('VIN=456', response.headers['Link'])
+        self.assertEqual(ticket_ids(f"VIN=456&per_page=2&cursor={response.headers['X-Next-Cursor']}"), [4])
+        
+    def test_invalid_filter_service_tickets(self):
+        response = self.client.get('/serviceticket/?start_date=2025-09-01&end_date=2025-08-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['start_date'], ['start_date must be before end_date.'])
+        
+        response = self.client.get('/serviceticket/?customer_id=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['customer_id'], ['Not a valid integer.'])
+
+    # Test that listing tickets runs a fixed number of queries no matter how many tickets exist
+    def test_get_service_tickets_query_count(self):
+        def count_queries():
+            with captured_statements(self.app) as statements:
+                response = self.client.get('/serviceticket/?per_page=100')
+            self.assertEqual(response.status_code, 200)
+            return len(statements), response
+        
+        def add_tickets(start, stop):
+            with self.app.app_context():
+                mechanics = db.session.query(Mechanic).all()
+                items = db.session.query(Inventory).all()
+                for i in range(start, stop):
+                    customer = Customer(name=f"Customer {i}", email=f"customer{i}@email.com", phone="1234567890", password="123")
+                    ticket = ServiceTicket(VIN=f"VIN{i}", service_date=datetime.strptime("2025-08-06","%Y-%m-%d").date(), service_desc="Car work", customer=customer)
+                    ticket.mechanics.extend(mechanics)
+                    for item in items:
+                        ticket.items.append(InventoryServiceTicket(item=item, quantity=i + 1))
+                    db.session.add(ticket)
+                db.session.commit()
+        
+        add_tickets(0, 5)
+        small_count, _ = count_queries()
+        
+        self.app = create_app("TestingConfig") # fresh app so the cached response from the first call is not reused
+        self.client = self.app.test_client()
+        add_tickets(5, 50)
+        large_count, response = count_queries()
+        
+        self.assertEqual(len(response.json), 51)
+        self.assertEqual(response.json[-1]['customer']['name'], 'Customer 49')
+        self.assertEqual(len(response.json[-1]['mechanics']), 2)
+        self.assertEqual(response.json[-1]['items'][1]['item']['name'], 'screw')
+        self.assertLessEqual(large_count, 5)
+        self.assertEqual(small_count, large_count)
 
+    # Test export service tickets
+    def test_export_ndjson(self):
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/1/assign-mechanic', headers=headers)
+        for vin in ['456', '789']:
+            create_payload = {
+                "VIN": vin,
+                'service_date': '2025-08-10',
+                'service_desc': 'Tire rotation'
+            }
+            self.client.post('/serviceticket/', json=create_payload, headers={'Authorization': 'Bearer ' + self.customer_token})
+        
+        with patch('app.blueprints.service_ticket.routes.EXPORT_BATCH_SIZE', 2): # Export in more than one batch
+            response = self.client.get('/serviceticket/export')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([row['VIN'] for row in rows], ['123', '456', '789'])
+        self.assertEqual(rows[0]['mechanics'][0]['name'], 'Jim')
+        self.assertEqual(rows[0], self.client.get('/serviceticket/').json[0])
+        
+    def test_export_csv(self):
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/1/assign-mechanic', headers=headers)
+        add_item_payload = {
+            'ticket_id': 1,
+            'item_quant': [{'item_id': 1, 'quantity': 2}]
+        }
+        self.client.put('/serviceticket/add_items', json=add_item_payload, headers=headers)
+        
+        response = self.client.get('/serviceticket/export?format=csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['VIN'], '123')
+        self.assertEqual(rows[0]['customer_email'], 'wasabi@email.com')
+        self.assertEqual(rows[0]['mechanics'], 'Jim')
+        self.assertEqual(rows[0]['items'], 'wheels x2')
+        
+    def test_invalid_format_export(self):
+        response = self.client.get('/serviceticket/export?format=xml')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error'], "format must be 'ndjson' or 'csv'")
+
+    # A mechanic assigned by another request in the meantime is kept once, not inserted twice
+    def test_edit_concurrent_assignment(self):
+        def assign_other(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO service_mechanics'):
+                cursor.execute('INSERT INTO service_mechanics (ticket_id, mechanic_id) VALUES (1, 2)')
+        
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', assign_other)
+            try:
+                response = self.client.put('/serviceticket/1/edit', json={'add_mechanic_ids': [1, 2]}, headers=headers)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', assign_other)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([mechanic['name'] for mechanic in response.json['mechanics']], ['Jim', 'Dan'])
+        
+        # The same for assign-mechanic (mechanic 1 is the logged in mechanic)
+        with self.app.app_context():
+            db.session.execute(service_mechanics.delete())
+            db.session.commit()
+        def assign_self(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO service_mechanics'):
+                cursor.execute('INSERT INTO service_mechanics (ticket_id, mechanic_id) VALUES (1, 1)')
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', assign_self)
+            try:
+                response = self.client.put('/serviceticket/1/assign-mechanic', headers=headers)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', assign_self)
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(db.session.execute(select(service_mechanics)).all(), [(1, 1)])
+        
     # Test edit ticket
     def test_edit(self):
         edit_payload = {
@@ -199,6 +400,30 @@ class TestServiceTickets(unittest.TestCase):
         self.assertEqual(response.json['mechanics'][0]['name'], 'Jim')
         self.assertEqual(len(response.json['mechanics']), 1)
         
+    def test_bulk_edit_query_count(self):
+        with self.app.app_context():
+            for i in range(40):
+                db.session.add(Mechanic(name=f"Mechanic {i}", email=f"mechanic{i}@email.com", phone="1234567890", password='123', salary=90000))
+            db.session.commit()
+        
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/1/edit', json={'add_mechanic_ids': list(range(1, 21))}, headers=headers)
+        
+        # Shift change: swap the first 20 mechanics for the next 20, mechanic 42 is in both lists so it ends up removed
+        edit_payload = {
+            'add_mechanic_ids': list(range(21, 43)),
+            'remove_mechanic_ids': list(range(1, 21)) + [42]
+        }
+        with captured_statements(self.app) as statements:
+            response = self.client.put('/serviceticket/1/edit', json=edit_payload, headers=headers)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['mechanics']), 21)
+        self.assertEqual(response.json['mechanics'][0]['name'], 'Mechanic 18')
+        writes = [statement for statement in statements if statement.startswith(('INSERT', 'DELETE'))]
+        self.assertEqual(len(writes), 2)
+        self.assertLessEqual(len(statements), 10)
+        
     def test_invalid_ticket_edit(self):
         edit_payload = {
             'add_mechanic_ids': [1, 2],
@@ -252,6 +477,70 @@ class TestServiceTickets(unittest.TestCase):
         self.assertEqual(response.json['items'][1]['item']['name'], 'screw')
         self.assertEqual(response.json['items'][1]['quantity'], 10)
         
+    def test_add_existing_items(self):
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/1/assign-mechanic', headers=headers)
+        self.client.put('/serviceticket/add_items', json={'ticket_id': 1, 'item_quant': [{'item_id': 1, 'quantity': 2}]}, headers=headers)
+        
+        # Existing line gets incremented, repeated lines in one request are added together
+        add_item_payload = {
+            'ticket_id': 1,
+            'item_quant': [
+                {'item_id': 1, 'quantity': 3},
+                {'item_id': 2, 'quantity': 1},
+                {'item_id': 2, 'quantity': 4}
+            ]
+        }
+        response = self.client.put('/serviceticket/add_items', json=add_item_payload, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['items']), 2)
+        self.assertEqual(response.json['items'][0]['quantity'], 5)
+        self.assertEqual(response.json['items'][1]['quantity'], 5)
+        
+    def test_add_items_query_count(self):
+        with self.app.app_context():
+            for i in range(100):
+                db.session.add(Inventory(name=f'part {i}', price=1.00))
+            db.session.commit()
+        
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/1/assign-mechanic', headers=headers)
+        self.client.put('/serviceticket/add_items', json={'ticket_id': 1, 'item_quant': [{'item_id': i, 'quantity': 1} for i in range(1, 51)]}, headers=headers)
+        
+        add_item_payload = {'ticket_id': 1, 'item_quant': [{'item_id': i, 'quantity': 1} for i in range(1, 101)]}
+        with captured_statements(self.app) as statements:
+            response = self.client.put('/serviceticket/add_items', json=add_item_payload, headers=headers)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['items']), 100)
+        self.assertEqual(response.json['items'][0]['quantity'], 2)
+        self.assertEqual(response.json['items'][99]['quantity'], 1)
+        writes = [statement for statement in statements if statement.startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len([statement for statement in writes if 'inventory_service_ticket' in statement]), 1) # One upsert for new and existing lines
+        self.assertEqual(len([statement for statement in writes if 'daily_part_usage' in statement]), 1) # Rollup rows updated and added in one upsert
+        
+    # A line added for the same item by another request in the meantime is added to, not inserted twice
+    def test_add_items_concurrent_line(self):
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/1/assign-mechanic', headers=headers)
+        with self.app.app_context():
+            db.session.add(Inventory(name='part', price=1.00))
+            db.session.commit()
+        
+        # The other request's line is inserted right before this request's own write
+        def insert_other_line(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO inventory_service_ticket'):
+                cursor.execute('INSERT INTO inventory_service_ticket (quantity, inventory_id, service_ticket_id) VALUES (3, 1, 1)')
+        
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', insert_other_line)
+            try:
+                response = self.client.put('/serviceticket/add_items', json={'ticket_id': 1, 'item_quant': [{'item_id': 1, 'quantity': 2}]}, headers=headers)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', insert_other_line)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['quantity'] for item in response.json['items']], [5])
+        
     def test_invalid_payload_add_items(self):
         add_item_payload = {
             'item_quant': [
@@ -393,4 +682,98 @@ class TestServiceTickets(unittest.TestCase):
         response = self.client.delete('/serviceticket/1', headers=headers_invalid)
         
         self.assertEqual(response.status_code, 401)
-        self.assertEqual(response.json['error'], 'Invalid token')
\ No newline at end of file
+        self.assertEqual(response.json['error'], 'Invalid token')
+
+    def add_invoice_items(self):
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/serviceticket/1/assign-mechanic', headers=headers)
+        self.client.put('/serviceticket/add_items', json={'ticket_id': 1, 'item_quant': [{'item_id': 1, 'quantity': 3}, {'item_id': 2, 'quantity': 4}]}, headers=headers)
+        
+    def test_get_invoice(self):
+        self.add_invoice_items()
+        
+        with captured_statements(self.app) as statements:
+            response = self.client.get('/serviceticket/1/invoice')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['total'], 109.97)
+        self.assertEqual(response.json['lines'], [
+            {'item_id': 1, 'name': 'wheels', 'price': 29.99, 'quantity': 3, 'line_total': 89.97},
+            {'item_id': 2, 'name': 'screw', 'price': 5.0, 'quantity': 4, 'line_total': 20.0},
+        ])
+        # Total and lines come from two column queries, no ticket columns are read
+        self.assertEqual(len(statements), 2)
+        self.assertNotIn('VIN', ' '.join(statements))
+        
+        # Price changes show up straight away
+        headers = {'Authorization': 'Bearer ' + self.mechanic_token}
+        self.client.put('/inventory/2', json={'name': 'screw', 'price': 6.00}, headers=headers)
+        self.assertEqual(self.client.get('/serviceticket/1/invoice').json['total'], 113.97)
+        
+    def test_get_invoice_without_items(self):
+        response = self.client.get('/serviceticket/1/invoice')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'ticket_id': 1, 'lines': [], 'total': 0})
+        
+        response = self.client.get('/serviceticket/99/invoice')
+        self.assertEqual(response.status_code, 404)
+        
+    # One grouped query adds the totals of the whole page
+    def test_list_tickets_with_totals(self):
+        self.add_invoice_items()
+        with self.app.app_context():
+            db.session.add(ServiceTicket(VIN="456", service_date=datetime.strptime("2025-08-06","%Y-%m-%d").date(), service_desc="Car work", customer_id=1))
+            db.session.commit()
+        
+        def get(url):
+            with captured_statements(self.app) as statements:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return response, len(statements)
+        
+        response, plain_count = get('/serviceticket/')
+        self.assertNotIn('total', response.json[0])
+        response, total_count = get('/serviceticket/?include=total')
+        self.assertEqual([ticket['total'] for ticket in response.json], [109.97, 0])
+        self.assertEqual(total_count, plain_count + 1)
+        
+        response, _ = get('/serviceticket/search?q=car&include=total')
+        self.assertEqual([ticket['total'] for ticket in response.json], [109.97, 0])
+        
+        headers = {'Authorization': 'Bearer ' + self.customer_token}
+        response = self.client.get('/customers/my-tickets?include=total', headers=headers)
+        self.assertEqual([ticket['total'] for ticket in response.json], [109.97, 0])
+        
+        response = self.client.get('/serviceticket/?include=price')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['include'], ['Must be one of: total.'])
+        
+    # Only the nested objects asked for are loaded, with one query per relationship
+    def test_get_tickets_fields(self):
+        self.add_invoice_items()
+        
+        def get(url):
+            with captured_statements(self.app) as statements:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return response, statements
+        
+        response, statements = get('/serviceticket/?fields=id,VIN')
+        self.assertEqual(response.json, [{'id': 1, 'VIN': '123'}])
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('service_desc', statements[0])
+        self.assertNotIn('customers', statements[0])
+        
+        response, statements = get('/serviceticket/?fields=customer,items&include=total')
+        self.assertEqual(response.json[0]['customer'], {'email': 'wasabi@email.com', 'name': 'Wasabi', 'phone': '1234567890'})
+        self.assertEqual(len(response.json[0]['items']), 2)
+        self.assertEqual(response.json[0]['total'], 109.97)
+        self.assertNotIn('id', response.json[0])
+        self.assertFalse(any('mechanics' in statement for statement in statements))
+        self.assertFalse(any('customers.password' in statement for statement in statements))
+        
+        response, statements = get('/serviceticket/search?q=car&fields=mechanics')
+        self.assertEqual(response.json, [{'mechanics': [{'email': 'jim@email.com', 'name': 'Jim', 'phone': '1234567890'}]}])
+        
+        response = self.client.get('/serviceticket/?fields=VIN,total')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,96 @@
+from app import create_app
+from app.models import db, Customer, ServiceTicket
+from app.utils.slow_queries import init_slow_query_log, read_entries, summarize, process_log_path
+from datetime import date
+import json
+import os
+import tempfile
+from unittest.mock import patch
+import unittest
+
+class TestSlowQueries(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("TestingConfig")
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.log_dir.name, 'slow_queries.log')
+        self.process_path = process_log_path(self.log_path, os.getpid())
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            customers = [Customer(name=f"Customer {i}", email=f"customer{i}@email.com", phone="1234567890", password="123") for i in range(3)]
+            db.session.add_all(ServiceTicket(VIN=f"VIN{i}", service_date=date(2025, 8, 6), service_desc="Car work", customer=customers[i % 3]) for i in range(6))
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        if 'slow_query_log' in self.app.extensions:
+            self.app.extensions['slow_query_log'].close()
+        self.log_dir.cleanup()
+
+    def start_log(self, threshold_ms=0):
+        self.app.config.update(SLOW_QUERY_LOG=self.log_path, SLOW_QUERY_THRESHOLD_MS=threshold_ms)
+        return init_slow_query_log(self.app)
+
+    def test_off_by_default(self):
+        self.assertIsNone(init_slow_query_log(self.app))
+        self.assertNotIn('slow_query_log', self.app.extensions)
+
+    # Each slow statement is logged with its route, the types of its parameters (not their values) and its plan
+    def test_statement_logged_with_route_and_plan(self):
+        self.start_log()
+        response = self.client.get('/customers/1')
+        self.assertEqual(response.status_code, 200)
+
+        entries = list(read_entries(self.log_path))
+        self.assertEqual(len(entries), 1)
+        entry = entries[0]
+        self.assertEqual(entry['endpoint'], 'customers_bp.get_customer')
+        self.assertEqual(entry['method'], 'GET')
+        self.assertIn('FROM customers', entry['statement'])
+        self.assertEqual(entry['parameters'], ['int'])
+        self.assertGreaterEqual(entry['duration_ms'], 0)
+        self.assertTrue(any('customers' in row['detail'] for row in entry['plan']), entry['plan'])
+        self.assertNotIn('customer0@email.com', open(self.process_path).read())
+
+    def test_threshold(self):
+        self.start_log(threshold_ms=60_000)
+        self.client.get('/customers/')
+        self.assertFalse(os.path.exists(self.process_path))
+
+    # Each process writes its own file, rotating it without touching the files of the others
+    def test_file_per_process(self):
+        log = self.start_log()
+        log.max_bytes, log.backups = 1, 2
+        self.client.get('/customers/1')
+        self.client.get('/customers/2')
+        self.assertTrue(os.path.exists(self.process_path + '.1'))
+        self.assertFalse(os.path.exists(self.log_path))
+
+        with patch('app.utils.slow_queries.os.getpid', return_value=1): # A forked worker opens its own file
+            self.client.get('/customers/1')
+        self.assertEqual([entry['endpoint'] for entry in read_entries(process_log_path(self.log_path, 1))], ['customers_bp.get_customer'])
+        self.assertEqual(len(list(read_entries(self.log_path))), 3)
+
+    # The summary ranks routes by the total time of their slow statements, rotated files and every process included
+    def test_summary(self):
+        self.start_log()
+        self.client.get('/customers/')
+        self.client.get('/serviceticket/')
+        self.app.extensions['slow_query_log'].close()
+        os.replace(self.process_path, self.process_path + '.1')
+        with open(process_log_path(self.log_path, 1), 'w') as f:
+            f.write(json.dumps({'endpoint': 'customers_bp.get_customers', 'method': 'GET', 'duration_ms': 5000.0, 'statement': 'SELECT 1'}) + '\n')
+
+        routes = summarize(read_entries(self.log_path))
+        self.assertEqual(routes[0][0], 'customers_bp.get_customers')
+        self.assertEqual(routes[0][1]['max_ms'], 5000.0)
+        self.assertEqual(routes[0][1]['slowest']['statement'], 'SELECT 1')
+        self.assertIn('service_ticket_bp.get_tickets', dict(routes))
+        self.assertEqual(len(summarize(read_entries(self.log_path), top=1)), 1)
+
+        result = self.app.test_cli_runner().invoke(args=['slow-queries', '--path', self.log_path, '--top', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        lines = result.output.splitlines()
+        self.assertTrue(lines[1].startswith('customers_bp.get_customers'), result.output)
+        self.assertIn('slowest: SELECT 1', result.output)
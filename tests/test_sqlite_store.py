@@ -0,0 +1,88 @@
+from app import create_app
+from app.models import db
+from app.extensions import limiter, cache
+from app.utils.sqlite_store import SQLiteCache, SQLiteStorage
+import os
+import tempfile
+import time
+import unittest
+
+class TestSQLiteStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'shared_store.db')
+        
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        
+    # Two caches on the same file behave like two workers sharing one cache
+    def test_cache_shared_between_instances(self):
+        worker_one = SQLiteCache(self.path)
+        worker_two = SQLiteCache(self.path)
+        
+        worker_one.set('key', {'value': [1, 2]})
+        self.assertEqual(worker_two.get('key'), {'value': [1, 2]})
+        
+        self.assertFalse(worker_two.add('key', 'other'))
+        self.assertTrue(worker_two.delete('key'))
+        self.assertIsNone(worker_one.get('key'))
+        
+        worker_one.set('version', 5, timeout=0)
+        self.assertEqual(worker_two.inc('version'), 6)
+        self.assertEqual(worker_one.inc('version'), 7)
+        
+    def test_cache_timeout(self):
+        cache_store = SQLiteCache(self.path)
+        cache_store.set('key', 'value', timeout=1)
+        self.assertTrue(cache_store.has('key'))
+        time.sleep(1.1)
+        self.assertIsNone(cache_store.get('key'))
+        self.assertTrue(cache_store.add('key', 'new value'))
+        self.assertEqual(cache_store.get('key'), 'new value')
+        
+    # Expired rows are deleted by later writes, not only skipped on read
+    def test_cache_prunes_expired_rows(self):
+        cache_store = SQLiteCache(self.path, prune_interval=3)
+        cache_store._db.execute('INSERT INTO cache (key, value, expires) VALUES (?, ?, ?)', ('old:1', b'', time.time() - 1))
+        cache_store._db.execute('INSERT INTO cache (key, value, expires) VALUES (?, ?, ?)', ('old:2', b'', time.time() - 1))
+        cache_store.set('kept', 'value', timeout=0)
+        cache_store.set('fresh', 'value')
+        self.assertEqual(cache_store._db.fetchone('SELECT COUNT(*) FROM cache')[0], 4)
+
+        cache_store.set('third write', 'value')
+        keys = {row[0] for row in cache_store._db.connection().execute('SELECT key FROM cache')}
+        self.assertEqual(keys, {'kept', 'fresh', 'third write'})
+        plan = cache_store._db.connection().execute('EXPLAIN QUERY PLAN DELETE FROM cache WHERE expires != 0 AND expires <= 1').fetchall()
+        self.assertIn('ix_cache_expires', plan[0][3])
+
+    def test_rate_limits_shared_between_instances(self):
+        worker_one = SQLiteStorage(f'sqlite:///{self.path}')
+        worker_two = SQLiteStorage(f'sqlite:///{self.path}')
+        
+        self.assertEqual(worker_one.incr('limit', 60), 1)
+        self.assertEqual(worker_two.incr('limit', 60), 2)
+        self.assertEqual(worker_one.get('limit'), 2)
+        self.assertGreater(worker_two.get_expiry('limit'), time.time())
+        
+        worker_two.clear('limit')
+        self.assertEqual(worker_one.get('limit'), 0)
+        self.assertTrue(worker_one.check())
+        
+    # TestingConfig uses the SQLite stores for both the cache and the limiter
+    def test_app_uses_sqlite_store(self):
+        app = create_app('TestingConfig')
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            self.assertIsInstance(cache.cache, SQLiteCache)
+            self.assertIsInstance(limiter.storage, SQLiteStorage)
+        
+        client = app.test_client()
+        customer_payload = {
+            "name": "Sashimi",
+            "email": "sashimi@email.com",
+            "phone": "1234567890",
+            "password": "123"
+        }
+        statuses = [client.post('/customers/', json=customer_payload).status_code for i in range(4)]
+        self.assertEqual(statuses[-1], 429)
@@ -0,0 +1,69 @@
+from app import create_app
+from app.models import db, ServiceTicket, Customer, Mechanic, Inventory, InventoryServiceTicket, DailyTicketStats, DailyPartUsage, service_mechanics
+from app.utils.upsert import upsert_increments, upsert_statement, insert_missing, insert_missing_statement
+from app.utils.rollups import record_ticket, record_parts
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from unittest.mock import patch
+import unittest
+
+class TestUpsert(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("TestingConfig")
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            customer = Customer(name="Customer", email="customer@email.com", phone="1234567890", password="123")
+            db.session.add(ServiceTicket(VIN="VIN1", service_date=date(2025, 8, 6), service_desc="Brake job", customer=customer))
+            db.session.add_all([Inventory(name='wheels', price=29.99), Inventory(name='screw', price=5.00)])
+            db.session.add_all(Mechanic(name=f"Mechanic {i}", email=f"mechanic{i}@email.com", phone="1234567890", password='123', salary=90000) for i in range(2))
+            db.session.commit()
+
+    # Item lines and both rollups compile to an upsert on each dialect the app runs on
+    def test_statements_per_dialect(self):
+        tables = [
+            (InventoryServiceTicket.__table__, ['service_ticket_id', 'inventory_id'], 'quantity'),
+            (DailyTicketStats.__table__, ['day'], 'ticket_count'),
+            (DailyPartUsage.__table__, ['day', 'inventory_id'], 'quantity'),
+        ]
+        for table, key_names, counter in tables:
+            with self.subTest(table=table.name):
+                sql = str(upsert_statement(table, key_names, counter, 'mysql').compile(dialect=mysql.dialect()))
+                self.assertIn(f'ON DUPLICATE KEY UPDATE {counter} = ({table.name}.{counter} + VALUES({counter}))', sql)
+                for name, dialect in (('postgresql', postgresql.dialect()), ('sqlite', sqlite.dialect())):
+                    sql = str(upsert_statement(table, key_names, counter, name).compile(dialect=dialect))
+                    self.assertIn(f'ON CONFLICT ({", ".join(key_names)}) DO UPDATE SET {counter} = ({table.name}.{counter} + excluded.{counter})', sql)
+                self.assertIsNone(upsert_statement(table, key_names, counter, 'mssql'))
+
+    # Dialects without an upsert add to existing rows with an UPDATE and insert the others
+    def test_update_then_insert(self):
+        with self.app.app_context(), patch('app.utils.upsert.upsert_statement', return_value=None):
+            lines = InventoryServiceTicket.__table__
+            upsert_increments(lines, ['service_ticket_id', 'inventory_id'], 'quantity', [{'service_ticket_id': 1, 'inventory_id': 1, 'quantity': 2}])
+            upsert_increments(lines, ['service_ticket_id', 'inventory_id'], 'quantity', [{'service_ticket_id': 1, 'inventory_id': 1, 'quantity': 3}, {'service_ticket_id': 1, 'inventory_id': 2, 'quantity': 1}])
+            record_ticket(date(2025, 8, 6))
+            record_ticket(date(2025, 8, 6))
+            record_parts(date(2025, 8, 6), {1: 5, 2: 1})
+            record_parts(date(2025, 8, 6), {2: -1})
+            db.session.commit()
+
+            self.assertEqual(db.session.execute(select(lines.c.inventory_id, lines.c.quantity).order_by(lines.c.inventory_id)).all(), [(1, 5), (2, 1)])
+            self.assertEqual(db.session.execute(select(DailyTicketStats.day, DailyTicketStats.ticket_count)).all(), [(date(2025, 8, 6), 2)])
+            self.assertEqual(db.session.execute(select(DailyPartUsage.inventory_id, DailyPartUsage.quantity)).all(), [(1, 5)])
+
+    # Mechanic assignments compile to an insert that skips stored keys on each dialect
+    def test_insert_missing_statements(self):
+        sql = str(insert_missing_statement(service_mechanics, ['ticket_id', 'mechanic_id'], 'mysql').compile(dialect=mysql.dialect()))
+        self.assertIn('ON DUPLICATE KEY UPDATE ticket_id = VALUES(ticket_id)', sql)
+        for name, dialect in (('postgresql', postgresql.dialect()), ('sqlite', sqlite.dialect())):
+            sql = str(insert_missing_statement(service_mechanics, ['ticket_id', 'mechanic_id'], name).compile(dialect=dialect))
+            self.assertIn('ON CONFLICT (ticket_id, mechanic_id) DO NOTHING', sql)
+        self.assertIsNone(insert_missing_statement(service_mechanics, ['ticket_id', 'mechanic_id'], 'mssql'))
+
+        with self.app.app_context(), patch('app.utils.upsert.insert_missing_statement', return_value=None):
+            insert_missing(service_mechanics, ['ticket_id', 'mechanic_id'], [{'ticket_id': 1, 'mechanic_id': 1}])
+            insert_missing(service_mechanics, ['ticket_id', 'mechanic_id'], [{'ticket_id': 1, 'mechanic_id': 1}, {'ticket_id': 1, 'mechanic_id': 2}])
+            db.session.commit()
+            self.assertEqual(db.session.execute(select(service_mechanics).order_by(service_mechanics.c.mechanic_id)).all(), [(1, 1), (1, 2)])